@@ -0,0 +1,117 @@
+""" Benchmark suite based on pytest-benchmark.
+    $ pip install pytest-benchmark
+    $ python -m pytest benchmarks --benchmark-autosave
+    $ FREEDAN_BENCHMARK_SIZE=1m python -m pytest benchmarks --benchmark-compare
+
+Data is synthetic and generated per session with a fixed seed. FREEDAN_BENCHMARK_SIZE picks the amount of rows:
+10k (default), 1m or 10m. 10m needs plenty of memory.
+End to end benchmarks run against FakeAdWords (freedan.testing), a local stand-in of the AdWords API.
+"""
+import os
+import importlib.util
+
+import numpy as np
+import pandas as pd
+import pytest
+
+SIZE_ENV_VARIABLE = "FREEDAN_BENCHMARK_SIZE"
+SIZES = {
+    "10k": 10000,
+    "1m": 1000000,
+    "10m": 10000000
+}
+DEFAULT_SIZE = "10k"
+SEED = 42
+
+WORDS = np.array(["bus", "berlin", "münchen", "günstig", "reise", "nach", "ticket", "hamburg", "köln",
+                  "fernbus", "zug", "flixbus", "ab", "von", "paris", "wien", "prag", "e-bike", "mit", "hund"])
+MATCH_TYPES = np.array(["Exact", "Phrase", "Broad"])
+
+# without pytest-benchmark the benchmark fixture doesn't exist, so nothing can be collected
+if importlib.util.find_spec("pytest_benchmark") is None:
+    collect_ignore_glob = ["test_*.py"]
+
+
+def benchmark_rows():
+    size = os.environ.get(SIZE_ENV_VARIABLE, DEFAULT_SIZE).lower()
+    if size not in SIZES:
+        raise IOError("{env} must be one of {sizes}.".format(env=SIZE_ENV_VARIABLE, sizes=", ".join(SIZES)))
+    return SIZES[size]
+
+
+def random_texts(rows, generator, max_words=4, distinct=None):
+    """ Keyword/search query like texts. With distinct, texts repeat like search queries do """
+    distinct = distinct or rows
+    amount_words = generator.integers(1, max_words + 1, distinct)
+    words = generator.choice(WORDS, (distinct, max_words))
+    texts = np.array([" ".join(row[:amount]) for row, amount in zip(words, amount_words)], dtype=object)
+    if distinct == rows:
+        return texts
+    return texts[generator.integers(0, distinct, rows)]
+
+
+def keyword_report(rows, seed=SEED):
+    """ Keyword performance report as returned by AdWordsService.download_report """
+    generator = np.random.default_rng(seed)
+    share = np.char.add(np.round(generator.uniform(10, 90, rows), 2).astype(str), "%")
+    share[generator.random(rows) < 0.1] = " --"
+    share[generator.random(rows) < 0.05] = "> 90%"
+    modifier = np.char.add(generator.integers(-90, 300, rows).astype(str), "%")
+    modifier[generator.random(rows) < 0.5] = " --"
+
+    return pd.DataFrame({
+        "CampaignId": 1000 + np.arange(rows) // 5000,
+        "AdGroupId": 100000 + np.arange(rows) // 50,
+        "Id": 10000000 + np.arange(rows),
+        "Criteria": random_texts(rows, generator),
+        "KeywordMatchType": generator.choice(MATCH_TYPES, rows),
+        "CpcBid": generator.integers(1, 500, rows) * 10000,
+        "Cost": generator.integers(0, 50000, rows) * 10000,
+        "SearchRankLostImpressionShare": share,
+        "AdGroupDesktopBidModifier": modifier
+    })
+
+
+@pytest.fixture(scope="session")
+def batch_response(rows):
+    """ Parsed batch job response (see BatchJobHelper.ParseResponse) with 1% failed operations """
+    generator = np.random.default_rng(SEED)
+    failed = generator.random(rows) < 0.01
+
+    return_values = list()
+    for index, is_failed in enumerate(failed):
+        if is_failed:
+            return_values.append({"index": str(index), "errorList": {"errors": {
+                "fieldPath": "operations[{index}].operand".format(index=index),
+                "trigger": None,
+                "errorString": "CriterionError.KEYWORD_HAS_INVALID_CHARS",
+                "ApiError.Type": "CriterionError",
+                "reason": "KEYWORD_HAS_INVALID_CHARS"
+            }}})
+        else:
+            return_values.append({"index": str(index), "result": {"AdGroupCriterion": {"adGroupId": "1"}}})
+    return {"mutateResponse": {"rval": return_values}}
+
+
+@pytest.fixture(scope="session")
+def rows():
+    return benchmark_rows()
+
+
+@pytest.fixture(scope="session")
+def keywords(rows):
+    return keyword_report(rows)
+
+
+@pytest.fixture(scope="session")
+def search_queries(rows):
+    generator = np.random.default_rng(SEED)
+    return pd.Series(random_texts(rows, generator, max_words=6, distinct=max(rows // 10, 1)))
+
+
+@pytest.fixture(scope="session")
+def fake_adwords():
+    from freedan.testing.fake_adwords import FakeAdWords
+
+    with FakeAdWords(seed=SEED) as fake:
+        yield fake
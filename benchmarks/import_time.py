@@ -0,0 +1,48 @@
+""" Import time benchmark for freedan.
+
+Every scenario runs in a fresh interpreter, so module caches of previous runs don't interfere.
+Usage:
+    $ python benchmarks/import_time.py [repetitions]
+"""
+import os
+import sys
+import time
+import statistics
+import subprocess
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_REPETITIONS = 10
+
+SCENARIOS = {
+    "import freedan": "import freedan",
+    "Keyword.to_broad_modified": "import freedan; freedan.Keyword.to_broad_modified('a b')",
+    "TextHandler": "import freedan; freedan.TextHandler('a-b').standardized",
+    "AdWordsService": "import freedan; freedan.AdWordsService",
+}
+HEAVY_MODULES = ("pandas", "googleads", "suds", "unidecode")
+
+
+def measure(statement):
+    """ Wall time of a fresh interpreter executing the statement + heavy modules it loaded """
+    code = "{statement}\nimport sys; print(','.join(m for m in {heavy} if m in sys.modules))".format(
+        statement=statement, heavy=HEAVY_MODULES)
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, check=True,
+                            stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return time.perf_counter() - start, output.strip()
+
+
+def run(repetitions=DEFAULT_REPETITIONS):
+    baseline = statistics.median(measure("pass")[0] for _ in range(repetitions))
+    print("interpreter startup: {ms:.0f} ms (subtracted below)".format(ms=baseline * 1000))
+
+    for name, statement in SCENARIOS.items():
+        measurements = [measure(statement) for _ in range(repetitions)]
+        median = statistics.median(seconds for seconds, _ in measurements) - baseline
+        heavy_modules = measurements[-1][1] or "-"
+        print("{name:<30} {ms:>8.0f} ms   heavy modules: {heavy}".format(
+            name=name, ms=median * 1000, heavy=heavy_modules))
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else DEFAULT_REPETITIONS)
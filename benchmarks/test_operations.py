@@ -0,0 +1,39 @@
+def test_keyword_add_operations(benchmark, keywords):
+    from freedan import Keyword, FinalUrl
+
+    final_url = FinalUrl("https://www.example.com")
+    rows = list(zip(keywords["AdGroupId"], keywords["Criteria"], keywords["KeywordMatchType"]))
+
+    def build():
+        return [Keyword(text=text, match_type=match_type, bid=1.0, final_url=final_url).add_operation(adgroup_id)
+                for adgroup_id, text, match_type in rows]
+
+    operations = benchmark(build)
+    assert len(operations) == len(rows)
+
+
+def test_adgroup_add_operations(benchmark, keywords):
+    from freedan import AdGroup
+
+    rows = list(zip(keywords["CampaignId"], keywords["Criteria"]))
+
+    def build():
+        return [AdGroup(name=name).add_operation(campaign_id=campaign_id, bid=1.0) for campaign_id, name in rows]
+
+    operations = benchmark(build)
+    assert len(operations) == len(rows)
+
+
+def test_extended_text_ad_add_operations(benchmark, keywords):
+    from freedan import ExtendedTextAd, FinalUrl
+
+    final_url = FinalUrl("https://www.example.com")
+    rows = list(zip(keywords["AdGroupId"], keywords["Criteria"]))
+
+    def build():
+        return [ExtendedTextAd(headline1=text[:30], headline2="Günstig buchen", description="Jetzt buchen",
+                               path1="bus", path2="tickets", final_url=final_url).add_operation(adgroup_id)
+                for adgroup_id, text in rows]
+
+    operations = benchmark(build)
+    assert len(operations) == len(rows)
@@ -0,0 +1,23 @@
+import pytest
+
+
+@pytest.fixture(scope="module")
+def report_service(fake_adwords, rows):
+    fake_adwords.report_rows = rows
+    return fake_adwords.adwords_service()
+
+
+def test_download_report(benchmark, report_service, rows):
+    fields = ["CampaignId", "AdGroupId", "Id", "Criteria", "KeywordMatchType", "CpcBid", "Cost", "FinalUrls"]
+    report_def = report_service.report_definition("KEYWORDS_PERFORMANCE_REPORT", fields)
+
+    report = benchmark(report_service.download_report, report_def)
+    assert len(report) == rows
+
+
+def test_convert_adwords_columns(benchmark, keywords):
+    from freedan.adwords_services.report_helper import convert_adwords_columns
+
+    # the DataFrame is converted in place, so every round gets a fresh copy
+    converted = benchmark.pedantic(convert_adwords_columns, setup=lambda: ((keywords.copy(),), dict()), rounds=5)
+    assert converted["CpcBid"].dtype == float
@@ -0,0 +1,17 @@
+def test_standardize(benchmark, search_queries):
+    from freedan import TextHandler
+
+    texts = list(search_queries)
+
+    def standardize():
+        return [TextHandler(text).standardized for text in texts]
+
+    standardized = benchmark(standardize)
+    assert len(standardized) == len(texts)
+
+
+def test_standardize_many(benchmark, search_queries):
+    from freedan import TextHandler
+
+    standardized = benchmark(TextHandler.standardize_many, search_queries, to_lower=True)
+    assert len(standardized) == len(search_queries)
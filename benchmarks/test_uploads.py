@@ -0,0 +1,39 @@
+import os
+import contextlib
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def keyword_operations(keywords):
+    from freedan import Keyword, FinalUrl
+
+    final_url = FinalUrl("https://www.example.com")
+    return [Keyword(text=text, match_type=match_type, bid=1.0, final_url=final_url).add_operation(adgroup_id)
+            for adgroup_id, text, match_type in zip(keywords["AdGroupId"], keywords["Criteria"],
+                                                    keywords["KeywordMatchType"])]
+
+
+def test_parse_partial_failures(benchmark, batch_response, rows):
+    from freedan import BatchUploader
+
+    def parse():
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):  # every error is printed
+            return BatchUploader._parse_partial_failures(batch_response)
+
+    errors = benchmark(parse)
+    assert 0 < len(errors) < rows
+
+
+def test_batch_upload_fast_serialization(benchmark, fake_adwords, keyword_operations):
+    # only the fast path: FakeBatchJobHelper serializes with OperationSerializer as well, not with suds
+    adwords_service = fake_adwords.adwords_service()
+
+    def upload():
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            return adwords_service.upload(keyword_operations, is_debug=False, method="batch",
+                                          batch_sleep_interval=0, fast_serialization=True)
+
+    response, errors = benchmark.pedantic(upload, rounds=3)
+    assert len(response["mutateResponse"]["rval"]) == len(keyword_operations)
+    assert not errors
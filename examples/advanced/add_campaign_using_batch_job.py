@@ -40,6 +40,8 @@ def add_adgroup_using_batch_job(path_credentials, is_debug):
         ad_operations = [ad.add_operation(adgroup_id=adgroup_id)]
 
         # upload
+        # the order of operations matters. adwords_service.upload_planned determines it for you
+        # and splits independent campaigns into parallel batch jobs
         operations = (budget_operations, campaign_operations, adgroup_operations, keyword_operations, ad_operations)
         adwords_service.upload(operations, is_debug=is_debug, method="batch")
 
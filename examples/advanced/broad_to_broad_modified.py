@@ -1,7 +1,5 @@
-import ast
-
 import freedan
-from freedan import Keyword, FinalUrl
+from freedan import Keyword
 
 
 def broad_to_broad_modified(path_credentials, is_debug):
@@ -21,44 +19,20 @@ def broad_to_broad_modified(path_credentials, is_debug):
     for account in adwords_service.accounts():
         print(account)
 
-        real_broads = identify_real_broads(adwords_service)
-
-        operations = build_operations(real_broads)
-        adwords_service.upload(operations, is_debug=is_debug, method="batch")
-
-
-def build_operations(real_broads):
-    """ You can't update keyword texts, therefore every keyword has to be deleted and recreated with the right text
-    :param real_broads: DataFrame
-    :return: tuple of 2 lists of operations
-    """
-    add_operations = list()
-    del_operations = list()
-    for index, row in real_broads.iterrows():
-        # fetch current settings of keyword to create new one
-        adgroup_id = int(row["AdGroupId"])
-        keyword_id = int(row["Id"])
-        match_type = row["KeywordMatchType"].upper()
-        bid = int(row["CpcBid"])
-        status = row["Status"].upper()
-        new_text = Keyword.to_broad_modified(row["Criteria"])
-        final_url = ast.literal_eval(row["FinalUrls"])[0]  # breaks if no final url is set
-
-        # new keyword
-        new_kw = Keyword(text=new_text, match_type=match_type, bid=bid, final_url=final_url)
-        add_operation = new_kw.add_operation(adgroup_id, status=status)
-        add_operations.append(add_operation)
+        # the report is streamed chunk by chunk, so only affected keywords are held in memory
+        keyword_chunks = adwords_service.download_report_chunks(keyword_report_definition(adwords_service),
+                                                                include_0_imp=True)
+        real_broads = (identify_real_broads(chunk) for chunk in keyword_chunks)
 
-        # deletion of flawed keyword
-        del_operation = Keyword.delete_operation(adgroup_id=adgroup_id, keyword_id=keyword_id)
-        del_operations.append(del_operation)
-    return add_operations, del_operations
+        # new keywords are added first, old ones are only deleted if their replacement was added successfully
+        migration = freedan.KeywordMigration(adwords_service)
+        migration.migrate(real_broads, new_texts=Keyword.to_broad_modified, is_debug=is_debug)
 
 
-def identify_real_broads(adwords_service):
-    """ Download all keywords and identify the ones with missing pluses
+def keyword_report_definition(adwords_service):
+    """ Report definition of all relevant keywords
     :param adwords_service: AdWordsService object
-    :return: DataFrame
+    :return: nested dict
     """
     fields = [
         "AdGroupName", "AdGroupId", "Criteria", "Id",
@@ -82,9 +56,14 @@ def identify_real_broads(adwords_service):
         "values": "REMOVED"
     }]
 
-    keyword_report_def = adwords_service.report_definition("KEYWORDS_PERFORMANCE_REPORT", fields, predicates)
-    keyword_report = adwords_service.download_report(keyword_report_def, include_0_imp=True)
+    return adwords_service.report_definition("KEYWORDS_PERFORMANCE_REPORT", fields, predicates)
+
 
+def identify_real_broads(keyword_report):
+    """ Identify keywords with missing pluses
+    :param keyword_report: DataFrame, chunk of the keyword report
+    :return: DataFrame
+    """
     is_real_broad = keyword_report["Criteria"].apply(Keyword.is_real_broad)
     real_broads = keyword_report[is_real_broad]
     return real_broads
@@ -1,7 +1,4 @@
-import ast
-
 import freedan
-from freedan import Keyword, FinalUrl
 
 
 def keywords_to_lower_case(path_credentials, is_debug):
@@ -22,44 +19,20 @@ def keywords_to_lower_case(path_credentials, is_debug):
     for account in adwords_service.accounts():
         print(account)
 
-        non_lower_case = identify_non_lower_case(adwords_service)
-
-        operations = build_operations(non_lower_case)
-        adwords_service.upload(operations, is_debug=is_debug, method="batch")
-
-
-def build_operations(non_lower_case):
-    """ You can't update keyword texts, therefore every keyword has to be deleted and recreated with the right text
-    :param non_lower_case: DataFrame
-    :return: tuple of 2 lists of operations
-    """
-    add_operations = list()
-    del_operations = list()
-    for index, row in non_lower_case.iterrows():
-        # fetch current settings of keyword to create new one
-        adgroup_id = int(row["AdGroupId"])
-        keyword_id = int(row["Id"])
-        match_type = row["KeywordMatchType"].upper()
-        bid = int(row["CpcBid"])
-        status = row["Status"].upper()
-        new_text = row["Criteria"].lower()
-        final_url = ast.literal_eval(row["FinalUrls"])[0]  # breaks if no final url is set
-
-        # new keyword
-        new_kw = Keyword(text=new_text, match_type=match_type, bid=bid, final_url=final_url)
-        add_operation = new_kw.add_operation(adgroup_id, status=status)
-        add_operations.append(add_operation)
+        # the report is streamed chunk by chunk, so only affected keywords are held in memory
+        keyword_chunks = adwords_service.download_report_chunks(keyword_report_definition(adwords_service),
+                                                                include_0_imp=True)
+        non_lower_case = (identify_non_lower_case(chunk) for chunk in keyword_chunks)
 
-        # deletion of flawed keyword
-        del_operation = Keyword.delete_operation(adgroup_id=adgroup_id, keyword_id=keyword_id)
-        del_operations.append(del_operation)
-    return add_operations, del_operations
+        # new keywords are added first, old ones are only deleted if their replacement was added successfully
+        migration = freedan.KeywordMigration(adwords_service)
+        migration.migrate(non_lower_case, new_texts=str.lower, is_debug=is_debug)
 
 
-def identify_non_lower_case(adwords_service):
-    """ Download all keywords and identify the ones with missing pluses
+def keyword_report_definition(adwords_service):
+    """ Report definition of all relevant keywords
     :param adwords_service: AdWordsService object
-    :return: DataFrame
+    :return: nested dict
     """
     fields = [
         "AdGroupName", "AdGroupId", "Criteria", "Id",
@@ -79,9 +52,14 @@ def identify_non_lower_case(adwords_service):
         "values": "REMOVED"
     }]
 
-    keyword_report_def = adwords_service.report_definition("KEYWORDS_PERFORMANCE_REPORT", fields, predicates)
-    keyword_report = adwords_service.download_report(keyword_report_def, include_0_imp=True)
+    return adwords_service.report_definition("KEYWORDS_PERFORMANCE_REPORT", fields, predicates)
+
 
+def identify_non_lower_case(keyword_report):
+    """ Identify keywords that aren't lower case
+    :param keyword_report: DataFrame, chunk of the keyword report
+    :return: DataFrame
+    """
     # CAUTION: one could try to use native python function str.islower()
     # but this results in undesired effects for Chinese
     is_not_lower_case = keyword_report["Criteria"] != keyword_report["Criteria"].str.lower()
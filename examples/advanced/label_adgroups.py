@@ -1,5 +1,5 @@
 import freedan
-from freedan import Label
+from freedan import Label, LabelCache
 
 
 ADGROUP_ID = "INSERT_ID_HERE"
@@ -18,11 +18,13 @@ def label_adgroups(path_credentials, is_debug):
         4. label doesn't exist yet
 
     freedan provides a convenient interface for any of those.
+    The LabelCache downloads all labels of an account only once, which pays off when resolving many labels.
 
     :param path_credentials: str, path to your adwords credentials file
     :param is_debug: bool
     """
     adwords_service = freedan.AdWordsService(path_credentials)
+    label_cache = LabelCache(adwords_service)
     for account in adwords_service.accounts():
         print(account)
 
@@ -31,7 +33,7 @@ def label_adgroups(path_credentials, is_debug):
         # in case 1: provide label_id in initiation and skip Label.update_id call
         # in other cases: adapt 'action_if_not_found' parameter to your needs
 
-        ag_label.update_id(adwords_service, is_debug=is_debug, action_if_not_found="create")
+        ag_label.update_id(adwords_service, is_debug=is_debug, action_if_not_found="create", label_cache=label_cache)
         operations = [ag_label.apply_on_adgroup_operation(adgroup_id=ADGROUP_ID)]
 
         # upload will display an error if debug mode and label isn't existing yet
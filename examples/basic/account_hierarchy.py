@@ -15,6 +15,11 @@ def account_hierarchy(credentials_path):
     for account in adwords_service.accounts():
         print(account)
 
+    # the hierarchy can also be cached on disk. Later calls won't need to talk to the API
+    account_tree = adwords_service.account_tree(cache_path="account_tree.json")
+    for account in account_tree.accounts():
+        print(account)
+
 
 if __name__ == "__main__":
     adwords_credentials_path = "adwords_credentials.yaml"
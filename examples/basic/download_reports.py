@@ -31,12 +31,39 @@ def download_reports(credentials_path, report_type, fields, predicates):
         print(report)  # pandas DataFrame
 
         # you may now
-        #   - stack reports of all your accounts to one big DataFrame
-        #   - or save them to a csv
+        #   - save them to a csv
+        #   - or collect all accounts in one dataset (see consolidate_reports)
         #   - or push them to a data base
         #   - or ...
 
 
+def consolidate_reports(credentials_path, report_type, fields, predicates, base_dir):
+    """
+    Instead of stacking the DataFrames of all accounts (which copies all data again for every account),
+    download the report of all accounts in parallel into one Parquet dataset.
+    Every row gets CustomerId, Currency and TimeZone of its account. Needs pyarrow: pip install freedan[parquet]
+    :param credentials_path: str, path to your adwords credentials file
+    :param report_type: str, https://developers.google.com/adwords/api/docs/appendix/reports
+    :param fields: list of str, columns of report
+    :param predicates: list of dict, filter
+    :param base_dir: str, directory of the dataset
+    """
+    adwords_service = freedan.AdWordsService(credentials_path)
+
+    report_def = adwords_service.report_definition(
+        report_type=report_type,
+        fields=fields,
+        predicates=predicates,
+        last_days=7
+    )
+
+    consolidation = adwords_service.report_consolidation(base_dir)
+    consolidation.run(report_def, include_0_imp=True)
+
+    report = consolidation.dataset().to_table().to_pandas()
+    print(report)  # all accounts, read in one go
+
+
 if __name__ == "__main__":
     adwords_credentials_path = "adwords_credentials.yaml"
 
@@ -51,3 +78,4 @@ if __name__ == "__main__":
         "values": "test"
     }]
     download_reports(adwords_credentials_path, r_type, r_fields, r_predicates)
+    consolidate_reports(adwords_credentials_path, r_type, r_fields, r_predicates, base_dir="keyword_reports")
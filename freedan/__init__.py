@@ -1,28 +1,64 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 import os
+import importlib
 
 
 __version__ = "0.1.9"
 
 base_dir = os.path.dirname(__file__)  # deepest freedan folder
 
-from freedan.adwords_objects.account import Account
-from freedan.adwords_objects.account_label import AccountLabel
-from freedan.adwords_objects.campaign import Campaign
-from freedan.adwords_objects.campaign_budget import CampaignBudget
-from freedan.adwords_objects.adgroup import AdGroup
-from freedan.adwords_objects.keyword import Keyword
-from freedan.adwords_objects.final_url import FinalUrl
-from freedan.adwords_objects.negative_keyword import NegativeKeyword
-from freedan.adwords_objects.label import Label
-from freedan.adwords_objects.extended_text_ad import ExtendedTextAd
-from freedan.adwords_objects.shared_set_overview import SharedSetOverview
-
-from freedan.adwords_services.adwords_service import AdWordsService
-from freedan.adwords_services.batch_uploader import BatchUploader
-from freedan.adwords_services.temp_id_helper import TempIdHelper
-from freedan.adwords_services.standard_uploader import StandardUploader
-from freedan.adwords_services.adwords_error import AdWordsError
-
-from freedan.other_services.text_handler import TextHandler
+# Public classes are imported on first access (PEP 562), so heavy dependencies like pandas, googleads
+# or unidecode are only loaded once a class that needs them is used.
+_LAZY_ATTRIBUTES = {
+    "Account": "freedan.adwords_objects.account",
+    "AccountLabel": "freedan.adwords_objects.account_label",
+    "AccountTree": "freedan.adwords_objects.account_tree",
+    "Campaign": "freedan.adwords_objects.campaign",
+    "CampaignBudget": "freedan.adwords_objects.campaign_budget",
+    "AdGroup": "freedan.adwords_objects.adgroup",
+    "Keyword": "freedan.adwords_objects.keyword",
+    "FinalUrl": "freedan.adwords_objects.final_url",
+    "NegativeKeyword": "freedan.adwords_objects.negative_keyword",
+    "Label": "freedan.adwords_objects.label",
+    "LabelCache": "freedan.adwords_objects.label_cache",
+    "ExtendedTextAd": "freedan.adwords_objects.extended_text_ad",
+    "SharedSetOverview": "freedan.adwords_objects.shared_set_overview",
+
+    "AdWordsService": "freedan.adwords_services.adwords_service",
+    "BatchUploader": "freedan.adwords_services.batch_uploader",
+    "TempIdHelper": "freedan.adwords_services.temp_id_helper",
+    "StandardUploader": "freedan.adwords_services.standard_uploader",
+    "StreamingPipeline": "freedan.adwords_services.streaming_pipeline",
+    "KeywordMigration": "freedan.adwords_services.keyword_migration",
+    "IncrementalSync": "freedan.adwords_services.incremental_sync",
+    "EntityStore": "freedan.adwords_services.entity_store",
+    "ReportSlicer": "freedan.adwords_services.report_slicer",
+    "ParquetExport": "freedan.adwords_services.parquet_export",
+    "ReportConsolidation": "freedan.adwords_services.report_consolidation",
+    "parse_awql": "freedan.adwords_services.awql",
+    "AdWordsError": "freedan.adwords_services.adwords_error",
+
+    "TextHandler": "freedan.other_services.text_handler",
+    "TextNormalizer": "freedan.other_services.text_normalizer",
+    "MetricsRecorder": "freedan.other_services.instrumentation",
+    "SpanInstrumentation": "freedan.other_services.instrumentation",
+    "set_instrumentation": "freedan.other_services.instrumentation",
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    """ Import public classes on first access """
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError("module 'freedan' has no attribute '{name}'".format(name=name))
+
+    module = importlib.import_module(_LAZY_ATTRIBUTES[name])
+    value = getattr(module, name)
+    globals()[name] = value  # later accesses don't go through __getattr__ anymore
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
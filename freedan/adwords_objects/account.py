@@ -1,6 +1,10 @@
 from freedan.adwords_objects.account_label import AccountLabel
 
 
+def numeric_customer_id(customer_id):
+    """ Customer id as returned by the API, e.g. "123-456-7890" -> 1234567890 """
+    return int(str(customer_id).replace("-", ""))
+
 class Account:
     """ Adding some business specific information to AdWords internal account object """
     def __init__(self, ad_account, account_id, name, is_mcc, currency, time_zone, is_test, labels):
@@ -0,0 +1,170 @@
+import os
+import json
+import time
+import collections
+
+from freedan.adwords_objects.account import Account, numeric_customer_id
+from freedan.adwords_objects.account_label import AccountLabel
+
+DEFAULT_TTL = 24 * 3600  # seconds. Account hierarchies rarely change
+ACCOUNT_FIELDS = [
+    "Name", "CustomerId", "AccountLabels", "CanManageClients",
+    "CurrencyCode", "DateTimeZone", "TestAccount"
+]
+
+
+class AccountTree:
+    """ MCC hierarchy of all accounts below the top level account: customer ids, names, labels and parent links.
+
+    Fetching the whole hierarchy via ManagedCustomerService takes a while for big MCCs. The tree can therefore
+    be persisted to disk and is reused until it's older than ttl, so queries by label or subtree
+    don't need any API calls. Select an account before working on it:
+        adwords_service.client.SetClientCustomerId(account.id)
+    Customer ids are kept as returned by the API (1234567890), methods accept them dashed as well (123-456-7890).
+    """
+    def __init__(self, accounts, links, top_level_account_id=None, created_at=None):
+        """
+        :param accounts: dict, customer id -> dict with account information (labels as list of [name, id])
+        :param links: list of (manager customer id, client customer id)
+        :param top_level_account_id: str, account the hierarchy was downloaded for
+        :param created_at: float, unix timestamp of the download
+        """
+        self.accounts_by_id = dict()
+        for customer_id, info in accounts.items():
+            customer_id = numeric_customer_id(customer_id)
+            self.accounts_by_id[customer_id] = dict(info, customer_id=customer_id)
+        self.links = [(numeric_customer_id(manager_id), numeric_customer_id(client_id))
+                      for manager_id, client_id in links]
+        if top_level_account_id is not None:
+            top_level_account_id = numeric_customer_id(top_level_account_id)
+        self.top_level_account_id = top_level_account_id
+        self.created_at = created_at or time.time()
+
+        self.children = collections.defaultdict(list)
+        self.parents = collections.defaultdict(list)
+        for manager_id, client_id in self.links:
+            self.children[manager_id].append(client_id)
+            self.parents[client_id].append(manager_id)
+
+    @classmethod
+    def from_adwords(cls, adwords_service):
+        """ Download the hierarchy of all accounts the top level account has access to """
+        selector = {"fields": ACCOUNT_FIELDS}
+
+        accounts = dict()
+        links = list()
+        pages = adwords_service._pages(selector, "ManagedCustomerService", prefetch=True,
+                                       client=adwords_service.top_level_client())
+        for page in pages:
+            for ad_account in page["entries"] if "entries" in page else list():
+                accounts[ad_account.customerId] = cls._account_to_dict(ad_account)
+
+            links += [(link.managerCustomerId, link.clientCustomerId)
+                      for link in (page["links"] if "links" in page else list())]
+        return cls(accounts, links, top_level_account_id=adwords_service.top_level_account_id)
+
+    @classmethod
+    def load(cls, adwords_service, cache_path, ttl=DEFAULT_TTL):
+        """ Tree from cache file if it's younger than ttl, otherwise download and cache it
+        :param adwords_service: AdWordsService object
+        :param cache_path: str, path to json file
+        :param ttl: int, seconds
+        :return: AccountTree
+        """
+        if os.path.exists(cache_path):
+            tree = cls.from_file(cache_path)
+            same_top_level = tree.top_level_account_id == numeric_customer_id(adwords_service.top_level_account_id)
+            if same_top_level and time.time() - tree.created_at < ttl:
+                return tree
+
+        tree = cls.from_adwords(adwords_service)
+        tree.to_file(cache_path)
+        return tree
+
+    @staticmethod
+    def _account_to_dict(ad_account):
+        """ Plain dict of the relevant attributes of an internal AdWords account object """
+        labels = list()
+        if "accountLabels" in ad_account:
+            labels = [[label.name, label.id] for label in ad_account.accountLabels]
+
+        return {
+            "name": ad_account.name,
+            "customer_id": ad_account.customerId,
+            "is_mcc": ad_account.canManageClients,
+            "currency": ad_account.currencyCode,
+            "time_zone": ad_account.dateTimeZone,
+            "is_test": ad_account.testAccount,
+            "labels": labels
+        }
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path) as cache_file:
+            data = json.load(cache_file)
+
+        accounts = {account["customer_id"]: account for account in data["accounts"]}
+        links = [tuple(link) for link in data["links"]]
+        return cls(accounts, links, top_level_account_id=data["top_level_account_id"], created_at=data["created_at"])
+
+    def to_file(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        data = {
+            "created_at": self.created_at,
+            "top_level_account_id": self.top_level_account_id,
+            "accounts": list(self.accounts_by_id.values()),
+            "links": self.links
+        }
+        temp_path = path + ".tmp"
+        with open(temp_path, "w") as cache_file:
+            json.dump(data, cache_file)
+        os.replace(temp_path, path)  # atomic, so parallel scripts never read half written files
+
+    def account(self, customer_id):
+        """ Account object for a customer id """
+        customer_id = numeric_customer_id(customer_id)
+        if customer_id not in self.accounts_by_id:
+            raise LookupError("Account {id} isn't part of the hierarchy.".format(id=customer_id))
+
+        info = self.accounts_by_id[customer_id]
+        labels = [AccountLabel(name=name, label_id=label_id) for name, label_id in info["labels"]]
+        return Account(ad_account=None, account_id=info["customer_id"], name=info["name"], is_mcc=info["is_mcc"],
+                       currency=info["currency"], time_zone=info["time_zone"], is_test=info["is_test"],
+                       labels=labels)
+
+    def accounts(self, customer_ids=None, skip_mccs=True):
+        """ Account objects ordered by name
+        :param customer_ids: iterable of customer ids. Default: all accounts
+        :param skip_mccs: bool
+        :return: list of Account objects
+        """
+        customer_ids = self.accounts_by_id.keys() if customer_ids is None else customer_ids
+        accounts = [self.account(customer_id) for customer_id in customer_ids]
+        if skip_mccs:
+            accounts = [account for account in accounts if not account.is_mcc]
+        return sorted(accounts, key=lambda account: account.name)
+
+    def by_label(self, label_name, skip_mccs=True):
+        """ All accounts with a certain account label """
+        customer_ids = [customer_id for customer_id, info in self.accounts_by_id.items()
+                        if any(name == label_name for name, _ in info["labels"])]
+        return self.accounts(customer_ids, skip_mccs)
+
+    def subtree(self, customer_id, skip_mccs=True):
+        """ All accounts below (and including) an account, e.g. all clients of a sub MCC """
+        customer_ids = list()
+        queue = collections.deque([numeric_customer_id(customer_id)])
+        seen = set()
+        while queue:
+            current = queue.popleft()
+            if current in seen:
+                continue
+            seen.add(current)
+            customer_ids.append(current)
+            queue.extend(self.children.get(current, list()))
+
+        customer_ids = [customer_id for customer_id in customer_ids if customer_id in self.accounts_by_id]
+        return self.accounts(customer_ids, skip_mccs)
@@ -11,7 +11,7 @@ class Keyword:
     Keywords consist of more than a text, they also have
         - match type
         - bid (automatically detects and handles micro amounts)
-        - final url
+        - final url (optional, without it the final url of the ad is used)
     """
     def __init__(self, text, match_type, bid, final_url, https=True):
         self.text = text.lower()
@@ -19,7 +19,7 @@ class Keyword:
         self.max_cpc, self.micro_max_cpc = AdWordsService.reg_and_micro(bid)
         if isinstance(final_url, str):
             self.final_url = FinalUrl(final_url, https=https)
-        elif isinstance(final_url, FinalUrl):
+        else:
             self.final_url = final_url
 
         self.basic_checks()
@@ -41,7 +41,7 @@ class Keyword:
     def basic_checks(self):
         """ Check against limitation of AdWords """
         assert self.match_type in ("EXACT", "PHRASE", "BROAD")
-        if not isinstance(self.final_url, FinalUrl):
+        if self.final_url is not None and not isinstance(self.final_url, FinalUrl):
             raise ValueError("Please pass a FinalUrl object in parameter final_url.")
 
         # adwords limitations
@@ -62,9 +62,6 @@ class Keyword:
                     "text": self.text,
                     "matchType": self.match_type
                 },
-                "finalUrls": {
-                    "urls": [self.final_url.url]
-                },
                 "biddingStrategyConfiguration": {
                     "bids": [{
                         "xsi_type": "CpcBid",
@@ -76,6 +73,10 @@ class Keyword:
                 }
             }
         }
+        if self.final_url is not None:
+            operation["operand"]["finalUrls"] = {
+                "urls": [self.final_url.url]
+            }
         if label_id is not None:
             operation["operand"]["labels"] = [{
                 "id": label_id
@@ -9,13 +9,18 @@ class Label:
         self.text = text
         self.id = label_id
 
-    def update_id(self, adwords_service, is_debug, action_if_not_found="error"):
+    def update_id(self, adwords_service, is_debug, action_if_not_found="error", label_cache=None):
         """ Get id of this label text inside the current account.
             If the label isn't existing yet:
                 if create and not debug: it will be created
                 else:                    default value is returned or error raised
+        Pass a LabelCache when updating labels repeatedly to avoid one request per label and account.
         """
         assert action_if_not_found in ["create", "default_id", "error"]
+        if label_cache is not None:
+            self.id = label_cache.lookup([self.text], is_debug, action_if_not_found)[self.text]
+            return self.id
+
         label_page = self.fetch_id_from_adwords(adwords_service)
 
         if "entries" in label_page:
@@ -0,0 +1,92 @@
+from freedan.adwords_objects.label import Label, DEFAULT_TEMP_LABEL_ID
+from freedan.adwords_services.standard_uploader import MAX_OPERATIONS_STANDARD_UPLOAD
+
+
+class LabelCache:
+    """ Cache for label ids of all accounts touched by a script.
+    Instead of one LabelService request per label (and one upload per missing label) like Label.update_id,
+    all labels of an account are downloaded once and missing labels are created in a single upload.
+
+    Labels are stored per customer id, so the cache stays consistent while looping over accounts
+    with AdWordsService.accounts.
+    """
+    def __init__(self, adwords_service):
+        self.adwords_service = adwords_service
+        self._label_ids = dict()  # customer id -> {label text: label id}
+
+    @property
+    def customer_id(self):
+        """ Id of the currently selected account """
+        return self.adwords_service.client.client_customer_id
+
+    def label_ids(self, refresh=False):
+        """ All labels of the current account. Downloaded on first access.
+        :param refresh: bool, download again even if labels are already cached
+        :return: dict, label text -> label id
+        """
+        customer_id = self.customer_id
+        if refresh or customer_id not in self._label_ids:
+            self._label_ids[customer_id] = self._download_label_ids()
+        return self._label_ids[customer_id]
+
+    def _download_label_ids(self):
+        """ Fetch all labels of the current account using paged requests """
+        try:
+            labels = self.adwords_service.download_objects("LabelService", fields=("LabelId", "LabelName"))
+        except LookupError:
+            return dict()  # no labels in this account yet
+        return {label.name: label.id for label in labels}
+
+    def lookup(self, texts, is_debug, action_if_not_found="error"):
+        """ Get ids of many label texts inside the current account.
+            If labels aren't existing yet:
+                if create and not debug: they will be created in one upload
+                else:                    default value is returned or error raised
+        :param texts: iterable of str
+        :param is_debug: bool
+        :param action_if_not_found: str, "create", "default_id" or "error"
+        :return: dict, label text -> label id
+        """
+        assert action_if_not_found in ["create", "default_id", "error"]
+        texts = list(dict.fromkeys(texts))  # unique, but keep order
+        label_ids = self.label_ids()
+
+        missing_texts = [text for text in texts if text not in label_ids]
+        if missing_texts:
+            if action_if_not_found == "create" and not is_debug:
+                self.create_labels(missing_texts, is_debug)
+
+            elif action_if_not_found == "error":
+                raise IOError("Can't find labels with these texts, please check your spelling: {texts}"
+                              .format(texts=", ".join(missing_texts)))
+
+        return {text: label_ids.get(text, DEFAULT_TEMP_LABEL_ID) for text in texts}
+
+    def update_ids(self, labels, is_debug, action_if_not_found="error"):
+        """ Update the ids of Label objects. Same as Label.update_id, but for many labels at once
+        :param labels: list of Label objects
+        :param is_debug: bool
+        :param action_if_not_found: str, "create", "default_id" or "error"
+        :return: list of Label objects
+        """
+        label_ids = self.lookup([label.text for label in labels], is_debug, action_if_not_found)
+        for label in labels:
+            label.id = label_ids[label.text]
+        return labels
+
+    def create_labels(self, texts, is_debug):
+        """ Creates labels via standard upload and adds them to the cache """
+        label_ids = self.label_ids()
+        operations = [Label(text).add_operation() for text in texts]
+        print("Creating labels '%s'" % "', '".join(texts))
+
+        for start in range(0, len(operations), MAX_OPERATIONS_STANDARD_UPLOAD):
+            chunk = operations[start:start + MAX_OPERATIONS_STANDARD_UPLOAD]
+            result = self.adwords_service.upload(chunk, is_debug=is_debug)
+            if result is None or "value" not in result:
+                continue
+
+            for label in result["value"]:
+                if label is not None and "id" in label:  # failed operations don't return a label
+                    label_ids[label["name"]] = label["id"]
+        return label_ids
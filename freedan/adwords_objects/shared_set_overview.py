@@ -1,21 +1,114 @@
+import time
+import threading
+import concurrent.futures
+
 DEFAULT_TYPES = ["NEGATIVE_KEYWORDS"]
+DEFAULT_TTL = 3600  # seconds an overview is reused before it's downloaded again
+DEFAULT_MAX_WORKERS = 8
 
 
 class SharedSetOverview:
     """ Shared sets contain negative keywords/placements that can be shared across campaigns or accounts.
     They can only be applied on Campaign level though.
-    
+
     This class provides an overview of all shared sets (+id) for specific types (e.g. negative keywords).
-    Those ids are normally used in other campaign operations later on. 
+    Those ids are normally used in other campaign operations later on.
+
+    Overviews are cached per connection, account and set types for ttl seconds, so creating this object
+    repeatedly (e.g. once per campaign) only triggers a single report download.
+    Every object gets its own copy of the cached overview.
     """
-    def __init__(self, adwords_service, set_types=DEFAULT_TYPES):
-        self.overview = self._download_overview(adwords_service, set_types)
+    _cache = dict()  # (connection, customer id, set types) -> (download timestamp, overview)
+    _cache_lock = threading.Lock()
+
+    def __init__(self, adwords_service, set_types=DEFAULT_TYPES, ttl=DEFAULT_TTL, client_customer_id=None):
+        """
+        :param adwords_service: AdWords object
+        :param set_types: list of str, e.g. negative keywords, negative placements, ...
+        :param ttl: int, seconds a cached overview is valid. 0 forces a new download
+        :param client_customer_id: str, account of the overview. Defaults to the currently selected account
+        """
+        self.client_customer_id = client_customer_id or adwords_service.client.client_customer_id
+        self.overview = self._cached_overview(adwords_service, set_types, ttl, self.client_customer_id)
+
+        # indexes for fast lookups
+        self._id_by_name = dict()
+        self._name_by_id = dict()
+        for name, shared_set_id in zip(self.overview["SharedSetName"], self.overview["SharedSetId"]):
+            self._id_by_name.setdefault(name, shared_set_id)
+            self._name_by_id[shared_set_id] = name
+
+    def shared_set_id(self, name):
+        """ Id of the shared set with this name """
+        if name not in self._id_by_name:
+            raise LookupError("There's no shared set named '{name}'.".format(name=name))
+        return self._id_by_name[name]
+
+    def shared_set_name(self, shared_set_id):
+        """ Name of the shared set with this id """
+        if shared_set_id not in self._name_by_id:
+            raise LookupError("There's no shared set with id {id}.".format(id=shared_set_id))
+        return self._name_by_id[shared_set_id]
+
+    def __contains__(self, name):
+        return name in self._id_by_name
+
+    def __len__(self):
+        return len(self._name_by_id)
+
+    @classmethod
+    def for_accounts(cls, adwords_service, client_customer_ids, set_types=DEFAULT_TYPES, ttl=DEFAULT_TTL,
+                     max_workers=DEFAULT_MAX_WORKERS):
+        """ Download overviews of many accounts concurrently
+        :param adwords_service: AdWords object
+        :param client_customer_ids: iterable of str
+        :param set_types: list of str
+        :param ttl: int
+        :param max_workers: int, amount of parallel downloads
+        :return: dict, customer id -> SharedSetOverview
+        """
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                customer_id: executor.submit(cls, adwords_service, set_types, ttl, customer_id)
+                for customer_id in client_customer_ids
+            }
+            return {customer_id: future.result() for customer_id, future in futures.items()}
+
+    @classmethod
+    def clear_cache(cls):
+        """ Forget all cached overviews """
+        with cls._cache_lock:
+            cls._cache.clear()
+
+    @classmethod
+    def _cached_overview(cls, adwords_service, set_types, ttl, client_customer_id):
+        """ Overview from cache if it's younger than ttl, otherwise download it """
+        key = (cls._connection_key(adwords_service), client_customer_id, tuple(sorted(set_types)))
+        with cls._cache_lock:
+            cached = cls._cache.get(key)
+        if cached is not None and time.time() - cached[0] < ttl:
+            return cached[1].copy()  # changes of one object must not alter the cache
+
+        overview = cls._download_overview(adwords_service, set_types, client_customer_id)
+        with cls._cache_lock:
+            cls._cache[key] = (time.time(), overview)
+        return overview.copy()
+
+    @staticmethod
+    def _connection_key(adwords_service):
+        """ Identity of the credentials of an AdWordsService, so services of different users never share overviews.
+        Services with a passed client (no credentials file) are identified by their client.
+        """
+        if adwords_service.credentials_path is not None:
+            return adwords_service.credentials_path, adwords_service.top_level_account_id
+        return "client", id(adwords_service.client)
 
     @staticmethod
-    def _download_overview(adwords_service, set_types):
+    def _download_overview(adwords_service, set_types, client_customer_id=None):
         """ Query an overview of shared sets from AdWords API.
         :param adwords_service: AdWords object
         :param set_types: list of str, e.g. negative keywords, negative placements, ...
+        :param client_customer_id: str
         :return: dataframe
         """
         report_definition = {
@@ -36,6 +129,7 @@ class SharedSetOverview:
                 }]
             }
         }
-        shared_sets = adwords_service.download_report(report_definition, include_0_imp=True)\
+        shared_sets = adwords_service.download_report(report_definition, include_0_imp=True,
+                                                      client_customer_id=client_customer_id)\
             .rename(columns={"Name": "SharedSetName"})
         return shared_sets
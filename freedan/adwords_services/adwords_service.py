@@ -1,13 +1,22 @@
 import io
+import copy
 import time
 import datetime
-import pandas as pd
-from googleads import adwords
+import concurrent.futures
 
 from freedan.adwords_objects.account import Account
+from freedan.adwords_objects.account_tree import AccountTree, DEFAULT_TTL as ACCOUNT_TREE_TTL
 from freedan.adwords_services.standard_uploader import StandardUploader
 from freedan.adwords_services.batch_uploader import BatchUploader
+from freedan.adwords_services.operation_planner import OperationPlanner
+from freedan.adwords_services.incremental_sync import IncrementalSync
+from freedan.adwords_services.awql import parse_awql
+from freedan.adwords_services.parquet_export import ParquetExport
+from freedan.adwords_services.report_consolidation import ReportConsolidation
+from freedan.adwords_services.report_slicer import ReportSlicer, DEFAULT_SLICE_DAYS, DEFAULT_MAX_WORKERS
+from freedan.adwords_services.wsdl_cache import use_wsdl_cache, default_cache_dir
 from freedan.other_services.error_retryer import ErrorRetryer
+from freedan.other_services.instrumentation import get_instrumentation
 
 DEFAULT_API_VERSION = "v201708"
 
@@ -22,6 +31,7 @@ DEVICE_TO_ID = {  # Internal ids of AdWords for different platforms
     "tablet": 30002
 }
 PAGE_SIZE = 5000  # Recommended paging size by AdWords
+REPORT_CHUNK_SIZE = 50000  # rows per DataFrame when reports are streamed
 
 
 class AdWordsService:
@@ -31,14 +41,19 @@ class AdWordsService:
         - Download reports
         - Upload operations using standard or batch functionality
     """
-    def __init__(self, credentials_path, api_version=DEFAULT_API_VERSION):
+    def __init__(self, credentials_path, api_version=DEFAULT_API_VERSION, wsdl_cache_dir=None, client=None):
         """
         :param api_version: str, normally you want to use the most recent version
         :param credentials_path: str, path to .yaml file
+        :param wsdl_cache_dir: str, persistent cache for WSDLs of suds clients, see wsdl_cache.py.
+                               Defaults to environment variable FREEDAN_WSDL_CACHE_DIR
+        :param client: already initiated adwords client, used instead of connecting with the credentials.
+                       E.g. FakeAdWords.client() (freedan.testing) for offline tests and benchmarks
         """
         self.credentials_path = credentials_path
         self.api_version = api_version
-        self.client = self._init_api_connection()
+        self.wsdl_cache_dir = wsdl_cache_dir or default_cache_dir()
+        self.client = client if client is not None else self._init_api_connection()
         self.top_level_account_id = self.client.client_customer_id
         self.report_downloader = self.init_service("ReportDownloader")
 
@@ -75,28 +90,47 @@ class AdWordsService:
     @ErrorRetryer()
     def _init_api_connection(self):
         """ Initiates the adwords api client object """
-        return adwords.AdWordsClient.LoadFromStorage(self.credentials_path)
+        from googleads import adwords  # heavy import, only needed once a connection is made
+        client = adwords.AdWordsClient.LoadFromStorage(self.credentials_path)
+        if self.wsdl_cache_dir is not None:
+            use_wsdl_cache(client, self.wsdl_cache_dir, self.api_version)
+        return client
 
     @ErrorRetryer()
-    def init_service(self, service_name):
-        """ Initiates the adwords services or report downloader """
-        if self.client is None:
+    def init_service(self, service_name, client=None):
+        """ Initiates the adwords services or report downloader
+        :param service_name: str
+        :param client: adwords client to use instead of self.client, see top_level_client
+        """
+        client = client or self.client
+        if client is None:
             raise ConnectionError("Please initiate API connection first using .initiate_api_connection()")
 
         if service_name == "ReportDownloader":
-            return self.client.GetReportDownloader(version=self.api_version)
+            return client.GetReportDownloader(version=self.api_version)
         else:
-            return self.client.GetService(service_name, version=self.api_version)
+            return client.GetService(service_name, version=self.api_version)
+
+    def top_level_client(self):
+        """ Copy of the api client that's fixed to the top level account.
+        accounts() selects every yielded account on self.client, but further pages of the account hierarchy
+        must still be requested for the top level account.
+        """
+        client = copy.copy(self.client)
+        client.SetClientCustomerId(self.top_level_account_id)
+        return client
 
     @ErrorRetryer()
-    def _get_page(self, selector, service):
+    def _get_page(self, selector, service, client=None):
         """ Get "page" object of adwords objects (an iterable containing adwords objects)
         :param selector: nested dict that describes what is requested
         :param service: str, identifying adwords service that is responsible
+        :param client: adwords client to use instead of self.client
         :return: adwords page object
         """
-        service_object = self.init_service(service)
-        return service_object.get(selector)
+        service_object = self.init_service(service, client)
+        with get_instrumentation().timer("api_request_seconds", service=service, method="get"):
+            return service_object.get(selector)
 
     @staticmethod
     def account_selector(predicates, skip_mccs):
@@ -126,25 +160,126 @@ class AdWordsService:
                 account_selector["predicates"] = [skip_mcc_predicate]
         return account_selector
 
-    def accounts(self, predicates=None, skip_mccs=True, convert=True):
+    @staticmethod
+    def _paged_selector(selector, offset):
+        """ Copy of a selector requesting the page starting at offset """
+        paged_selector = dict(selector)
+        paged_selector["paging"] = {
+            "startIndex": str(offset),
+            "numberResults": str(PAGE_SIZE)
+        }
+        return paged_selector
+
+    def _pages(self, selector, service_name, prefetch=False, client=None):
+        """ Generator yielding all pages of a get request one after another
+        :param selector: nested dict that describes what is requested (without paging)
+        :param service_name: str, identifying adwords service that is responsible
+        :param prefetch: bool, request the next page in the background while the current one is processed
+        :param client: adwords client to use instead of self.client
+        :return: generator of adwords page objects
+        """
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=1) if prefetch else None
+        try:
+            offset = 0
+            page = self._get_page(self._paged_selector(selector, offset), service_name, client)
+            while True:
+                offset += PAGE_SIZE
+                more_pages = offset < int(page["totalNumEntries"])
+
+                next_page = None
+                if more_pages and prefetch:
+                    next_page = executor.submit(
+                        self._get_page, self._paged_selector(selector, offset), service_name, client)
+
+                yield page
+                if not more_pages:
+                    return
+
+                if next_page is not None:
+                    page = next_page.result()
+                else:
+                    page = self._get_page(self._paged_selector(selector, offset), service_name, client)
+        finally:
+            if executor is not None:
+                executor.shutdown(wait=False)
+
+    def accounts(self, predicates=None, skip_mccs=True, convert=True, prefetch=False):
         """ Generator yielding accounts + business info ordered by account name
+        Accounts are requested page by page, so iteration starts right away even for very large MCCs.
         :param predicates:
         :param skip_mccs:
         :param convert: bool, convert to SearchAccount object
+        :param prefetch: bool, download the next page of accounts while the current one is processed
         :return: generator yielding dicts with core information of accounts
         """
         account_selector = self.account_selector(predicates, skip_mccs)
-        account_page = self._get_page(account_selector, "ManagedCustomerService")
-        if "entries" not in account_page:
+        account_pages = self._pages(account_selector, "ManagedCustomerService", prefetch, self.top_level_client())
+
+        found_accounts = False
+        for account_page in account_pages:
+            if "entries" not in account_page:
+                break
+
+            for ad_account in account_page["entries"]:
+                found_accounts = True
+                self.client.SetClientCustomerId(ad_account.customerId)  # select account
+
+                if convert:
+                    yield Account.from_ad_account(ad_account=ad_account)
+                else:
+                    yield ad_account
+
+        if not found_accounts:
             raise LookupError("Nothing matches the selector.")
 
-        for ad_account in account_page["entries"]:
-            self.client.SetClientCustomerId(ad_account.customerId)  # select account
+    def account_tree(self, cache_path=None, ttl=ACCOUNT_TREE_TTL):
+        """ MCC hierarchy below the top level account, optionally cached on disk
+        :param cache_path: str, path to json file. None = always download
+        :param ttl: int, seconds a cached tree is valid
+        :return: AccountTree
+        """
+        if cache_path is None:
+            return AccountTree.from_adwords(self)
+        return AccountTree.load(self, cache_path, ttl)
+
+    def incremental_sync(self, state_path):
+        """ Change detection based on CustomerSyncService, see IncrementalSync
+        :param state_path: str, path to json file with the last sync time per account
+        :return: IncrementalSync
+        """
+        return IncrementalSync(self, state_path)
+
+    def report_slicer(self, slice_days=DEFAULT_SLICE_DAYS, max_workers=DEFAULT_MAX_WORKERS, cache_dir=None):
+        """ Parallel download of long date ranges in slices, see ReportSlicer
+        :param slice_days: int, days per request
+        :param max_workers: int, parallel downloads
+        :param cache_dir: str, directory for cached historical slices. None = no caching
+        :return: ReportSlicer
+        """
+        return ReportSlicer(self, slice_days, max_workers, cache_dir)
 
-            if convert:
-                yield Account.from_ad_account(ad_account=ad_account)
-            else:
-                yield ad_account
+    def parquet_export(self, base_dir):
+        """ Streaming report export into a partitioned Parquet dataset, see ParquetExport
+        :param base_dir: str, root directory of the dataset
+        :return: ParquetExport
+        """
+        return ParquetExport(self, base_dir)
+
+    def report_consolidation(self, base_dir, max_workers=DEFAULT_MAX_WORKERS):
+        """ Report of all accounts in one Parquet dataset, see ReportConsolidation
+        :param base_dir: str, root directory of the dataset
+        :param max_workers: int, accounts downloaded at the same time
+        :return: ReportConsolidation
+        """
+        return ReportConsolidation(self, base_dir, max_workers)
+
+    def entity_store(self, path):
+        """ Local SQLite copy of the account structure, see EntityStore
+        :param path: str, path to sqlite file
+        :return: EntityStore
+        """
+        from freedan.adwords_services.entity_store import EntityStore  # entity_store imports this module
+        return EntityStore(path, self)
 
     @staticmethod
     def report_definition(report_type, fields, predicates=None,
@@ -201,21 +336,117 @@ class AdWordsService:
             report_def["selector"]["predicates"] = predicates
         return report_def
 
-    @ErrorRetryer()
-    def download_report(self, report_definition, include_0_imp=False):
+    def download_report(self, report_definition, include_0_imp=False, client_customer_id=None):
         """ Downloads a report to a temp csv -> dataframe
         :param report_definition: nested dict, refer to method "report_definition" for easy creation
         :param include_0_imp: bool
+        :param client_customer_id: str, download for this account instead of the currently selected one.
+                                   Needed when downloading for multiple accounts in parallel
         :return: report as dataframe
         """
-        header = report_definition["selector"]["fields"]
-        data = self.report_downloader.DownloadReportAsString(
-            report_definition, skip_report_header=True, skip_column_header=True,
-            skip_report_summary=True, include_zero_impressions=include_0_imp)
-        data = io.StringIO(data)
-        report = pd.read_csv(data, names=header)
+        data = self.download_report_csv(report_definition, include_0_imp, client_customer_id)
+        return self.parse_report_csv(data, report_definition)
+
+    @ErrorRetryer()
+    def download_report_csv(self, report_definition, include_0_imp=False, client_customer_id=None):
+        """ Downloads a report as csv without header, see download_report
+        :return: str
+        """
+        kwargs = dict()
+        if client_customer_id is not None:
+            kwargs["client_customer_id"] = client_customer_id
+
+        instrumentation = get_instrumentation()
+        with instrumentation.timer("api_request_seconds", service="ReportDownloader", method="download"):
+            data = self.report_downloader.DownloadReportAsString(
+                report_definition, skip_report_header=True, skip_column_header=True,
+                skip_report_summary=True, include_zero_impressions=include_0_imp, **kwargs)
+        instrumentation.count("report_bytes", len(data))
+        return data
+
+    @staticmethod
+    def parse_report_csv(data, report_definition):
+        """ DataFrame of a csv report downloaded by download_report_csv
+        :param data: str
+        :param report_definition: nested dict, provides the column names
+        :return: DataFrame
+        """
+        import pandas as pd  # heavy import, only needed for reports
+
+        instrumentation = get_instrumentation()
+        with instrumentation.timer("report_parse_seconds"):
+            report = pd.read_csv(io.StringIO(data), names=report_definition["selector"]["fields"])
+        instrumentation.count("report_rows", len(report))
         return report
 
+    def download_awql(self, query, include_0_imp=False, client_customer_id=None):
+        """ Downloads the report of an AWQL query -> dataframe. Cheaper than building report definitions for
+        ad-hoc queries: queries are parsed once per query text and sent as they are.
+        parse_awql(query).normalized is a canonical key of the query for caches of results
+        :param query: str, e.g. "SELECT CampaignId, Clicks FROM CAMPAIGN_PERFORMANCE_REPORT DURING LAST_7_DAYS"
+        :param include_0_imp: bool
+        :param client_customer_id: str, download for this account instead of the currently selected one
+        :return: report as dataframe
+        """
+        parsed_query = parse_awql(query)
+        data = self.download_awql_csv(parsed_query.normalized, include_0_imp, client_customer_id)
+        return self.parse_report_csv(data, parsed_query.report_definition())
+
+    @ErrorRetryer()
+    def download_awql_csv(self, query, include_0_imp=False, client_customer_id=None):
+        """ Downloads the report of an AWQL query as csv without header, see download_awql
+        :return: str
+        """
+        kwargs = dict()
+        if client_customer_id is not None:
+            kwargs["client_customer_id"] = client_customer_id
+
+        instrumentation = get_instrumentation()
+        with instrumentation.timer("api_request_seconds", service="ReportDownloader", method="awql"):
+            data = self.report_downloader.DownloadReportAsStringWithAwql(
+                query, "CSV", skip_report_header=True, skip_column_header=True,
+                skip_report_summary=True, include_zero_impressions=include_0_imp, **kwargs)
+        instrumentation.count("report_bytes", len(data))
+        return data
+
+    def download_report_chunks(self, report_definition, chunk_size=REPORT_CHUNK_SIZE, include_0_imp=False,
+                               client_customer_id=None):
+        """ Streams a report and yields it as DataFrames of chunk_size rows.
+        Memory only depends on chunk_size, not on the size of the report. See StreamingPipeline
+        :param report_definition: nested dict, refer to method "report_definition" for easy creation
+        :param chunk_size: int, rows per DataFrame
+        :param include_0_imp: bool
+        :param client_customer_id: str, download for this account instead of the currently selected one
+        :return: generator of DataFrames
+        """
+        import pandas as pd  # heavy import, only needed for reports
+
+        header = report_definition["selector"]["fields"]
+        stream = self._open_report_stream(report_definition, include_0_imp, client_customer_id)
+        try:
+            reader = pd.read_csv(io.TextIOWrapper(stream, encoding="utf-8"), names=header, chunksize=chunk_size)
+            for chunk in reader:
+                get_instrumentation().count("report_rows", len(chunk))
+                yield chunk
+        finally:
+            stream.close()
+
+    @ErrorRetryer()
+    def _open_report_stream(self, report_definition, include_0_imp, client_customer_id):
+        """ Open the http response of a report download without reading it """
+        return self._report_stream(report_definition, include_0_imp, client_customer_id)
+
+    def _report_stream(self, report_definition, include_0_imp, client_customer_id):
+        """ _open_report_stream without retries, for callers that retry the whole download """
+        kwargs = dict()
+        if client_customer_id is not None:
+            kwargs["client_customer_id"] = client_customer_id
+
+        with get_instrumentation().timer("api_request_seconds", service="ReportDownloader", method="stream"):
+            return self.report_downloader.DownloadReportAsStream(
+                report_definition, skip_report_header=True, skip_column_header=True,
+                skip_report_summary=True, include_zero_impressions=include_0_imp, **kwargs)
+
     def download_objects(self, service_name, fields=("Id",), predicates=None):
         """ Downloads adwords objects the classical way
         CAUTION: Only use this, when necessary i.e. if there's no report type available containing this information
@@ -225,34 +456,21 @@ class AdWordsService:
         :param predicates: list of dicts
         :return: list of objects
         """
-        offset = 0
-        more_pages = True
-        request = {
-            "fields": list(fields),
-            "paging": {
-                'startIndex': str(offset),
-                'numberResults': str(PAGE_SIZE)
-            }
-        }
+        request = {"fields": list(fields)}
         if predicates is not None:
             request["predicates"] = predicates
 
         results = list()
-        while more_pages:
-            page = self._get_page(request, service_name)
+        for page in self._pages(request, service_name):
             if 'entries' not in page:
                 raise LookupError("Nothing matches the selector.")
 
             results += [obj for obj in page['entries']]
-
-            offset += PAGE_SIZE
-            request['paging']['startIndex'] = str(offset)
-            more_pages = offset < int(page['totalNumEntries'])
             time.sleep(0.5)
         return results
 
-    def upload(self, operations, is_debug, method="standard",
-               partial_failure=True, report_on_results=True, batch_sleep_interval=-1):
+    def upload(self, operations, is_debug, method="standard", partial_failure=True, report_on_results=True,
+               batch_sleep_interval=-1, fast_serialization=False, serialization_processes=1):
         """ Taking care of all scenarios when operations need to be uploaded to AdWords.
         :param operations: list of operations
         :param is_debug: bool
@@ -260,6 +478,9 @@ class AdWordsService:
         :param partial_failure: bool
         :param report_on_results: bool, whether batchjob should download results or not
         :param batch_sleep_interval: int, -1 = exponential
+        :param fast_serialization: bool, batch only. Write xml directly instead of going through suds.
+                                   Equivalent, but not byte-identical to the xml of googleads (see OperationSerializer)
+        :param serialization_processes: int, batch only. Processes used for fast serialization
         :return: reply of adwords API
         """
         assert isinstance(operations, (list, tuple))
@@ -273,12 +494,51 @@ class AdWordsService:
             return None
 
         elif method == "standard":
-            standard_uploader = StandardUploader(self, is_debug, partial_failure)
-            return standard_uploader.execute(operations)
+            uploader = StandardUploader(self, is_debug, partial_failure)
 
         elif method == "batch":
-            batch_uploader = BatchUploader(self, is_debug, report_on_results, batch_sleep_interval)
-            return batch_uploader.execute(operations)
+            uploader = BatchUploader(self, is_debug, report_on_results, batch_sleep_interval,
+                                     fast_serialization, serialization_processes)
 
         else:
             raise IOError("method must be 'standard' or 'batch'.")
+
+        instrumentation = get_instrumentation()
+        start = time.perf_counter()
+        with instrumentation.timer("upload_seconds", method=method):
+            result = uploader.execute(operations)
+
+        if not is_debug:
+            instrumentation.count("operations_uploaded", amount_operations, method=method)
+            seconds = time.perf_counter() - start
+            if seconds > 0:
+                instrumentation.observe("upload_operations_per_second", amount_operations / seconds, method=method)
+        return result
+
+    def upload_planned(self, operations, is_debug, max_parallel_jobs=1, report_on_results=True,
+                       batch_sleep_interval=-1, fast_serialization=False):
+        """ Batch upload of operations in any order. The OperationPlanner orders them by their temporary ids
+        and distributes independent parts (e.g. different campaigns) on parallel batch jobs.
+        Operations touching the same existing objects stay in one batch job, in the order they were passed in.
+        :param operations: list of operations or tuple of lists of operations
+        :param is_debug: bool
+        :param max_parallel_jobs: int, upper limit of batch jobs running at the same time
+        :param report_on_results: bool, whether batchjob should download results or not
+        :param batch_sleep_interval: int, -1 = exponential
+        :param fast_serialization: bool, write xml directly instead of going through suds
+        :return: list of replies of adwords API, one per batch job
+        """
+        planner = OperationPlanner(operations)
+        jobs = planner.split(max_parallel_jobs)
+        print("\nPlanned {num} batch job(s).".format(num=len(jobs)))
+
+        def upload_job(job_operations):
+            return self.upload(job_operations, is_debug=is_debug, method="batch",
+                               report_on_results=report_on_results, batch_sleep_interval=batch_sleep_interval,
+                               fast_serialization=fast_serialization)
+
+        if len(jobs) <= 1:
+            return [upload_job(job) for job in jobs]
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+            return list(executor.map(upload_job, jobs))
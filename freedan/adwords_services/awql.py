@@ -0,0 +1,154 @@
+import re
+import functools
+import collections
+
+QUERY_CACHE_SIZE = 1024
+OPERATORS = {  # AWQL operator -> predicate operator of report definitions
+    "=": "EQUALS",
+    "!=": "NOT_EQUALS",
+    ">": "GREATER_THAN",
+    ">=": "GREATER_THAN_EQUALS",
+    "<": "LESS_THAN",
+    "<=": "LESS_THAN_EQUALS",
+}
+WORD_OPERATORS = ("IN", "NOT_IN", "STARTS_WITH", "STARTS_WITH_IGNORE_CASE", "CONTAINS", "CONTAINS_IGNORE_CASE",
+                  "DOES_NOT_CONTAIN", "DOES_NOT_CONTAIN_IGNORE_CASE", "CONTAINS_ANY", "CONTAINS_NONE", "CONTAINS_ALL")
+LIST_OPERATORS = ("IN", "NOT_IN", "CONTAINS_ANY", "CONTAINS_NONE", "CONTAINS_ALL")
+
+_QUERY = re.compile(r"^\s*SELECT\s+(?P<fields>.+?)\s+FROM\s+(?P<report_type>\w+)"
+                    r"(?:\s+WHERE\s+(?P<where>.+?))?(?:\s+DURING\s+(?P<during>[\w\s,]+?))?\s*;?\s*$",
+                    re.IGNORECASE | re.DOTALL)
+_CONDITION = re.compile(r"\s*(?P<field>\w+)\s*(?P<operator>!=|>=|<=|=|>|<|\b[A-Za-z_]+\b)\s*"
+                        r"(?P<value>\[[^\]]*\]|\"(?:[^\"\\]|\\.)*\"|'(?:[^'\\]|\\.)*'|[^\s\[\]\"']+)\s*")
+_VALUE = re.compile(r"\"((?:[^\"\\]|\\.)*)\"|'((?:[^'\\]|\\.)*)'|([^,\s]+)")
+_AND = re.compile(r"AND\s+", re.IGNORECASE)
+_NUMBER = re.compile(r"^-?\d+(\.\d+)?$")
+_CUSTOM_DURING = re.compile(r"^(\d{8})\s*,\s*(\d{8})$")
+
+
+class AwqlQuery(collections.namedtuple("AwqlQuery", ["fields", "report_type", "predicates", "during", "normalized"])):
+    """ Parsed AWQL report query. Immutable, because parsed queries are shared by the query cache.
+    normalized is the query in canonical form (upper case keywords, single spaces, sorted conditions) and can be
+    used as cache key for results. Relative date ranges like LAST_7_DAYS are kept as they are,
+    so combine the key with the current date when caching results of those.
+    """
+    __slots__ = ()
+
+    def report_definition(self, report_name="name"):
+        """ Report definition as built by AdWordsService.report_definition, e.g. to use a query with ReportSlicer
+        :return: nested dict
+        """
+        selector = {"fields": list(self.fields)}
+        if self.predicates:
+            selector["predicates"] = [{"field": field, "operator": operator, "values": list(values)}
+                                      for field, operator, values in self.predicates]
+
+        report_def = {
+            "reportName": report_name,
+            "reportType": self.report_type,
+            "downloadFormat": "CSV",
+            "selector": selector
+        }
+        custom_during = _CUSTOM_DURING.match(self.during) if self.during else None
+        if custom_during is not None:
+            report_def["dateRangeType"] = "CUSTOM_DATE"
+            selector["dateRange"] = {"min": custom_during.group(1), "max": custom_during.group(2)}
+        else:
+            report_def["dateRangeType"] = self.during or "ALL_TIME"
+        return report_def
+
+
+@functools.lru_cache(maxsize=QUERY_CACHE_SIZE)
+def parse_awql(query):
+    """ Parse and normalize an AWQL report query. Results are cached by query text
+    :param query: str, e.g. "SELECT CampaignId, Clicks FROM CAMPAIGN_PERFORMANCE_REPORT WHERE Clicks > 0"
+    :return: AwqlQuery
+    """
+    match = _QUERY.match(query)
+    if match is None:
+        raise IOError("Invalid AWQL query: {query}".format(query=query))
+
+    fields = tuple(field.strip() for field in match.group("fields").split(","))
+    if not all(re.match(r"^\w+$", field) for field in fields):
+        raise IOError("Invalid fields in AWQL query: {fields}".format(fields=match.group("fields")))
+
+    conditions = sorted(_parse_where(match.group("where") or ""))
+    predicates = tuple((field, operator, values) for field, operator, values, _ in conditions)
+    report_type = match.group("report_type").upper()
+    during = _parse_during(match.group("during"))
+
+    normalized = "SELECT {fields} FROM {report_type}".format(fields=", ".join(fields), report_type=report_type)
+    if conditions:
+        normalized += " WHERE " + " AND ".join(_condition_text(*condition) for condition in conditions)
+    if during is not None:
+        normalized += " DURING " + during
+    return AwqlQuery(fields, report_type, predicates, during, normalized)
+
+
+def _parse_where(where):
+    """ Conditions of a WHERE clause, which are always combined by AND
+    :return: list of tuples, (field, predicate operator, tuple of values, tuple of bools whether values were quoted)
+    """
+    predicates = list()
+    position = 0
+    while where.strip():
+        match = _CONDITION.match(where, position)
+        if match is None:
+            raise IOError("Invalid AWQL condition: {condition}".format(condition=where[position:]))
+        predicates.append(_parse_condition(match))
+
+        position = match.end()
+        if position == len(where):
+            break
+        separator = _AND.match(where, position)
+        if separator is None:
+            raise IOError("Conditions have to be combined by AND: {where}".format(where=where))
+        position = separator.end()
+    return predicates
+
+
+def _parse_condition(match):
+    """ Matched AWQL condition -> (field, predicate operator, tuple of values, tuple of quoted flags) """
+    operator = match.group("operator").upper()
+    operator = OPERATORS.get(operator, operator)
+    if operator not in OPERATORS.values() and operator not in WORD_OPERATORS:
+        raise IOError("Unknown AWQL operator: {operator}".format(operator=match.group("operator")))
+
+    value = match.group("value")
+    is_list = value.startswith("[")
+    if is_list != (operator in LIST_OPERATORS):
+        raise IOError("Operator {operator} and value {value} don't fit.".format(operator=operator, value=value))
+    if is_list:
+        value = value[1:-1]
+
+    values = list()
+    quoted = list()
+    for value_match in _VALUE.finditer(value):
+        is_quoted = value_match.group(3) is None
+        values.append(_unescape(value_match.group(1) or value_match.group(2) or "") if is_quoted
+                      else value_match.group(3))
+        quoted.append(is_quoted)
+    return match.group("field"), operator, tuple(values), tuple(quoted)
+
+
+def _parse_during(during):
+    if during is None:
+        return None
+    during = re.sub(r"\s+", "", during).upper()
+    if not (_CUSTOM_DURING.match(during) or re.match(r"^[A-Z_0-9]+$", during)):
+        raise IOError("Invalid AWQL date range: {during}".format(during=during))
+    return during
+
+
+def _condition_text(field, operator, values, quoted):
+    """ Canonical AWQL text of a condition. Quoted values stay quoted, e.g. CampaignName = "2017" """
+    awql_operator = {predicate: awql for awql, predicate in OPERATORS.items()}.get(operator, operator)
+    texts = [value if _NUMBER.match(value) and not is_quoted
+             else '"{value}"'.format(value=re.sub(r'(["\\])', r"\\\1", value))
+             for value, is_quoted in zip(values, quoted)]
+    value = "[{values}]".format(values=", ".join(texts)) if operator in LIST_OPERATORS else texts[0]
+    return "{field} {operator} {value}".format(field=field, operator=awql_operator, value=value)
+
+
+def _unescape(value):
+    return re.sub(r"\\(.)", r"\1", value)
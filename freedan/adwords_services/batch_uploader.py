@@ -1,14 +1,18 @@
 import datetime
+import io
 import time
 import collections
-from urllib.request import urlopen
-import pandas as pd
+from urllib.error import HTTPError
+from urllib.request import urlopen, Request
 
 from freedan.adwords_services.adwords_error import AdWordsError
+from freedan.adwords_services.operation_serializer import OperationSerializer
 from freedan.other_services.error_retryer import ErrorRetryer
+from freedan.other_services.instrumentation import get_instrumentation
 
 
 PENDING_STATUSES = ('ACTIVE', 'AWAITING_FILE', 'CANCELING')
+RESUMABLE_CHUNK_SIZE = 256 * 1024  # all but the last part of a resumable upload must be multiples of this
 
 
 class BatchUploader:
@@ -16,7 +20,8 @@ class BatchUploader:
         - batch uploads
         - and the related error handling
     """
-    def __init__(self, adwords_service, is_debug, report_on_results=True, batch_sleep_interval=-1):
+    def __init__(self, adwords_service, is_debug, report_on_results=True, batch_sleep_interval=-1,
+                 fast_serialization=False, serialization_processes=1):
         self.adwords_service = adwords_service
         self.batch_job_service = adwords_service.init_service("BatchJobService")
         self.batch_job_helper = self.batch_job_helper()
@@ -25,6 +30,10 @@ class BatchUploader:
         self.report_on_results = report_on_results
         self.batch_sleep_interval = batch_sleep_interval
 
+        # write the xml directly instead of going through suds. See OperationSerializer
+        self.fast_serialization = fast_serialization
+        self.serialization_processes = serialization_processes
+
         self.batch_job = self._add_batch_job()
         # # memo for important attributes of batch job
         # batch_job.uploadUrl.url
@@ -47,7 +56,8 @@ class BatchUploader:
             'operand': {},
             'operator': 'ADD'
         }]
-        return self.batch_job_service.mutate(batch_job_operations)['value'][0]
+        with get_instrumentation().timer("api_request_seconds", service="BatchJobService", method="mutate"):
+            return self.batch_job_service.mutate(batch_job_operations)['value'][0]
 
     def execute(self, operations):
         """ Uploads a batch of operations to adwords api using batch job service.
@@ -58,23 +68,259 @@ class BatchUploader:
         print("##### OperationUpload is LIVE: {is_live}. #####".format(is_live=(not self.is_debug)))
 
         if not self.is_debug:
-            self._upload(operations)
+            if self.fast_serialization:
+                self._upload_serialized(operations)
+            else:
+                self._upload(operations)
 
             if self.report_on_results:
-                self._get_batch_job_download_url_when_ready(self.batch_sleep_interval)
-                raw_response = self._read_response()
-                errors = self._parse_partial_failures(raw_response)
-                return raw_response, errors
+                return self._results()
         else:
             print("Operations couldn't be validated since AdWords' BatchUpload doesn't support validate only header")
         return None
 
+    def execute_incrementally(self, operation_chunks):
+        """ Uploads operations chunk by chunk to one batch job, e.g. while they are still being built.
+        Only the current chunk is held in memory, see StreamingPipeline.
+        :param operation_chunks: iterable of lists of operations
+        :return: return value of adwords, see execute
+        """
+        print("Uploading operations incrementally using BatchJob")
+        print("##### OperationUpload is LIVE: {is_live}. #####".format(is_live=(not self.is_debug)))
+
+        if self.is_debug:
+            amount_operations = sum(len(chunk) for chunk in operation_chunks)
+            print("\nAmount of operations:", amount_operations)
+            print("Operations couldn't be validated since AdWords' BatchUpload doesn't support validate only header")
+            return None
+
+        if self.fast_serialization:
+            amount_operations = self._upload_serialized_incrementally(operation_chunks)
+        else:
+            amount_operations = self._upload_incrementally(operation_chunks)
+
+        print("\nAmount of operations:", amount_operations)
+        if amount_operations and self.report_on_results:
+            return self._results()
+        return None
+
+    def _results(self):
+        """ Wait for the batch job to finish and report on errors """
+        with get_instrumentation().timer("batch_polling_seconds"):
+            self._get_batch_job_download_url_when_ready(self.batch_sleep_interval)
+        raw_response = self._read_response()
+        errors = self._parse_partial_failures(raw_response)
+        return raw_response, errors
+
     @ErrorRetryer()
     def _upload(self, operations):
         """ Upload operations """
         print(datetime.datetime.now(), "Upload started...")
-        self.batch_job_helper.UploadOperations(self.batch_job.uploadUrl.url, *operations)
+        with get_instrumentation().timer("batch_upload_seconds"):
+            self.batch_job_helper.UploadOperations(self.batch_job.uploadUrl.url, *operations)
+        print(datetime.datetime.now(), "Upload finished...")
+
+    def _upload_serialized(self, operations):
+        """ Serialize operations with OperationSerializer and upload the resulting xml """
+        print(datetime.datetime.now(), "Serialization started...")
+        serializer = OperationSerializer(self.adwords_service.api_version, processes=self.serialization_processes)
+        with get_instrumentation().timer("batch_serialization_seconds"):
+            payload = serializer.serialize(*operations)
+        self._upload_xml(payload)
+        get_instrumentation().count("batch_upload_bytes", len(payload))
+
+    def _upload_xml(self, payload):
+        """ Upload an already serialized mutate request to the upload url of the batch job.
+        Follows the resumable upload protocol: initiate the upload first, then put all bytes at once.
+        Both requests are retried on their own, so this method isn't decorated with ErrorRetryer.
+        :param payload: bytes
+        """
+        print(datetime.datetime.now(), "Upload started...")
+        resumable_url = self._init_resumable_upload()
+        self._put_part(resumable_url, payload, offset=0, total=len(payload))
+        print(datetime.datetime.now(), "Upload finished...")
+
+    @ErrorRetryer()
+    def _init_resumable_upload(self):
+        """ Initiate a resumable upload to the upload url of the batch job
+        :return: str, url the bytes are put to
+        """
+        init_request = Request(self.batch_job.uploadUrl.url, data=b"", method="POST", headers={
+            "Content-Type": "application/xml",
+            "Content-Length": "0",
+            "x-goog-resumable": "start"
+        })
+        return urlopen(init_request).headers["location"]
+
+    @staticmethod
+    def _put_bytes(resumable_url, data, offset, total=None):
+        """ Put a part of a resumable upload
+        :param data: bytes
+        :param offset: int, position of the first byte in the whole upload
+        :param total: int, size of the whole upload. None if more parts follow
+        """
+        upload_request = Request(resumable_url, data=bytes(data), method="PUT", headers={
+            "Content-Type": "application/xml",
+            "Content-Range": "bytes {first}-{last}/{total}".format(
+                first=offset, last=offset + len(data) - 1, total="*" if total is None else total)
+        })
+        try:
+            urlopen(upload_request)
+        except HTTPError as error:
+            if error.code != 308:  # 308 = resume incomplete, i.e. part received and more parts expected
+                raise
+
+    def _upload_incrementally(self, operation_chunks):
+        """ Upload chunks with the IncrementalUploadHelper of googleads
+        :return: int, amount of uploaded operations
+        """
+        print(datetime.datetime.now(), "Upload started...")
+        upload_helper = None
+        previous_chunk = None
+        amount_operations = 0
+        for chunk in operation_chunks:
+            if not chunk:
+                continue
+            amount_operations += len(chunk)
+
+            # the last chunk has to be flagged, so every chunk is uploaded once the next one is known
+            if previous_chunk is not None:
+                upload_helper = upload_helper or self._incremental_upload_helper()
+                upload_helper = self._upload_increment(upload_helper, previous_chunk, is_last=False)
+            previous_chunk = chunk
+
+        if previous_chunk is not None:
+            upload_helper = upload_helper or self._incremental_upload_helper()
+            self._upload_increment(upload_helper, previous_chunk, is_last=True)
+        print(datetime.datetime.now(), "Upload finished...")
+        return amount_operations
+
+    @ErrorRetryer()
+    def _incremental_upload_helper(self):
+        return self.batch_job_helper.GetIncrementalUploadHelper(self.batch_job.uploadUrl.url)
+
+    def _upload_increment(self, upload_helper, operations, is_last):
+        """ Upload a chunk with the IncrementalUploadHelper of googleads.
+        A failed chunk isn't simply uploaded again with the same helper: the part might have arrived before the error,
+        so the server is asked how many bytes it has and a new helper continues at that offset.
+        :return: IncrementalUploadHelper to upload the next chunk with
+        """
+        increment = {"helper": upload_helper, "state": self._helper_state(upload_helper), "is_retry": False}
+        with get_instrumentation().timer("batch_upload_seconds"):
+            return self._put_increment(increment, operations, is_last)
+
+    @ErrorRetryer()
+    def _put_increment(self, increment, operations, is_last):
+        """ One attempt of _upload_increment
+        :param increment: dict, helper to upload with, its state before the first attempt and whether this is a retry
+        :return: IncrementalUploadHelper
+        """
+        if increment["is_retry"]:
+            resumable_url = increment["state"]["upload_url"]
+            offset = increment["state"]["current_content_length"]
+            received = self._received_bytes(resumable_url)
+            if received is None:  # the last part arrived, the upload is complete
+                return increment["helper"]
+            if received > offset:  # the part arrived, only the response got lost
+                return self.batch_job_helper.GetIncrementalUploadHelper(resumable_url, current_content_length=received)
+
+            # nothing arrived. Without previous parts a new upload is started, the prefix of the request included
+            increment["helper"] = self.batch_job_helper.GetIncrementalUploadHelper(
+                resumable_url if offset else self.batch_job.uploadUrl.url, current_content_length=offset)
+        increment["is_retry"] = True
+        increment["helper"].UploadOperations([operations], is_last=is_last)
+        return increment["helper"]
+
+    @staticmethod
+    def _helper_state(upload_helper):
+        """ Resumable url and offset of an IncrementalUploadHelper, as written by its Dump method
+        :return: dict with keys upload_url and current_content_length
+        """
+        import yaml  # dependency of googleads, only needed for incremental uploads
+
+        output = io.StringIO()
+        upload_helper.Dump(output)
+        return yaml.safe_load(output.getvalue())
+
+    def _upload_serialized_incrementally(self, operation_chunks):
+        """ Serialize chunks with OperationSerializer and upload them as parts of one resumable upload.
+        Parts are sent as soon as RESUMABLE_CHUNK_SIZE bytes are available, the rest waits for the next chunk.
+        :return: int, amount of uploaded operations
+        """
+        print(datetime.datetime.now(), "Upload started...")
+        instrumentation = get_instrumentation()
+        serializer = OperationSerializer(self.adwords_service.api_version, processes=self.serialization_processes)
+        resumable_url = None
+        buffer = bytearray(serializer.prefix().encode("utf-8"))
+        offset = 0
+        amount_operations = 0
+        for chunk in operation_chunks:
+            if not chunk:
+                continue
+            amount_operations += len(chunk)
+            with instrumentation.timer("batch_serialization_seconds"):
+                buffer += "".join(serializer.serialize_operations(chunk)).encode("utf-8")
+
+            sendable = len(buffer) - len(buffer) % RESUMABLE_CHUNK_SIZE
+            if sendable:
+                resumable_url = resumable_url or self._init_resumable_upload()
+                self._put_part(resumable_url, buffer[:sendable], offset)
+                offset += sendable
+                del buffer[:sendable]
+
+        if amount_operations:
+            buffer += serializer.suffix().encode("utf-8")
+            resumable_url = resumable_url or self._init_resumable_upload()
+            self._put_part(resumable_url, buffer, offset, total=offset + len(buffer))
+            instrumentation.count("batch_upload_bytes", offset + len(buffer))
         print(datetime.datetime.now(), "Upload finished...")
+        return amount_operations
+
+    def _put_part(self, resumable_url, data, offset, total=None):
+        """ Put a part of a resumable upload. After a failed put the server is asked how many bytes it has,
+        and only the rest of the part is sent again
+        :param data: bytes
+        :param offset: int, position of the first byte in the whole upload
+        :param total: int, size of the whole upload. None if more parts follow
+        """
+        part = {"url": resumable_url, "data": data, "offset": offset, "total": total, "is_retry": False}
+        with get_instrumentation().timer("batch_upload_seconds"):
+            self._put_remaining(part)
+
+    @ErrorRetryer()
+    def _put_remaining(self, part):
+        """ One attempt of _put_part
+        :param part: dict, arguments of _put_part and whether this is a retry
+        """
+        start = part["offset"]
+        end = part["offset"] + len(part["data"])
+        if part["is_retry"]:
+            received = self._received_bytes(part["url"])
+            if received is None:  # the last part arrived, the upload is complete
+                return
+            if received < start:
+                raise IOError("Server has {received} bytes of the upload, the part starts at {start}".format(
+                    received=received, start=start))
+            start = min(received, end)
+            if start == end:
+                return
+        part["is_retry"] = True
+        self._put_bytes(part["url"], part["data"][start - part["offset"]:], start, part["total"])
+
+    @staticmethod
+    def _received_bytes(resumable_url):
+        """ Ask the server how many bytes of a resumable upload it has received
+        :return: int, None if the upload is complete
+        """
+        status_request = Request(resumable_url, data=b"", method="PUT", headers={"Content-Range": "bytes */*"})
+        try:
+            urlopen(status_request)
+        except HTTPError as error:
+            if error.code != 308:
+                raise
+            received_range = error.headers.get("Range")  # e.g. "bytes=0-1023", missing if nothing was received
+            return int(received_range.rsplit("-", 1)[-1]) + 1 if received_range else 0
+        return None
 
     @ErrorRetryer()
     def _get_batch_job_download_url_when_ready(self, batch_sleep_interval):
@@ -85,6 +331,7 @@ class BatchUploader:
             self._sleep_if_not_ready(poll_attempt, batch_sleep_interval)
             self._update_attributes()
             poll_attempt += 1
+            get_instrumentation().count("batch_poll_attempts")
 
             if "downloadUrl" in self.batch_job:
                 return self.batch_job.downloadUrl.url
@@ -111,12 +358,18 @@ class BatchUploader:
                 'values': [self.batch_job.id]
             }]
         }
-        self.batch_job = self.batch_job_service.get(selector)['entries'][0]
+        with get_instrumentation().timer("api_request_seconds", service="BatchJobService", method="get"):
+            self.batch_job = self.batch_job_service.get(selector)['entries'][0]
 
     def _read_response(self):
         """ Wait for results of batch upload and download them to report on errors """
-        response_xml = urlopen(self.batch_job.downloadUrl.url).read()
-        return self.batch_job_helper.ParseResponse(response_xml)
+        instrumentation = get_instrumentation()
+        with instrumentation.timer("batch_download_seconds"):
+            response_xml = urlopen(self.batch_job.downloadUrl.url).read()
+        instrumentation.count("batch_response_bytes", len(response_xml))
+
+        with instrumentation.timer("batch_parse_seconds"):
+            return self.batch_job_helper.ParseResponse(response_xml)
 
     @staticmethod
     def _parse_partial_failures(response):
@@ -0,0 +1,123 @@
+import numpy as np
+import pandas as pd
+
+from freedan.adwords_objects.keyword import Keyword
+from freedan.other_services.text_handler import TextHandler
+
+KEYWORD_COLUMNS = ["CampaignId", "AdGroupId", "Id", "Criteria", "KeywordMatchType"]
+LEVEL_TO_SCOPE_COLUMNS = {
+    "adgroup": ["CampaignId", "AdGroupId"],
+    "campaign": ["CampaignId"]
+}
+
+
+class DuplicateKeywordFinder:
+    """ Finds keywords with the same standardized text (TextHandler.standardize, lower case) and match type
+    within an adgroup or campaign, e.g. case variants like "Bus Berlin" and "bus berlin".
+
+    Keywords are reduced to their key (scope, text, match type), so reports can be passed in chunks
+    (e.g. pd.read_csv(..., chunksize=...)) and only one small entry per distinct keyword is kept in memory.
+    Per duplicate group one keyword is kept (the winner), the others (losers) can be deleted.
+    """
+    def __init__(self, level="adgroup", keep_by=None):
+        """
+        :param level: str, "adgroup" or "campaign". Scope in which keywords count as duplicates
+        :param keep_by: str, numeric column (e.g. Impressions). Keyword with the highest value is kept.
+                        By default the first keyword seen is kept
+        """
+        assert level in LEVEL_TO_SCOPE_COLUMNS
+        self.scope_columns = LEVEL_TO_SCOPE_COLUMNS[level]
+        self.keep_by = keep_by
+
+        self._winners = dict()  # key -> (keep_by value, keyword as tuple of KEYWORD_COLUMNS)
+        self._losers = list()  # DataFrames of losers incl. Key column
+        self._displaced_winners = list()  # (key, keyword tuple) of winners replaced by better keywords
+
+    def keyword_keys(self, keywords):
+        """ Key per keyword identifying its duplicate group: scope ids, standardized text and match type
+        :param keywords: DataFrame
+        :return: DataFrame with scope columns, Text and MatchType
+        """
+        keys = keywords[self.scope_columns].copy()
+        keys["Text"] = TextHandler.standardize_many(keywords["Criteria"].astype(str), to_lower=True)
+        keys["MatchType"] = keywords["KeywordMatchType"].str.upper()
+        return keys
+
+    def add(self, keywords):
+        """ Process a chunk of keywords
+        :param keywords: DataFrame with KEYWORD_COLUMNS (+ keep_by column)
+        """
+        if keywords.empty:
+            return
+
+        if self.keep_by is not None:
+            keywords = keywords.iloc[np.argsort(-keywords[self.keep_by].values, kind="stable")]
+            values = keywords[self.keep_by].values
+        else:
+            values = np.zeros(len(keywords))
+        keys = self.keyword_keys(keywords)
+        is_chunk_duplicate = keys.duplicated().values
+        keys = pd.Series(list(keys.itertuples(index=False, name=None)), dtype=object).values
+        keywords = keywords[KEYWORD_COLUMNS]
+
+        # duplicates inside the chunk: everything but the first (= best) keyword of a group loses
+        self._add_losers(keywords[is_chunk_duplicate], keys[is_chunk_duplicate])
+
+        # compare the best keyword of each group with winners of previous chunks
+        is_chunk_loser = np.zeros(len(keywords), dtype=bool)
+        rows = keywords.itertuples(index=False, name=None)
+        for position, (row, key, value) in enumerate(zip(rows, keys, values)):
+            if is_chunk_duplicate[position]:
+                continue
+
+            winner = self._winners.get(key)
+            if winner is None:
+                self._winners[key] = (value, row)
+            elif value > winner[0]:
+                self._displaced_winners.append((key, winner[1]))
+                self._winners[key] = (value, row)
+            else:
+                is_chunk_loser[position] = True
+        self._add_losers(keywords[is_chunk_loser], keys[is_chunk_loser])
+
+    def _add_losers(self, keywords, keys):
+        if not keywords.empty:
+            self._losers.append(keywords.assign(Key=list(keys)))
+
+    def duplicates(self):
+        """ All keywords that should be removed, with the id of the keyword that's kept in column DuplicateOfId
+        :return: DataFrame
+        """
+        losers = self._losers
+        if self._displaced_winners:
+            displaced_keys, displaced_rows = zip(*self._displaced_winners)
+            displaced = pd.DataFrame(list(displaced_rows), columns=KEYWORD_COLUMNS)
+            losers = losers + [displaced.assign(Key=list(displaced_keys))]
+
+        if not losers:
+            return pd.DataFrame(columns=KEYWORD_COLUMNS + ["DuplicateOfId"])
+
+        duplicates = pd.concat(losers, ignore_index=True)
+        id_position = KEYWORD_COLUMNS.index("Id")
+        duplicates["DuplicateOfId"] = [self._winners[key][1][id_position] for key in duplicates["Key"]]
+        return duplicates.drop(columns="Key")
+
+    def find(self, chunks):
+        """ Process all chunks and return duplicates
+        :param chunks: DataFrame or iterable of DataFrames
+        :return: DataFrame, see method duplicates
+        """
+        if isinstance(chunks, pd.DataFrame):
+            chunks = [chunks]
+        for chunk in chunks:
+            self.add(chunk)
+        return self.duplicates()
+
+    @staticmethod
+    def delete_operations(duplicates):
+        """ Delete operations for the losers
+        :param duplicates: DataFrame, result of method duplicates
+        :return: list of operations
+        """
+        return [Keyword.delete_operation(adgroup_id=int(adgroup_id), keyword_id=int(keyword_id))
+                for adgroup_id, keyword_id in zip(duplicates["AdGroupId"], duplicates["Id"])]
@@ -0,0 +1,216 @@
+import sqlite3
+import threading
+import collections
+
+from freedan.adwords_objects.account import numeric_customer_id
+from freedan.adwords_services.adwords_service import REPORT_CHUNK_SIZE
+
+Entity = collections.namedtuple("Entity", ["report_type", "fields", "key", "name", "parent", "status", "level"])
+
+# structure per entity. key = unique per account, level = changes (see SyncChanges) that affect the entity
+ENTITIES = collections.OrderedDict([
+    ("campaign", Entity(
+        report_type="CAMPAIGN_PERFORMANCE_REPORT",
+        fields=["CampaignId", "CampaignName", "CampaignStatus", "Amount", "AdvertisingChannelType"],
+        key=["CampaignId"], name="CampaignName", parent=None, status="CampaignStatus", level="campaign")),
+    ("adgroup", Entity(
+        report_type="ADGROUP_PERFORMANCE_REPORT",
+        fields=["CampaignId", "AdGroupId", "AdGroupName", "AdGroupStatus", "CpcBid"],
+        key=["AdGroupId"], name="AdGroupName", parent="CampaignId", status="AdGroupStatus", level="adgroup")),
+    ("keyword", Entity(
+        report_type="KEYWORDS_PERFORMANCE_REPORT",
+        fields=["CampaignId", "AdGroupId", "Id", "Criteria", "KeywordMatchType", "Status", "CpcBid", "FinalUrls"],
+        key=["AdGroupId", "Id"], name="Criteria", parent="AdGroupId", status="Status", level="adgroup")),
+    ("ad", Entity(
+        report_type="AD_PERFORMANCE_REPORT",
+        fields=["CampaignId", "AdGroupId", "Id", "HeadlinePart1", "HeadlinePart2", "Description",
+                "Path1", "Path2", "CreativeFinalUrls", "Status"],
+        key=["AdGroupId", "Id"], name="HeadlinePart1", parent="AdGroupId", status="Status", level="adgroup")),
+])
+ID_COLUMNS = ("CustomerId", "CampaignId", "AdGroupId", "Id")
+
+
+class EntityStore:
+    """ Local SQLite copy of the account structure (campaigns, adgroups, keywords, ads) of one or more accounts.
+    Scripts and operation builders can look up ids, names and children in milliseconds instead of
+    downloading structure reports every time:
+        store = EntityStore("structure.sqlite", adwords_service)
+        store.sync(adwords_service.incremental_sync("sync_state.json"), customer_id)
+        adgroup = store.by_name("adgroup", "Ad Group #1", customer_id)[0]
+        keywords = store.to_frame("keyword", customer_id, AdGroupId=adgroup["AdGroupId"])
+    Tables are named like the entities and contain the report fields of ENTITIES plus CustomerId.
+    """
+    def __init__(self, path, adwords_service=None):
+        """
+        :param path: str, path to sqlite file. ":memory:" for a temporary store
+        :param adwords_service: AdWordsService object, needed for populate and sync
+        """
+        self.path = path
+        self.adwords_service = adwords_service
+        self._lock = threading.RLock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self._create_tables()
+
+    def _create_tables(self):
+        with self._lock, self.connection:
+            for table, entity in ENTITIES.items():
+                columns = ["CustomerId"] + entity.fields
+                definitions = ["{column} {type}".format(column=column, type="INTEGER" if column in ID_COLUMNS else "")
+                               for column in columns]
+                self.connection.execute(
+                    "CREATE TABLE IF NOT EXISTS {table} ({definitions}, PRIMARY KEY ({key}))".format(
+                        table=table, definitions=", ".join(definitions),
+                        key=", ".join(["CustomerId"] + entity.key)))
+                self.connection.execute("CREATE INDEX IF NOT EXISTS {table}_name ON {table} (CustomerId, {name})"
+                                        .format(table=table, name=entity.name))
+                if entity.parent is not None:
+                    self.connection.execute(
+                        "CREATE INDEX IF NOT EXISTS {table}_parent ON {table} (CustomerId, {parent})".format(
+                            table=table, parent=entity.parent))
+
+    def close(self):
+        self.connection.close()
+
+    # ----- populate -----
+    def populate(self, customer_id=None, entities=tuple(ENTITIES), changes=None, chunk_size=REPORT_CHUNK_SIZE):
+        """ Download structure reports of an account into the store. Removed entities are not stored
+        :param customer_id: str, default: currently selected account
+        :param entities: iterable of str, see ENTITIES
+        :param changes: SyncChanges, only reload changed campaigns/adgroups. None = reload everything
+        :param chunk_size: int, report rows per insert. Reports are streamed, so memory only depends on this
+        """
+        if self.adwords_service is None:
+            raise IOError("Please pass an AdWordsService object to populate the store.")
+        customer_id = customer_id or self.adwords_service.client.client_customer_id
+        if changes is not None and changes.is_full_sync:
+            changes = None
+
+        for table in entities:
+            entity = ENTITIES[table]
+            predicates = [{"field": entity.status, "operator": "NOT_EQUALS", "values": "REMOVED"}]
+            scope = None
+            if changes is not None:
+                change_predicates = changes.predicates(entity.level)
+                if change_predicates is None:  # nothing changed on the level of the entity
+                    continue
+                predicates += change_predicates
+                scope = ("CampaignId", changes.campaign_ids) if entity.level == "campaign" \
+                    else ("AdGroupId", changes.adgroup_ids)
+
+            report_def = self.adwords_service.report_definition(entity.report_type, entity.fields, predicates)
+            chunks = self.adwords_service.download_report_chunks(
+                report_def, chunk_size=chunk_size, include_0_imp=True, client_customer_id=customer_id)
+            self._replace(table, customer_id, chunks, scope)
+
+    def _replace(self, table, customer_id, chunks, scope=None):
+        """ Replace all rows of an account (or of the scope) by the rows of the chunks in one transaction
+        :param scope: tuple (column, ids). Only rows with these ids are replaced
+        """
+        entity = ENTITIES[table]
+        columns = ["CustomerId"] + entity.fields
+        insert = "INSERT OR REPLACE INTO {table} ({columns}) VALUES ({placeholders})".format(
+            table=table, columns=", ".join(columns), placeholders=", ".join("?" * len(columns)))
+
+        with self._lock, self.connection:
+            if scope is None:
+                self.connection.execute("DELETE FROM {table} WHERE CustomerId = ?".format(table=table),
+                                        (numeric_customer_id(customer_id),))
+            else:
+                column, ids = scope
+                ids = sorted(int(scope_id) for scope_id in ids)
+                self.connection.execute("DELETE FROM {table} WHERE CustomerId = ? AND {column} IN ({ids})".format(
+                    table=table, column=column, ids=", ".join("?" * len(ids))),
+                    [numeric_customer_id(customer_id)] + ids)
+
+            for chunk in chunks:
+                chunk = chunk[entity.fields].astype(object).where(chunk[entity.fields].notnull(), None)
+                chunk.insert(0, "CustomerId", numeric_customer_id(customer_id))
+                self.connection.executemany(insert, chunk.itertuples(index=False, name=None))
+
+    def sync(self, incremental_sync, customer_id=None, entities=tuple(ENTITIES)):
+        """ Bring the store up to date with the changes since the last sync of the account
+        :param incremental_sync: IncrementalSync object. Use a state file dedicated to this store
+        :param customer_id: str, default: currently selected account
+        :param entities: iterable of str, see ENTITIES
+        :return: SyncChanges
+        """
+        customer_id = customer_id or self.adwords_service.client.client_customer_id
+        changes = incremental_sync.changes(customer_id)
+        if not changes.is_empty:
+            self.populate(customer_id, entities, changes)
+        incremental_sync.commit(changes)
+        return changes
+
+    # ----- lookups -----
+    def _select(self, table, customer_id, filters, limit=None):
+        assert table in ENTITIES
+        conditions = ["CustomerId = ?"]
+        values = [numeric_customer_id(customer_id)]
+        for column, value in filters.items():
+            if column not in ENTITIES[table].fields:
+                raise LookupError("{table} has no column {column}.".format(table=table, column=column))
+            conditions.append("{column} = ?".format(column=column))
+            values.append(value)
+
+        query = "SELECT * FROM {table} WHERE {conditions}".format(table=table, conditions=" AND ".join(conditions))
+        if limit is not None:
+            query += " LIMIT {limit}".format(limit=int(limit))
+        return query, values
+
+    def find(self, table, customer_id, **filters):
+        """ All entities matching the filters, e.g. find("keyword", customer_id, AdGroupId=1, Status="enabled")
+        :return: list of dicts
+        """
+        query, values = self._select(table, customer_id, filters)
+        with self._lock:
+            return [dict(row) for row in self.connection.execute(query, values)]
+
+    def get(self, table, entity_id, customer_id, adgroup_id=None):
+        """ Entity by id. Keyword and ad ids are only unique per adgroup, so pass adgroup_id for them
+        :return: dict, None if not found
+        """
+        id_column = ENTITIES[table].key[-1]
+        filters = {id_column: int(entity_id)}
+        if adgroup_id is not None:
+            filters["AdGroupId"] = int(adgroup_id)
+        query, values = self._select(table, customer_id, filters, limit=1)
+        with self._lock:
+            row = self.connection.execute(query, values).fetchone()
+        return dict(row) if row is not None else None
+
+    def by_name(self, table, name, customer_id):
+        """ Entities with a name (campaign/adgroup name, keyword text, ad headline) """
+        return self.find(table, customer_id, **{ENTITIES[table].name: name})
+
+    def children(self, table, parent_id, customer_id):
+        """ Entities below a parent, e.g. children("adgroup", campaign_id, customer_id) """
+        parent = ENTITIES[table].parent
+        if parent is None:
+            raise LookupError("{table} has no parent.".format(table=table))
+        return self.find(table, customer_id, **{parent: int(parent_id)})
+
+    def to_frame(self, table, customer_id=None, **filters):
+        """ Entities as DataFrame, like the structure report they were downloaded from
+        :param customer_id: str, None = all accounts
+        :return: DataFrame
+        """
+        import pandas as pd  # heavy import, only needed for exports
+
+        assert table in ENTITIES
+        if customer_id is None:
+            query, values = "SELECT * FROM {table}".format(table=table), list()
+        else:
+            query, values = self._select(table, customer_id, filters)
+        with self._lock:
+            return pd.read_sql_query(query, self.connection, params=values)
+
+    def count(self, table, customer_id=None):
+        query = "SELECT COUNT(*) FROM {table}".format(table=table)
+        values = list()
+        if customer_id is not None:
+            query += " WHERE CustomerId = ?"
+            values.append(numeric_customer_id(customer_id))
+        with self._lock:
+            return self.connection.execute(query, values).fetchone()[0]
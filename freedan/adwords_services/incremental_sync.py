@@ -0,0 +1,194 @@
+import os
+import json
+import datetime
+import threading
+
+from freedan.other_services.error_retryer import ErrorRetryer
+
+SYNC_DAYS_LIMIT = 90  # CustomerSyncService only knows changes of the last 90 days
+UNCHANGED = "FIELDS_UNCHANGED"
+TIMESTAMP_FORMAT = "%Y%m%d %H%M%S"
+STATE_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# lists of a change data object that are only present if something changed
+CAMPAIGN_CHANGE_LISTS = ("changedAdGroups", "addedCampaignCriteria", "removedCampaignCriteria",
+                         "changedFeeds", "removedFeeds")
+ADGROUP_CHANGE_LISTS = ("changedCriteria", "removedCriteria", "changedAds", "changedFeeds", "removedFeeds")
+
+
+class SyncChanges:
+    """ Campaigns and adgroups of an account that changed since its last sync """
+    def __init__(self, customer_id, since, until, campaign_ids=None, adgroup_ids=None):
+        """
+        :param customer_id: str
+        :param since: datetime (UTC) of the last sync. None = full sync, everything has to be processed
+        :param until: datetime (UTC) this sync covers changes up to
+        :param campaign_ids: set of ints, changed campaigns (incl. campaigns with changed adgroups)
+        :param adgroup_ids: set of ints, changed adgroups
+        """
+        self.customer_id = customer_id
+        self.since = since
+        self.until = until
+        self.campaign_ids = campaign_ids or set()
+        self.adgroup_ids = adgroup_ids or set()
+
+    @property
+    def is_full_sync(self):
+        return self.since is None
+
+    @property
+    def is_empty(self):
+        """ Nothing changed, the account can be skipped """
+        return not self.is_full_sync and not self.campaign_ids and not self.adgroup_ids
+
+    def predicates(self, level="adgroup"):
+        """ Report predicates restricting a report to the changed campaigns or adgroups
+        :param level: str, "campaign" or "adgroup"
+        :return: list of dicts, empty for full syncs.
+                 None if nothing changed on this level: AdWords rejects IN predicates without values,
+                 so the report has to be skipped
+        """
+        assert level in ("campaign", "adgroup")
+        if self.is_full_sync:
+            return list()
+
+        field, ids = ("CampaignId", self.campaign_ids) if level == "campaign" else ("AdGroupId", self.adgroup_ids)
+        if not ids:
+            return None
+        return [{
+            "field": field,
+            "operator": "IN",
+            "values": sorted(ids)
+        }]
+
+    def __repr__(self):
+        if self.is_full_sync:
+            return "Full sync of account {id}".format(id=self.customer_id)
+        return "Account {id}: {campaigns} changed campaign(s), {adgroups} changed adgroup(s) since {since}".format(
+            id=self.customer_id, campaigns=len(self.campaign_ids), adgroups=len(self.adgroup_ids), since=self.since)
+
+
+class IncrementalSync:
+    """ Only reprocess what changed since the last run, based on the change history of CustomerSyncService.
+    The time of the last sync is persisted per account in a json file:
+        sync = IncrementalSync(adwords_service, "sync_state.json")
+        for account in adwords_service.accounts():
+            changes = sync.changes()
+            predicates = changes.predicates("adgroup")
+            if predicates is None:  # no adgroup changed
+                sync.commit(changes)
+                continue
+            predicates += base_predicates
+            ... download and process reports ...
+            sync.commit(changes)  # only after processing succeeded
+
+    The first sync of an account (or one older than SYNC_DAYS_LIMIT days) is a full sync.
+    Changes close to the sync time might be reported twice, but never get lost.
+    """
+    def __init__(self, adwords_service, state_path):
+        """
+        :param adwords_service: AdWordsService object
+        :param state_path: str, path to json file with the last sync time per account
+        """
+        self.adwords_service = adwords_service
+        self.state_path = state_path
+        self._lock = threading.Lock()
+        self.state = self._load()
+
+    def _load(self):
+        if not os.path.exists(self.state_path):
+            return dict()
+        with open(self.state_path) as state_file:
+            return json.load(state_file)
+
+    def _save(self):
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        temp_path = self.state_path + ".tmp"
+        with open(temp_path, "w") as state_file:
+            json.dump(self.state, state_file, indent=2, sort_keys=True)
+        os.replace(temp_path, self.state_path)  # atomic, so an interrupted run never corrupts the state
+
+    def last_sync(self, customer_id):
+        """ UTC datetime of the last committed sync of an account, None if it was never synced """
+        with self._lock:
+            account_state = self.state.get(str(customer_id))
+        if account_state is None:
+            return None
+        return datetime.datetime.strptime(account_state["last_sync"], STATE_TIMESTAMP_FORMAT)
+
+    def changes(self, customer_id=None):
+        """ Changes of an account since its last sync
+        :param customer_id: str, default: currently selected account
+        :return: SyncChanges
+        """
+        customer_id = customer_id or self.adwords_service.client.client_customer_id
+        until = datetime.datetime.utcnow().replace(microsecond=0)
+        since = self.last_sync(customer_id)
+        if since is None or until - since >= datetime.timedelta(days=SYNC_DAYS_LIMIT):
+            return SyncChanges(customer_id, since=None, until=until)
+
+        campaign_ids = self._campaign_ids(customer_id)
+        if not campaign_ids:
+            return SyncChanges(customer_id, since, until)
+
+        change_data = self._customer_changes(customer_id, campaign_ids, since, until)
+        campaign_ids, adgroup_ids = self.changed_ids(change_data)
+        return SyncChanges(customer_id, since, until, campaign_ids, adgroup_ids)
+
+    def commit(self, changes):
+        """ Store the sync time of processed changes. The next sync starts from there """
+        with self._lock:
+            self.state[str(changes.customer_id)] = {"last_sync": changes.until.strftime(STATE_TIMESTAMP_FORMAT)}
+            self._save()
+
+    def _campaign_ids(self, customer_id):
+        """ Ids of all campaigns of an account. CustomerSyncService needs them in its selector """
+        client = self._client(customer_id)
+        campaign_ids = list()
+        for page in self.adwords_service._pages({"fields": ["Id"]}, "CampaignService", client=client):
+            campaign_ids += [campaign.id for campaign in (page["entries"] if "entries" in page else list())]
+        return campaign_ids
+
+    @ErrorRetryer()
+    def _customer_changes(self, customer_id, campaign_ids, since, until):
+        """ CustomerChangeData of CustomerSyncService """
+        selector = {
+            "dateTimeRange": {
+                "min": since.strftime(TIMESTAMP_FORMAT) + " UTC",
+                "max": until.strftime(TIMESTAMP_FORMAT) + " UTC"
+            },
+            "campaignIds": campaign_ids
+        }
+        service = self.adwords_service.init_service("CustomerSyncService", self._client(customer_id))
+        return service.get(selector)
+
+    def _client(self, customer_id):
+        """ Client fixed to an account, so syncs don't depend on the currently selected account """
+        client = self.adwords_service.top_level_client()
+        client.SetClientCustomerId(customer_id)
+        return client
+
+    @staticmethod
+    def changed_ids(change_data):
+        """ Changed campaigns and adgroups of a CustomerChangeData object
+        :return: tuple of sets, (campaign ids, adgroup ids)
+        """
+        campaign_ids = set()
+        adgroup_ids = set()
+        for campaign in (change_data["changedCampaigns"] if "changedCampaigns" in change_data else list()):
+            for adgroup in (campaign["changedAdGroups"] if "changedAdGroups" in campaign else list()):
+                if _has_changes(adgroup, "adGroupChangeStatus", ADGROUP_CHANGE_LISTS):
+                    adgroup_ids.add(int(adgroup["adGroupId"]))
+
+            if _has_changes(campaign, "campaignChangeStatus", CAMPAIGN_CHANGE_LISTS):
+                campaign_ids.add(int(campaign["campaignId"]))
+        return campaign_ids, adgroup_ids
+
+
+def _has_changes(change_data, status_field, change_lists):
+    if status_field in change_data and change_data[status_field] != UNCHANGED:
+        return True
+    return any(field in change_data and change_data[field] for field in change_lists)
@@ -0,0 +1,139 @@
+import collections
+import pandas as pd
+
+from freedan.other_services.text_handler import TextHandler
+
+KEYWORD_FIELDS = ["CampaignId", "AdGroupId", "Id", "Criteria", "KeywordMatchType"]
+NOT_REMOVED_PREDICATES = [{
+    "field": "Status",
+    "operator": "NOT_EQUALS",
+    "values": "REMOVED"
+}, {
+    "field": "AdGroupStatus",
+    "operator": "NOT_EQUALS",
+    "values": "REMOVED"
+}, {
+    "field": "CampaignStatus",
+    "operator": "NOT_EQUALS",
+    "values": "REMOVED"
+}]
+NO_MATCH = -1
+
+
+class KeywordIndex:
+    """ Index of keywords for matching search queries without scanning the keyword DataFrame.
+    Keywords and queries are compared on their standardized (TextHandler.standardize, lower case) tokens:
+        - EXACT: query tokens equal keyword tokens
+        - PHRASE: keyword tokens appear as contiguous sequence in the query (looked up via token n-grams)
+        - BROAD: all keyword tokens are part of the query (broad modified semantics). Real broad keywords
+                 additionally match close variants/synonyms, which can't be determined offline
+
+    Those are also the semantics of negative keywords, so the index is used for conflict detection as well.
+    Entries can be grouped in scopes (e.g. per adgroup); a lookup then only considers the given scope.
+    """
+    def __init__(self, keywords, scope_column=None):
+        """
+        :param keywords: DataFrame with columns Criteria and KeywordMatchType, e.g. a KEYWORDS_PERFORMANCE_REPORT
+        :param scope_column: str, column identifying the scope of a keyword. None means one global scope
+        """
+        self.keywords = keywords.reset_index(drop=True)
+        self.scope_column = scope_column
+
+        self._exact = dict()  # (scope, tokens) -> keyword positions
+        self._phrase = dict()  # (scope, tokens) -> keyword positions
+        self._broad = dict()  # (scope, rarest token) -> list of (token set, keyword position)
+        self.max_phrase_length = 0
+        self._build()
+
+    @classmethod
+    def from_adwords(cls, adwords_service, client_customer_id=None):
+        """ Index of all keywords that aren't removed in an account
+        :param adwords_service: AdWordsService object
+        :param client_customer_id: str, defaults to the currently selected account
+        :return: KeywordIndex
+        """
+        report_def = adwords_service.report_definition(
+            "KEYWORDS_PERFORMANCE_REPORT", KEYWORD_FIELDS, NOT_REMOVED_PREDICATES)
+        keywords = adwords_service.download_report(report_def, include_0_imp=True,
+                                                   client_customer_id=client_customer_id)
+        return cls(keywords)
+
+    @staticmethod
+    def tokens(text):
+        """ Standardized tokens of a keyword or query. Pluses of broad modified keywords are removed as well """
+        return tuple(TextHandler.standardize(text, to_lower=True).split())
+
+    def _build(self):
+        """ Fill lookup tables for all match types """
+        texts = TextHandler.standardize_many(self.keywords["Criteria"].astype(str), to_lower=True)
+        token_lists = [tuple(text.split()) for text in texts]
+        match_types = self.keywords["KeywordMatchType"].str.upper().tolist()
+        if self.scope_column is None:
+            scopes = [None] * len(self.keywords)
+        else:
+            scopes = self.keywords[self.scope_column].tolist()
+
+        # broad keywords are indexed by their rarest token to keep candidate lists short
+        token_counts = collections.Counter(
+            token for tokens, match_type in zip(token_lists, match_types) if match_type == "BROAD"
+            for token in set(tokens))
+
+        for position, (tokens, match_type, scope) in enumerate(zip(token_lists, match_types, scopes)):
+            if not tokens:
+                continue
+
+            if match_type == "EXACT":
+                self._exact.setdefault((scope, tokens), list()).append(position)
+            elif match_type == "PHRASE":
+                self._phrase.setdefault((scope, tokens), list()).append(position)
+                self.max_phrase_length = max(self.max_phrase_length, len(tokens))
+            elif match_type == "BROAD":
+                token_set = frozenset(tokens)
+                anchor = min(token_set, key=lambda token: (token_counts[token], token))
+                self._broad.setdefault((scope, anchor), list()).append((token_set, position))
+            else:
+                raise ValueError("Unknown match type: {match_type}".format(match_type=match_type))
+
+    def lookup(self, query, scope=None, is_standardized=False):
+        """ All keywords matching a query, exact matches first, then phrase (longest first), then broad
+        :param query: str
+        :param scope: scope value, see scope_column
+        :param is_standardized: bool, query is already standardized and lower case
+        :return: list of int, positions in self.keywords
+        """
+        tokens = tuple(query.split()) if is_standardized else self.tokens(query)
+        matches = list(self._exact.get((scope, tokens), tuple()))
+
+        amount_tokens = len(tokens)
+        for length in range(min(amount_tokens, self.max_phrase_length), 0, -1):
+            for start in range(amount_tokens - length + 1):
+                matches += self._phrase.get((scope, tokens[start:start + length]), tuple())
+
+        token_set = set(tokens)
+        for token in token_set:
+            for keyword_tokens, position in self._broad.get((scope, token), tuple()):
+                if keyword_tokens <= token_set:
+                    matches.append(position)
+        return list(dict.fromkeys(matches))  # unique, but keep priority order
+
+    def match_queries(self, queries, scope=None):
+        """ Best matching keyword for every query
+        :param queries: pd.Series or iterable of str
+        :param scope: scope value, see scope_column
+        :return: DataFrame aligned to the queries with column Query and the keyword columns (NaN if no match)
+        """
+        if not isinstance(queries, pd.Series):
+            queries = pd.Series(list(queries))
+
+        standardized = TextHandler.standardize_many(queries, to_lower=True)
+        best_match = dict()
+        for text in standardized.unique():
+            if isinstance(text, str):
+                matches = self.lookup(text, scope=scope, is_standardized=True)
+                best_match[text] = matches[0] if matches else NO_MATCH
+
+        positions = standardized.map(best_match).fillna(NO_MATCH).astype(int)
+        matched = self.keywords.reindex(positions.values)  # NO_MATCH isn't part of the index -> NaN
+        matched.index = queries.index
+        matched.insert(0, "Query", queries)
+        return matched
@@ -0,0 +1,145 @@
+import concurrent.futures
+import numpy as np
+import pandas as pd
+
+from freedan.adwords_objects.keyword import Keyword
+from freedan.adwords_services.batch_uploader import BatchUploader
+from freedan.adwords_services.report_helper import parse_final_urls
+
+KEYWORD_COLUMNS = ["AdGroupId", "Id", "Criteria", "KeywordMatchType", "CpcBid", "Status", "FinalUrls"]
+DEFAULT_MAX_PARALLEL_JOBS = 4
+DEFAULT_OPERATIONS_PER_JOB = 100000
+
+
+class KeywordMigration:
+    """ Replaces keywords by keywords with new texts, e.g. broad to broad modified or lower case.
+    Texts of keywords can't be changed in AdWords, so every keyword is added with its new text (keeping match type,
+    bid, status and final url) and the old keyword is deleted.
+
+    Keywords are grouped by adgroup into batch jobs that run in parallel. Within a job all adds are uploaded first,
+    the results are checked and only keywords whose replacement was added successfully are deleted.
+    So a failing add never leaves an adgroup without its keyword.
+    CAUTION: The history of replaced keywords is lost.
+    """
+    def __init__(self, adwords_service, max_parallel_jobs=DEFAULT_MAX_PARALLEL_JOBS,
+                 operations_per_job=DEFAULT_OPERATIONS_PER_JOB, batch_sleep_interval=-1, fast_serialization=False):
+        """
+        :param adwords_service: AdWordsService object, keywords belong to the currently selected account
+        :param max_parallel_jobs: int, batch jobs running at the same time
+        :param operations_per_job: int, keywords per batch job. Adgroups are never split
+        :param batch_sleep_interval: int, -1 = exponential
+        :param fast_serialization: bool, write xml directly instead of going through suds
+        """
+        self.adwords_service = adwords_service
+        self.max_parallel_jobs = max_parallel_jobs
+        self.operations_per_job = operations_per_job
+        self.batch_sleep_interval = batch_sleep_interval
+        self.fast_serialization = fast_serialization
+
+    def migrate(self, keywords, new_texts, is_debug):
+        """ Replace keywords
+        :param keywords: DataFrame with KEYWORD_COLUMNS, e.g. from a KEYWORDS_PERFORMANCE_REPORT,
+                         or iterable of DataFrames, e.g. filtered chunks of AdWordsService.download_report_chunks.
+                         Only pass keywords that need to be changed
+        :param new_texts: function str -> str applied to column Criteria or iterable aligned to keywords
+        :param is_debug: bool
+        :return: DataFrame, keywords with columns NewCriteria, IsAdded and IsDeleted
+        """
+        if not isinstance(keywords, pd.DataFrame):
+            keywords = list(keywords)
+            keywords = pd.concat(keywords) if keywords else pd.DataFrame(columns=KEYWORD_COLUMNS)
+        keywords = keywords.reset_index(drop=True)
+        if callable(new_texts):
+            new_texts = keywords["Criteria"].map(new_texts)
+        keywords = keywords.assign(NewCriteria=list(new_texts), FinalUrl=parse_final_urls(keywords["FinalUrls"]),
+                                   IsAdded=False, IsDeleted=False)
+
+        jobs = self.split_by_adgroup(keywords)
+        print("\nMigrating {num} keywords in {jobs} batch job(s).".format(num=len(keywords), jobs=len(jobs)))
+        print("##### OperationUpload is LIVE: {is_live}. #####".format(is_live=(not is_debug)))
+
+        if is_debug or not jobs:
+            for positions in jobs:
+                self.add_operations(keywords.iloc[positions])  # validates the new keywords
+            return keywords.drop(columns="FinalUrl")
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.max_parallel_jobs, len(jobs))) as executor:
+            results = executor.map(self._migrate_job, [keywords.iloc[positions] for positions in jobs])
+            for positions, (is_added, is_deleted) in zip(jobs, results):
+                keywords.loc[positions, "IsAdded"] = is_added
+                keywords.loc[positions, "IsDeleted"] = is_deleted
+
+        print("\nAdded {added} and deleted {deleted} of {num} keywords.".format(
+            added=keywords["IsAdded"].sum(), deleted=keywords["IsDeleted"].sum(), num=len(keywords)))
+        return keywords.drop(columns="FinalUrl")
+
+    def split_by_adgroup(self, keywords):
+        """ Positions of keywords per batch job. Keywords of an adgroup always end up in the same job
+        :param keywords: DataFrame with default index
+        :return: list of np.arrays
+        """
+        if keywords.empty:
+            return list()
+
+        sizes = keywords.groupby("AdGroupId", sort=True).size()
+        job_of_adgroup = (sizes.cumsum() - 1) // self.operations_per_job
+        job_numbers = keywords["AdGroupId"].map(job_of_adgroup).values
+        return [np.flatnonzero(job_numbers == job_number) for job_number in np.unique(job_numbers)]
+
+    @staticmethod
+    def add_operations(keywords):
+        """ Add operations of the new keywords
+        :param keywords: DataFrame with KEYWORD_COLUMNS + NewCriteria and FinalUrl
+        :return: list of operations
+        """
+        columns = ["AdGroupId", "NewCriteria", "KeywordMatchType", "CpcBid", "Status", "FinalUrl"]
+        operations = list()
+        for adgroup_id, text, match_type, bid, status, final_url in zip(*(keywords[column] for column in columns)):
+            final_url = final_url if isinstance(final_url, str) else None
+            keyword = Keyword(text=text, match_type=match_type, bid=int(bid), final_url=final_url)
+            operations.append(keyword.add_operation(int(adgroup_id), status=status.upper()))
+        return operations
+
+    @staticmethod
+    def successful(response, amount_operations):
+        """ Which operations of a batch job succeeded
+        :param response: parsed response of the batch job
+        :param amount_operations: int
+        :return: np.array of bools
+        """
+        is_successful = np.zeros(amount_operations, dtype=bool)
+        if response is None or "rval" not in response["mutateResponse"]:
+            return is_successful
+
+        return_values = response["mutateResponse"]["rval"]
+        if not isinstance(return_values, list):
+            return_values = [return_values]
+        for data in return_values:
+            if "result" in data and "errorList" not in data:
+                is_successful[int(data["index"])] = True
+        return is_successful
+
+    def _migrate_job(self, keywords):
+        """ Add new keywords, then delete the old keywords whose replacement was added
+        :return: tuple of np.arrays of bools, (is_added, is_deleted)
+        """
+        add_operations = self.add_operations(keywords)
+        is_added = self.successful(self._upload(add_operations), len(add_operations))
+
+        is_deleted = np.zeros(len(keywords), dtype=bool)
+        replaced = keywords[is_added]
+        if not replaced.empty:
+            delete_operations = [Keyword.delete_operation(adgroup_id=int(adgroup_id), keyword_id=int(keyword_id))
+                                 for adgroup_id, keyword_id in zip(replaced["AdGroupId"], replaced["Id"])]
+            is_deleted[is_added] = self.successful(self._upload(delete_operations), len(delete_operations))
+        return is_added, is_deleted
+
+    def _upload(self, operations):
+        """ Upload operations in one batch job and wait for the results
+        :return: parsed response of the batch job
+        """
+        batch_uploader = BatchUploader(self.adwords_service, is_debug=False, report_on_results=True,
+                                       batch_sleep_interval=self.batch_sleep_interval,
+                                       fast_serialization=self.fast_serialization)
+        response, _ = batch_uploader.execute((operations, ))
+        return response
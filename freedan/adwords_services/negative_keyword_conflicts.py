@@ -0,0 +1,76 @@
+import collections
+import pandas as pd
+
+from freedan.adwords_services.keyword_index import KeywordIndex
+from freedan.other_services.text_handler import TextHandler
+
+CONFLICT_COLUMNS = [
+    "CampaignId", "AdGroupId", "Id", "Criteria", "KeywordMatchType",
+    "NegativeLevel", "NegativeScopeId", "NegativeCriteria", "NegativeMatchType"
+]
+
+
+class NegativeKeywordConflictChecker:
+    """ Finds negative keywords that block our own positive keywords.
+
+    Negatives are indexed per scope (adgroup, campaign, shared set) with KeywordIndex, so every positive keyword
+    only needs a few lookups instead of a cross join with all negatives. A negative blocks a keyword if the keyword
+    text would be blocked as a search query:
+        - EXACT: same tokens in the same order
+        - PHRASE: negative tokens appear as contiguous sequence in the keyword
+        - BROAD: all negative tokens are part of the keyword
+    Texts are compared on TextHandler-standardized, lower case tokens.
+    """
+    def __init__(self, adgroup_negatives=None, campaign_negatives=None,
+                 shared_set_negatives=None, campaign_shared_sets=None):
+        """
+        All negatives are DataFrames with columns Criteria and KeywordMatchType plus the id of their scope
+        :param adgroup_negatives: DataFrame, scope column AdGroupId
+        :param campaign_negatives: DataFrame, scope column CampaignId
+        :param shared_set_negatives: DataFrame, scope column SharedSetId
+        :param campaign_shared_sets: DataFrame with columns CampaignId and SharedSetId, which campaign uses which set
+        """
+        self.indexes = collections.OrderedDict()
+        for level, negatives, scope_column in [("adgroup", adgroup_negatives, "AdGroupId"),
+                                               ("campaign", campaign_negatives, "CampaignId"),
+                                               ("shared_set", shared_set_negatives, "SharedSetId")]:
+            if negatives is not None and not negatives.empty:
+                self.indexes[level] = KeywordIndex(negatives, scope_column=scope_column)
+
+        self.shared_sets_of_campaign = collections.defaultdict(list)
+        if campaign_shared_sets is not None:
+            for campaign_id, shared_set_id in zip(campaign_shared_sets["CampaignId"],
+                                                  campaign_shared_sets["SharedSetId"]):
+                self.shared_sets_of_campaign[campaign_id].append(shared_set_id)
+
+    def _scopes(self, level, campaign_id, adgroup_id):
+        """ Scopes of a level that apply to a keyword """
+        if level == "adgroup":
+            return [adgroup_id]
+        elif level == "campaign":
+            return [campaign_id]
+        return self.shared_sets_of_campaign.get(campaign_id, list())
+
+    def conflicts(self, keywords):
+        """ All pairs of positive keywords and negatives blocking them
+        :param keywords: DataFrame with columns CampaignId, AdGroupId, Criteria and KeywordMatchType
+        :return: DataFrame, one row per conflict. See CONFLICT_COLUMNS
+        """
+        keyword_columns = [column for column in CONFLICT_COLUMNS[:5] if column in keywords.columns]
+        standardized_texts = TextHandler.standardize_many(keywords["Criteria"].astype(str), to_lower=True)
+
+        rows = list()
+        for keyword, text in zip(keywords[keyword_columns].itertuples(index=False), standardized_texts):
+            keyword = keyword._asdict()
+            tokens = " ".join(text.split())
+
+            for level, index in self.indexes.items():
+                for scope in self._scopes(level, keyword.get("CampaignId"), keyword.get("AdGroupId")):
+                    for position in index.lookup(tokens, scope=scope, is_standardized=True):
+                        negative = index.keywords.iloc[position]
+                        rows.append(dict(keyword, NegativeLevel=level, NegativeScopeId=scope,
+                                         NegativeCriteria=negative["Criteria"],
+                                         NegativeMatchType=negative["KeywordMatchType"].upper()))
+
+        columns = keyword_columns + CONFLICT_COLUMNS[5:]
+        return pd.DataFrame(rows, columns=columns)
@@ -0,0 +1,205 @@
+import collections
+
+# (xsi_type of operation, path to the temp id an ADD operation defines) -> kind of temp id
+DEFINITIONS = {
+    "BudgetOperation": ("budgetId", "budget"),
+    "CampaignOperation": ("id", "campaign"),
+    "AdGroupOperation": ("id", "adgroup"),
+}
+
+# fields of an operand referencing other objects -> kind of temp id
+REFERENCES = {
+    "campaignId": "campaign",
+    "adGroupId": "adgroup",
+}
+
+
+class OperationPlanner:
+    """ Orders batch job operations by their temporary ids.
+    Budgets have to be created before the campaigns using them, campaigns before their adgroups,
+    adgroups before their keywords, ads, labels, ...
+
+    The planner inspects budgetId, campaignId and adGroupId of all operations, builds a dependency graph
+    and derives a valid order. Operations touching the same existing budget, campaign, adgroup or criterion
+    (e.g. a REMOVE and a re-ADD of a keyword) keep the order they were passed in.
+    Operations that share neither temporary nor existing ids are independent from another,
+    so they can be uploaded in separate batch jobs in parallel.
+    """
+    def __init__(self, operations):
+        """
+        :param operations: list of operations or tuple of lists of operations (in any order)
+        """
+        if isinstance(operations, tuple):
+            operations = [operation for part in operations for operation in part]
+        self.operations = list(operations)
+
+        self.dependencies = [set() for _ in self.operations]  # index -> indexes it depends on
+        self.predecessors = [set() for _ in self.operations]  # index -> previous indexes touching the same objects
+        self._build_graph()
+
+    @staticmethod
+    def is_temp_id(value):
+        """ Temporary ids are negative ints """
+        try:
+            return int(value) < 0
+        except (TypeError, ValueError):
+            return False
+
+    @staticmethod
+    def defined_temp_id(operation):
+        """ (kind, temp id) created by this operation or None """
+        if operation.get("operator") != "ADD" or operation.get("xsi_type") not in DEFINITIONS:
+            return None
+
+        field, kind = DEFINITIONS[operation["xsi_type"]]
+        temp_id = operation["operand"].get(field)
+        if not OperationPlanner.is_temp_id(temp_id):
+            return None
+        return kind, int(temp_id)
+
+    @staticmethod
+    def referenced_temp_ids(operation):
+        """ (kind, temp id) tuples this operation relies on """
+        operand = operation.get("operand", dict())
+        references = list()
+        for field, kind in REFERENCES.items():
+            if OperationPlanner.is_temp_id(operand.get(field)):
+                references.append((kind, int(operand[field])))
+
+        budget = operand.get("budget")
+        if isinstance(budget, dict) and OperationPlanner.is_temp_id(budget.get("budgetId")):
+            references.append(("budget", int(budget["budgetId"])))
+        return references
+
+    @staticmethod
+    def existing_ids(operation):
+        """ (kind, id) tuples of existing objects this operation touches """
+        operand = operation.get("operand", dict())
+        candidates = [(kind, operand.get(field)) for field, kind in REFERENCES.items()]
+        if operation.get("xsi_type") in DEFINITIONS:
+            field, kind = DEFINITIONS[operation["xsi_type"]]
+            candidates.append((kind, operand.get(field)))
+
+        budget = operand.get("budget")
+        if isinstance(budget, dict):
+            candidates.append(("budget", budget.get("budgetId")))
+        criterion = operand.get("criterion")
+        if isinstance(criterion, dict):
+            candidates.append(("criterion", criterion.get("id")))
+        candidates.append(("criterion", operand.get("criterionId")))
+
+        existing_ids = set()
+        for kind, value in candidates:
+            if value is not None and not OperationPlanner.is_temp_id(value):
+                existing_ids.add((kind, int(value)))
+        return existing_ids
+
+    def _build_graph(self):
+        """ Link every operation to the operations defining the temporary ids it references """
+        definitions = dict()
+        for index, operation in enumerate(self.operations):
+            defined = self.defined_temp_id(operation)
+            if defined is None:
+                continue
+            if defined in definitions:
+                raise IOError("Temporary id {id} ({kind}) is defined multiple times.".format(
+                    id=defined[1], kind=defined[0]))
+            definitions[defined] = index
+
+        for index, operation in enumerate(self.operations):
+            for reference in self.referenced_temp_ids(operation):
+                if reference not in definitions:
+                    raise IOError("Operation {index} references temporary id {id} ({kind}), "
+                                  "but no operation creates it.".format(index=index, id=reference[1], kind=reference[0]))
+                if definitions[reference] != index:
+                    self.dependencies[index].add(definitions[reference])
+
+        last_operation = dict()  # (kind, id) -> index of the latest operation touching it
+        for index, operation in enumerate(self.operations):
+            for existing_id in self.existing_ids(operation):
+                if existing_id in last_operation:
+                    self.predecessors[index].add(last_operation[existing_id])
+                last_operation[existing_id] = index
+
+    def levels(self, indexes=None):
+        """ Topological levels: operations of a level only depend on operations of previous levels
+        and never come before their predecessors
+        :param indexes: iterable of int, subset of operations. Default: all
+        :return: list of lists of operation indexes, original order is kept within a level
+        """
+        indexes = range(len(self.operations)) if indexes is None else sorted(indexes)
+        level_of = dict()
+        levels = list()
+        remaining = list(indexes)
+        while remaining:
+            current = list()
+            for index in remaining:
+                # predecessors may be part of the current level, they come first within it
+                if all(level_of.get(dep, len(levels)) < len(levels) for dep in self.dependencies[index]) and \
+                        all(pred in level_of for pred in self.predecessors[index]):
+                    level_of[index] = len(levels)
+                    current.append(index)
+            if not current:
+                raise IOError("Operations have circular dependencies.")
+            levels.append(current)
+
+            current = set(current)
+            remaining = [index for index in remaining if index not in current]
+        return levels
+
+    def order(self, indexes=None):
+        """ Operations in a valid upload order, grouped by level and operation type
+        :param indexes: iterable of int, subset of operations. Default: all
+        :return: tuple of lists of operations, as expected by AdWordsService.upload(method="batch")
+        """
+        ordered = list()
+        for level in self.levels(indexes):
+            parts = list()  # (xsi_type, operations)
+            part_of = dict()  # index -> position of its part
+            for index in level:
+                xsi_type = self.operations[index].get("xsi_type")
+                # join the last part of the same type, unless a predecessor is in a later part
+                earliest = max([part_of[pred] for pred in self.predecessors[index] if pred in part_of] + [0])
+                position = next((position for position in range(len(parts) - 1, earliest - 1, -1)
+                                 if parts[position][0] == xsi_type), None)
+                if position is None:
+                    parts.append((xsi_type, list()))
+                    position = len(parts) - 1
+                parts[position][1].append(self.operations[index])
+                part_of[index] = position
+            ordered += [operations for _, operations in parts]
+        return tuple(ordered)
+
+    def independent_groups(self):
+        """ Connected components of the dependency graph.
+        Operations of different groups share neither temporary ids nor existing objects
+        :return: list of lists of operation indexes
+        """
+        parent = list(range(len(self.operations)))
+
+        def find(index):
+            while parent[index] != index:
+                parent[index] = parent[parent[index]]
+                index = parent[index]
+            return index
+
+        for index in range(len(self.operations)):
+            for dependency in self.dependencies[index] | self.predecessors[index]:
+                parent[find(index)] = find(dependency)
+
+        groups = collections.OrderedDict()
+        for index in range(len(self.operations)):
+            groups.setdefault(find(index), list()).append(index)
+        return list(groups.values())
+
+    def split(self, max_jobs):
+        """ Distribute independent groups of operations on up to max_jobs batch jobs of similar size
+        :param max_jobs: int
+        :return: list of tuples of lists of operations, one per batch job
+        """
+        assert max_jobs >= 1
+        jobs = [list() for _ in range(max_jobs)]
+        for group in sorted(self.independent_groups(), key=len, reverse=True):
+            smallest_job = min(jobs, key=len)
+            smallest_job += group
+        return [self.order(job) for job in jobs if job]
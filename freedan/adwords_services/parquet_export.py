@@ -0,0 +1,196 @@
+import os
+import glob
+import uuid
+import shutil
+
+from freedan.adwords_objects.account import numeric_customer_id
+from freedan.other_services.error_retryer import ErrorRetryer
+
+BLOCK_SIZE = 1 << 22  # bytes of csv per record batch. Memory of an export only depends on this
+NULL_VALUES = [" --", "--", ""]  # AdWords writes " --" for missing values
+PARTITION_COLUMNS = ("CustomerId", "Date")
+
+# compact types of common report fields. Other fields are read as dictionary encoded strings
+INT_FIELDS = ("ExternalCustomerId", "CampaignId", "AdGroupId", "Id", "BudgetId", "BaseCampaignId", "BaseAdGroupId",
+              "CreativeId", "CriterionId", "Impressions", "Clicks", "Interactions", "Cost", "CpcBid", "CpmBid",
+              "AverageCpc", "Amount", "QualityScore", "Year")
+FLOAT_FIELDS = ("Conversions", "AllConversions", "ConversionValue", "AllConversionValue", "AveragePosition",
+                "ViewThroughConversions")
+DATE_FIELDS = ("Date", "Week", "Month", "Quarter")
+
+
+def _pyarrow():
+    """ pyarrow is an optional dependency, only needed for columnar exports """
+    try:
+        import pyarrow
+        import pyarrow.csv
+        import pyarrow.dataset
+    except ImportError:
+        raise ImportError("Parquet exports need pyarrow. Install it with: pip install freedan[parquet]")
+    return pyarrow
+
+
+def field_type(field):
+    """ Arrow type of a report field """
+    pa = _pyarrow()
+    if field in INT_FIELDS:
+        return pa.int64()
+    elif field in FLOAT_FIELDS:
+        return pa.float64()
+    elif field in DATE_FIELDS:
+        return pa.date32()
+    return pa.dictionary(pa.int32(), pa.string())
+
+
+def report_schema(fields, extra_columns=None):
+    """ Arrow schema of exported reports: CustomerId, report fields and extra columns
+    :param fields: list of str, report fields
+    :param extra_columns: list of str, additional string columns with one value per account
+    :return: pyarrow.Schema
+    """
+    pa = _pyarrow()
+    columns = [("CustomerId", pa.int64())] + [(field, field_type(field)) for field in fields if field != "CustomerId"]
+    columns += [(column, pa.dictionary(pa.int32(), pa.string())) for column in (extra_columns or list())]
+    return pa.schema(columns)
+
+
+class ParquetExport:
+    """ Streams reports directly into a Parquet dataset, partitioned by account and date (if segmented by Date):
+        export = ParquetExport(adwords_service, "reports/keywords")
+        export.export(report_def)
+    -> reports/keywords/CustomerId=1234567890/Date=2017-01-01/part-....parquet
+
+    The csv of the report is converted block by block into Arrow record batches and written right away,
+    so neither the csv nor a DataFrame of the whole report is held in memory.
+    Ids, counts and micro amounts are stored as int64, conversions as float64, dates as date32
+    and strings dictionary encoded. Exporting an account again replaces all of its data, so dates missing in
+    the new report don't survive. The report is written to a staging directory first and only replaces the
+    directory CustomerId=<id> once it is complete, so a failed export keeps the old data.
+    """
+    def __init__(self, adwords_service, base_dir, block_size=BLOCK_SIZE, compression="snappy"):
+        """
+        :param adwords_service: AdWordsService object
+        :param base_dir: str, root directory of the dataset
+        :param block_size: int, bytes of csv per record batch
+        :param compression: str, parquet compression codec
+        """
+        self.adwords_service = adwords_service
+        self.base_dir = base_dir
+        self.block_size = block_size
+        self.compression = compression
+
+    def export(self, report_definition, include_0_imp=False, client_customer_id=None, extra_columns=None):
+        """ Download a report of an account into the dataset
+        :param report_definition: nested dict, refer to method AdWordsService.report_definition
+        :param include_0_imp: bool
+        :param client_customer_id: str, default: currently selected account
+        :param extra_columns: dict, column -> str value added to all rows, e.g. {"Currency": "EUR"}
+        :return: int, rows written
+        """
+        _pyarrow()
+        customer_id = client_customer_id or self.adwords_service.client.client_customer_id
+        return self._export_account(report_definition, include_0_imp, customer_id, extra_columns)
+
+    @ErrorRetryer()
+    def _export_account(self, report_definition, include_0_imp, customer_id, extra_columns):
+        """ Replace the data of an account. A failed download is retried from scratch like download_report_csv """
+        pa = _pyarrow()
+        fields = report_definition["selector"]["fields"]
+        schema = report_schema(fields, list(extra_columns or dict()))
+        partition_columns = [column for column in PARTITION_COLUMNS if column in schema.names]
+
+        counter = {"rows": 0}
+
+        def counted(batches):
+            for batch in batches:
+                counter["rows"] += batch.num_rows
+                yield batch
+
+        # hidden directory, datasets skip it while it's written
+        staging_dir = os.path.join(self.base_dir, ".staging-" + uuid.uuid4().hex)
+        try:
+            stream = self.adwords_service._report_stream(report_definition, include_0_imp, customer_id)
+            batches = self._read_batches(stream, fields, customer_id, extra_columns)
+            pa.dataset.write_dataset(
+                counted(batches), staging_dir, schema=schema, format="parquet",
+                partitioning=pa.dataset.partitioning(
+                    pa.schema([schema.field(column) for column in partition_columns]), flavor="hive"),
+                basename_template="part-" + uuid.uuid4().hex + "-{i}.parquet",
+                file_options=pa.dataset.ParquetFileFormat().make_write_options(compression=self.compression))
+            self._swap(staging_dir, customer_id)
+        finally:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+        return counter["rows"]
+
+    def _swap(self, staging_dir, customer_id):
+        """ Replace the account directory by the one written to the staging directory """
+        account_dir = self.account_dir(customer_id)
+        os.makedirs(staging_dir, exist_ok=True)
+        if os.path.exists(account_dir):
+            os.replace(account_dir, os.path.join(staging_dir, "replaced"))  # removed with the staging directory
+        staged_dir = os.path.join(staging_dir, os.path.basename(account_dir))
+        if os.path.exists(staged_dir):  # empty reports don't write anything
+            os.replace(staged_dir, account_dir)
+
+    def account_dir(self, customer_id):
+        """ Directory of the partitions of an account """
+        return os.path.join(self.base_dir, "CustomerId={id}".format(id=numeric_customer_id(customer_id)))
+
+    def dataset(self):
+        """ The exported dataset, e.g. export.dataset().to_table(filter=...) to read parts of it
+        :return: pyarrow.dataset.Dataset
+        """
+        pa = _pyarrow()
+        return pa.dataset.dataset(self.base_dir, format="parquet", partitioning=self.partitioning())
+
+    def partitioning(self):
+        """ Hive partitioning of the dataset with the types of report_schema. Otherwise pyarrow guesses them
+        from the directory names, e.g. Date as string and CustomerId as int32 or string depending on the ids
+        :return: pyarrow.dataset.Partitioning
+        """
+        pa = _pyarrow()
+        columns = [pa.field("CustomerId", pa.int64())]
+        if glob.glob(os.path.join(glob.escape(self.base_dir), "CustomerId=*", "Date=*")):
+            columns.append(pa.field("Date", field_type("Date")))
+        return pa.dataset.partitioning(pa.schema(columns), flavor="hive")
+
+    def record_batches(self, report_definition, include_0_imp=False, client_customer_id=None, extra_columns=None):
+        """ Generator yielding the report of an account as Arrow record batches with report_schema.
+        Opening the download is retried, errors while reading it are raised (export retries whole accounts)
+        :return: generator of pyarrow.RecordBatch
+        """
+        customer_id = client_customer_id or self.adwords_service.client.client_customer_id
+        stream = self.adwords_service._open_report_stream(report_definition, include_0_imp, client_customer_id)
+        return self._read_batches(stream, report_definition["selector"]["fields"], customer_id, extra_columns)
+
+    def _read_batches(self, stream, fields, customer_id, extra_columns):
+        """ Generator converting a csv report stream to record batches. Closes the stream """
+        pa = _pyarrow()
+        extra_columns = extra_columns or dict()
+        schema = report_schema(fields, list(extra_columns))
+
+        try:
+            try:
+                reader = pa.csv.open_csv(
+                    stream,
+                    read_options=pa.csv.ReadOptions(column_names=fields, block_size=self.block_size),
+                    convert_options=pa.csv.ConvertOptions(
+                        column_types={field: schema.field(field).type for field in fields},
+                        null_values=NULL_VALUES, strings_can_be_null=True))
+            except pa.ArrowInvalid as error:
+                if "Empty CSV file" in str(error):
+                    return
+                raise
+
+            customer_id = numeric_customer_id(customer_id)
+            for batch in reader:
+                if batch.num_rows == 0:
+                    continue
+                columns = [pa.array([customer_id] * batch.num_rows, pa.int64())]
+                columns += [batch.column(field) for field in schema.names[1:] if field not in extra_columns]
+                columns += [pa.DictionaryArray.from_arrays(pa.array([0] * batch.num_rows, pa.int32()),
+                                                           pa.array([str(value)]))
+                            for value in extra_columns.values()]
+                yield pa.RecordBatch.from_arrays(columns, schema=schema)
+        finally:
+            stream.close()
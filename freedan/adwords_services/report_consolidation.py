@@ -0,0 +1,75 @@
+import threading
+import concurrent.futures
+
+from freedan.adwords_services.parquet_export import ParquetExport, BLOCK_SIZE
+from freedan.adwords_services.report_slicer import DEFAULT_MAX_WORKERS
+
+ACCOUNT_COLUMNS = ("Currency", "TimeZone")  # added to every row next to CustomerId
+
+
+class ReportConsolidation:
+    """ Report of all accounts in one Parquet dataset instead of stacking DataFrames per account:
+        consolidation = ReportConsolidation(adwords_service, "reports/keywords")
+        consolidation.run(report_def)
+        keywords = consolidation.dataset().to_table().to_pandas()
+
+    Accounts are downloaded in parallel and every account is streamed into the dataset (see ParquetExport),
+    so memory only depends on max_workers and not on the amount or size of accounts.
+    Rows get the columns CustomerId, Currency and TimeZone of their account.
+    Running it again replaces the data of the accounts passed, also if their report is empty now.
+    """
+    def __init__(self, adwords_service, base_dir, max_workers=DEFAULT_MAX_WORKERS, block_size=BLOCK_SIZE):
+        """
+        :param adwords_service: AdWordsService object
+        :param base_dir: str, root directory of the dataset
+        :param max_workers: int, accounts downloaded at the same time
+        :param block_size: int, bytes of csv per record batch
+        """
+        self.adwords_service = adwords_service
+        self.max_workers = max_workers
+        self.export = ParquetExport(adwords_service, base_dir, block_size)
+        self._lock = threading.Lock()
+
+    def run(self, report_definition, accounts=None, include_0_imp=False):
+        """ Download the report of all accounts into the dataset
+        :param report_definition: nested dict, refer to method AdWordsService.report_definition
+        :param accounts: iterable of Account objects, default: all accounts of AdWordsService.accounts
+        :param include_0_imp: bool
+        :return: dict, account id -> rows written
+        """
+        if accounts is None:
+            accounts = self.adwords_service.accounts()
+
+        rows = dict()
+        failed = dict()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {executor.submit(self._export_account, report_definition, account, include_0_imp): account
+                       for account in accounts}
+            for future in concurrent.futures.as_completed(futures):
+                account = futures[future]
+                try:
+                    rows[account.id] = future.result()
+                except Exception as error:
+                    print("Report of account {id} failed: {error}".format(id=account.id, error=error))
+                    failed[account.id] = error
+
+        print("\nConsolidated {rows} rows of {accounts} account(s).".format(
+            rows=sum(rows.values()), accounts=len(rows)))
+        if failed:
+            raise IOError("Reports of {amount} account(s) failed: {ids}".format(
+                amount=len(failed), ids=", ".join(sorted(failed))))
+        return rows
+
+    def _export_account(self, report_definition, account, include_0_imp):
+        extra_columns = dict(zip(ACCOUNT_COLUMNS, (account.currency, account.time_zone)))
+        amount_rows = self.export.export(report_definition, include_0_imp, client_customer_id=account.id,
+                                         extra_columns=extra_columns)
+        with self._lock:
+            print("{name} (ID: {id}): {rows} rows".format(name=account.name, id=account.id, rows=amount_rows))
+        return amount_rows
+
+    def dataset(self):
+        """ The consolidated dataset, see ParquetExport.dataset
+        :return: pyarrow.dataset.Dataset
+        """
+        return self.export.dataset()
@@ -42,6 +42,15 @@ def convert_adwords_columns(df, add_operation_type=True, remove_pluses=True):
     return df
 
 
+def parse_final_urls(final_urls):
+    """ First url of each value of a FinalUrls report column, e.g. '["https://www.example.com"]'.
+    Vectorized instead of ast.literal_eval per row. Missing urls (" --" or NaN) become NaN
+    :param final_urls: pd.Series
+    :return: pd.Series
+    """
+    return final_urls.astype(str).str.extract(r'^\s*\[\s*"([^"]*)"', expand=False)
+
+
 def micro_to_float(micro_amount, default_value=-1.00):
     """ Convert micro amounts to regular euro with default value if unexpected value occurs """
     try:
@@ -0,0 +1,154 @@
+import os
+import gzip
+import json
+import copy
+import hashlib
+import datetime
+import threading
+import collections
+import concurrent.futures
+
+DEFAULT_SLICE_DAYS = 30
+DEFAULT_MAX_WORKERS = 4
+FINAL_AFTER_DAYS = 3  # data of the last days can still change, e.g. by late conversions. Those slices aren't cached
+SLICE_ORIGIN = datetime.date(2000, 1, 1)  # slices are aligned to it, so different date ranges share cached slices
+DATE_FORMAT = "%Y%m%d"
+
+
+class ReportSlicer:
+    """ Downloads reports with long date ranges in slices of slice_days days:
+        slicer = ReportSlicer(adwords_service, slice_days=30, cache_dir="report_cache")
+        report_def = adwords_service.report_definition("KEYWORDS_PERFORMANCE_REPORT", fields, last_days=365)
+        report = slicer.download(report_def)
+
+    Slices are downloaded in parallel and a failing slice is retried on its own instead of the whole report.
+    With a cache_dir, slices older than final_after_days days are stored on disk and never downloaded again,
+    so a daily job over the last year only downloads the most recent slices.
+    Reports have to be segmented by Date, otherwise rows of different slices would overlap.
+    """
+    def __init__(self, adwords_service, slice_days=DEFAULT_SLICE_DAYS, max_workers=DEFAULT_MAX_WORKERS,
+                 cache_dir=None, final_after_days=FINAL_AFTER_DAYS):
+        """
+        :param adwords_service: AdWordsService object
+        :param slice_days: int, days per request
+        :param max_workers: int, parallel downloads
+        :param cache_dir: str, directory for cached slices. None = no caching
+        :param final_after_days: int, slices ending at least this many days ago are cached
+        """
+        assert slice_days >= 1 and max_workers >= 1
+        self.adwords_service = adwords_service
+        self.slice_days = slice_days
+        self.max_workers = max_workers
+        self.cache_dir = cache_dir
+        self.final_after_days = final_after_days
+
+        self._lock = threading.Lock()
+        self.downloaded_slices = 0
+        self.cached_slices = 0
+
+    def slices(self, date_min, date_max):
+        """ Date range split into slices aligned to SLICE_ORIGIN
+        :param date_min: datetime.date
+        :param date_max: datetime.date
+        :return: list of tuples of dates, (slice_min, slice_max)
+        """
+        slices = list()
+        slice_min = date_min
+        while slice_min <= date_max:
+            offset = (slice_min - SLICE_ORIGIN).days % self.slice_days
+            slice_max = min(slice_min + datetime.timedelta(self.slice_days - offset - 1), date_max)
+            slices.append((slice_min, slice_max))
+            slice_min = slice_max + datetime.timedelta(1)
+        return slices
+
+    def slice_definitions(self, report_definition):
+        """ Report definitions of the slices of a report definition
+        :return: list of report definitions
+        """
+        selector = report_definition["selector"]
+        if report_definition.get("dateRangeType") != "CUSTOM_DATE" or "dateRange" not in selector:
+            raise IOError("Only reports with a CUSTOM_DATE range can be sliced.")
+        if "Date" not in selector["fields"]:
+            raise IOError("Please add field Date to the report. Slices of reports without it would overlap.")
+
+        date_min, date_max = (datetime.datetime.strptime(selector["dateRange"][limit], DATE_FORMAT).date()
+                              for limit in ("min", "max"))
+        definitions = list()
+        for slice_min, slice_max in self.slices(date_min, date_max):
+            definition = copy.deepcopy(report_definition)
+            definition["selector"]["dateRange"] = {
+                "min": slice_min.strftime(DATE_FORMAT),
+                "max": slice_max.strftime(DATE_FORMAT)
+            }
+            definitions.append(definition)
+        return definitions
+
+    def download(self, report_definition, include_0_imp=False, client_customer_id=None):
+        """ Whole report as one DataFrame, see AdWordsService.download_report
+        :return: DataFrame
+        """
+        import pandas as pd  # heavy import, only needed for reports
+
+        chunks = list(self.download_chunks(report_definition, include_0_imp, client_customer_id))
+        if not chunks:
+            return self.adwords_service.parse_report_csv("", report_definition)
+        return pd.concat(chunks, ignore_index=True)
+
+    def download_chunks(self, report_definition, include_0_imp=False, client_customer_id=None):
+        """ Generator yielding a DataFrame per slice in chronological order.
+        At most 2 * max_workers slices are downloaded ahead of the consumer, so memory doesn't grow with the range
+        """
+        customer_id = client_customer_id or self.adwords_service.client.client_customer_id
+        definitions = self.slice_definitions(report_definition)
+        print("Downloading report in {slices} slice(s) of up to {days} days.".format(
+            slices=len(definitions), days=self.slice_days))
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = collections.deque()
+            definitions = iter(definitions)
+            for definition in definitions:
+                pending.append((definition, executor.submit(self._slice_csv, definition, include_0_imp, customer_id)))
+                if len(pending) >= 2 * self.max_workers:
+                    break
+
+            while pending:
+                definition, future = pending.popleft()
+                data = future.result()
+                next_definition = next(definitions, None)
+                if next_definition is not None:
+                    pending.append((next_definition, executor.submit(
+                        self._slice_csv, next_definition, include_0_imp, customer_id)))
+                yield self.adwords_service.parse_report_csv(data, definition)
+
+    def _slice_csv(self, definition, include_0_imp, customer_id):
+        """ csv of a slice, from cache if possible """
+        path = self.cache_path(definition, include_0_imp, customer_id)
+        if path is not None and os.path.exists(path):
+            with gzip.open(path, "rt", encoding="utf-8") as cache_file:
+                data = cache_file.read()
+            with self._lock:
+                self.cached_slices += 1
+            return data
+
+        data = self.adwords_service.download_report_csv(definition, include_0_imp, client_customer_id=customer_id)
+        with self._lock:
+            self.downloaded_slices += 1
+        if path is not None:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            temp_path = path + ".tmp"
+            with gzip.open(temp_path, "wt", encoding="utf-8") as cache_file:
+                cache_file.write(data)
+            os.replace(temp_path, path)  # atomic, parallel or interrupted runs never read half written slices
+        return data
+
+    def cache_path(self, definition, include_0_imp, customer_id):
+        """ Path of the cached csv of a slice, None if the slice shouldn't be cached """
+        if self.cache_dir is None:
+            return None
+        slice_max = datetime.datetime.strptime(definition["selector"]["dateRange"]["max"], DATE_FORMAT).date()
+        if (datetime.date.today() - slice_max).days < self.final_after_days:
+            return None
+
+        definition = {key: value for key, value in definition.items() if key != "reportName"}
+        key = json.dumps([str(customer_id).replace("-", ""), include_0_imp, definition], sort_keys=True)
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".csv.gz")
@@ -1,7 +1,6 @@
-import suds
-
 from freedan.adwords_services.adwords_error import AdWordsError
 from freedan.other_services.error_retryer import ErrorRetryer
+from freedan.other_services.instrumentation import get_instrumentation
 
 MAX_OPERATIONS_STANDARD_UPLOAD = 5000
 
@@ -33,7 +32,8 @@ class StandardUploader:
         self.client.validate_only = self.is_debug
         print("##### OperationUpload is LIVE: %s. #####" % (not self.client.validate_only))
 
-        result, error_list = self.upload(operations, service, is_label)
+        with get_instrumentation().timer("api_request_seconds", service=service_name, method="mutate"):
+            result, error_list = self.upload(operations, service, is_label)
         self.print_failures(error_list)
         return result
 
@@ -47,6 +47,8 @@ class StandardUploader:
 
     @ErrorRetryer()
     def upload(self, operations, service, is_label):
+        import suds  # heavy import, only needed once operations are uploaded
+
         try:
             if is_label:
                 result = service.mutateLabel(operations)
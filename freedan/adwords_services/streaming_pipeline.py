@@ -0,0 +1,127 @@
+import queue
+import threading
+import itertools
+
+from freedan.adwords_services.adwords_service import REPORT_CHUNK_SIZE
+from freedan.adwords_services.batch_uploader import BatchUploader
+
+DEFAULT_MAX_QUEUED_CHUNKS = 4
+PUT_TIMEOUT = 1  # seconds. The producer checks regularly if the upload has been aborted
+_END = object()  # marks the end of the stream in the queue
+
+
+class StreamingPipeline:
+    """ Account wide rewrites in constant memory:
+        report chunks -> transform (e.g. filter) -> operation builder -> incremental batch job upload
+
+    The report is streamed chunk by chunk in a background thread. Built operations wait in a bounded queue until
+    they are uploaded. If the upload is slower than the download, reading the report pauses (backpressure),
+    so at most max_queued_chunks chunks of operations are held in memory, regardless of the account size.
+    All operations end up in a single batch job, which is only created once the first operations are built.
+    Operations of a chunk keep their order, e.g. adds of a chunk before deletes of the same chunk.
+    """
+    def __init__(self, adwords_service, report_definition, build_operations, transform=None,
+                 chunk_size=REPORT_CHUNK_SIZE, max_queued_chunks=DEFAULT_MAX_QUEUED_CHUNKS, include_0_imp=False):
+        """
+        :param adwords_service: AdWordsService object, report is downloaded for the currently selected account
+        :param report_definition: nested dict, refer to method AdWordsService.report_definition
+        :param build_operations: function, DataFrame -> list of operations or tuple of lists of operations
+        :param transform: function, DataFrame -> DataFrame. Applied to every chunk before building operations
+        :param chunk_size: int, report rows per chunk
+        :param max_queued_chunks: int, chunks of operations waiting for the upload at most
+        :param include_0_imp: bool
+        """
+        self.adwords_service = adwords_service
+        self.report_definition = report_definition
+        self.build_operations = build_operations
+        self.transform = transform
+        self.chunk_size = chunk_size
+        self.max_queued_chunks = max_queued_chunks
+        self.include_0_imp = include_0_imp
+
+        self.rows_read = 0
+        self.operations_built = 0
+
+    def operation_chunks(self):
+        """ Generator yielding a list of operations per report chunk, skipping chunks without operations """
+        report_chunks = self.adwords_service.download_report_chunks(
+            self.report_definition, chunk_size=self.chunk_size, include_0_imp=self.include_0_imp)
+
+        for report_chunk in report_chunks:
+            self.rows_read += len(report_chunk)
+            if self.transform is not None:
+                report_chunk = self.transform(report_chunk)
+            if report_chunk.empty:
+                continue
+
+            operations = self.build_operations(report_chunk)
+            if isinstance(operations, tuple):
+                operations = [operation for part in operations for operation in part]
+            if operations:
+                self.operations_built += len(operations)
+                yield operations
+
+    def run(self, is_debug, report_on_results=True, batch_sleep_interval=-1, fast_serialization=False):
+        """ Download, build and upload
+        :param is_debug: bool
+        :param report_on_results: bool, whether batchjob should download results or not
+        :param batch_sleep_interval: int, -1 = exponential
+        :param fast_serialization: bool, write xml directly instead of going through suds
+        :return: return value of adwords, see BatchUploader.execute. None if no operations were built
+        """
+        chunk_queue = queue.Queue(maxsize=self.max_queued_chunks)
+        aborted = threading.Event()
+        producer = threading.Thread(target=self._produce, args=(chunk_queue, aborted), daemon=True)
+        producer.start()
+
+        try:
+            operation_chunks = self._consume(chunk_queue)
+            first_chunk = next(operation_chunks, None)
+            if first_chunk is None:
+                print("No operations built, no batch job created.")
+                result = None
+            else:
+                batch_uploader = BatchUploader(self.adwords_service, is_debug, report_on_results,
+                                               batch_sleep_interval, fast_serialization)
+                result = batch_uploader.execute_incrementally(itertools.chain([first_chunk], operation_chunks))
+        finally:
+            aborted.set()
+            producer.join()
+
+        print("Read {rows} report rows, built {operations} operations.".format(
+            rows=self.rows_read, operations=self.operations_built))
+        return result
+
+    def _produce(self, chunk_queue, aborted):
+        """ Fill the queue with operation chunks. Runs in a background thread """
+        try:
+            for operations in self.operation_chunks():
+                if not self._put(chunk_queue, operations, aborted):
+                    return
+            self._put(chunk_queue, _END, aborted)
+        except Exception as error:
+            self._put(chunk_queue, error, aborted)
+
+    @staticmethod
+    def _put(chunk_queue, item, aborted):
+        """ Blocking put that gives up once the upload has been aborted
+        :return: bool, True if the item was queued
+        """
+        while not aborted.is_set():
+            try:
+                chunk_queue.put(item, timeout=PUT_TIMEOUT)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    @staticmethod
+    def _consume(chunk_queue):
+        """ Generator yielding operation chunks from the queue until the stream ends """
+        while True:
+            item = chunk_queue.get()
+            if item is _END:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
@@ -1,17 +1,71 @@
+import threading
+import numpy as np
 import pandas as pd
 
 
 class TempIdHelper:
+    """ Temporary ids (negative ints) are needed when objects and their children are created in the same batch job,
+    e.g. campaign -> adgroup -> keyword. They must be unique within a batch job.
+
+    Allocation is thread safe, so operations of one batch job can be built across threads.
+    Use TempIdHelper.for_batch_job to share one helper per batch job between workers.
+    """
+    _namespaces = dict()  # namespace -> TempIdHelper
+    _namespaces_lock = threading.Lock()
+
     def __init__(self):
         self._temp_id = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_batch_job(cls, namespace):
+        """ Helper shared by everyone building operations for the same batch job
+        :param namespace: hashable, e.g. batch job id or name of the build
+        :return: TempIdHelper
+        """
+        with cls._namespaces_lock:
+            if namespace not in cls._namespaces:
+                cls._namespaces[namespace] = cls()
+            return cls._namespaces[namespace]
+
+    @classmethod
+    def release_batch_job(cls, namespace):
+        """ Forget the helper of a batch job once it has been uploaded """
+        with cls._namespaces_lock:
+            cls._namespaces.pop(namespace, None)
 
     @property
     def temp_id(self):
-        self._temp_id -= 1
-        return self._temp_id
+        return int(self.reserve(1)[0])
+
+    def reserve(self, amount):
+        """ Atomically reserve a contiguous range of temporary ids
+        :param amount: int
+        :return: np.array of int64, e.g. [-1, -2, -3]
+        """
+        assert amount >= 0
+        with self._lock:
+            first_id = self._temp_id - 1
+            self._temp_id -= amount
+        return np.arange(first_id, first_id - amount, -1, dtype=np.int64)
 
     def fillna_with_temp_id(self, input_value):
         """ If id is np.nan, return new temporary id (negative int), else return the id"""
         if pd.isnull(input_value):
             return int(self.temp_id)
         return input_value
+
+    def fillna_with_temp_ids(self, series):
+        """ Vectorized version of fillna_with_temp_id: Fill all missing ids of a Series at once
+        :param series: pd.Series
+        :return: pd.Series, missing values replaced by new temporary ids in order of appearance
+        """
+        is_missing = series.isnull().to_numpy()
+        filled = series.copy()
+        if not is_missing.any():
+            return filled
+
+        filled[is_missing] = self.reserve(int(is_missing.sum()))
+        if pd.api.types.is_float_dtype(filled) and (filled % 1 == 0).all():
+            filled = filled.astype(np.int64)  # ids are ints, they were only floats because of np.nan
+        return filled
@@ -0,0 +1,84 @@
+""" Persistent WSDL/schema cache for the AdWords API client.
+
+Every new process downloads and parses the WSDLs of all services it uses. On short lived containers the
+default cache in the temp folder is always empty, so this can be the biggest part of the startup time.
+Point the cache to a persistent directory (per API version) and prebuild it at image build time:
+    $ python -m freedan.adwords_services.wsdl_cache adwords_credentials.yaml --cache-dir /opt/freedan/wsdl
+"""
+import os
+import argparse
+
+CACHE_DIR_ENV_VARIABLE = "FREEDAN_WSDL_CACHE_DIR"
+DEFAULT_CACHE_DAYS = 30
+
+# services used by freedan. Those are prebuilt by the warm up command
+SERVICES = [
+    "ManagedCustomerService", "BatchJobService", "BudgetService", "CampaignService",
+    "CampaignCriterionService", "CampaignSharedSetService", "AdGroupService", "AdGroupAdService",
+    "AdGroupCriterionService", "AdGroupBidModifierService", "LabelService", "CustomerSyncService"
+]
+
+
+def default_cache_dir():
+    """ Cache directory configured via environment variable, None if not set """
+    return os.environ.get(CACHE_DIR_ENV_VARIABLE) or None
+
+
+def wsdl_cache(cache_dir, api_version, days=DEFAULT_CACHE_DAYS):
+    """ File based cache for parsed WSDLs and schemas of one API version
+    :param cache_dir: str, base directory. A sub directory per API version is used
+    :param api_version: str, e.g. v201708
+    :param days: int, how long cached WSDLs are valid
+    :return: suds.cache.ObjectCache
+    """
+    import suds.cache  # heavy import, only needed when a client is created
+
+    location = os.path.join(cache_dir, api_version)
+    os.makedirs(location, exist_ok=True)
+    return suds.cache.ObjectCache(location=location, days=days)
+
+
+def use_wsdl_cache(client, cache_dir, api_version):
+    """ Let an AdWords client cache its WSDLs in cache_dir. Only suds clients know this cache:
+    googleads >= 11 can use zeep instead (soap_impl="zeep"), those clients are left as they are
+    :param client: googleads AdWordsClient
+    :return: bool, whether the cache is used
+    """
+    if getattr(client, "soap_impl", "suds") != "suds":
+        print("WSDL cache is only supported for suds clients, not for {impl}.".format(impl=client.soap_impl))
+        return False
+    client.cache = wsdl_cache(cache_dir, api_version)
+    return True
+
+
+def warm_up(credentials_path, cache_dir, api_version, services=SERVICES):
+    """ Download and parse WSDLs of all services so they end up in the cache
+    :param credentials_path: str, path to .yaml file
+    :param cache_dir: str
+    :param api_version: str
+    :param services: list of str
+    """
+    from freedan.adwords_services.adwords_service import AdWordsService
+
+    adwords_service = AdWordsService(credentials_path, api_version=api_version, wsdl_cache_dir=cache_dir)
+    for service_name in services:
+        print("Caching WSDL of {service}".format(service=service_name))
+        adwords_service.init_service(service_name)
+    print("WSDL cache ready at {location}".format(location=os.path.join(cache_dir, api_version)))
+
+
+def main():
+    from freedan.adwords_services.adwords_service import DEFAULT_API_VERSION
+
+    parser = argparse.ArgumentParser(description="Prebuild the WSDL cache of the AdWords API client.")
+    parser.add_argument("credentials_path", help="path to adwords credentials .yaml file")
+    parser.add_argument("--cache-dir", default=default_cache_dir(), required=default_cache_dir() is None,
+                        help="base directory of the cache. Default: ${env}".format(env=CACHE_DIR_ENV_VARIABLE))
+    parser.add_argument("--api-version", default=DEFAULT_API_VERSION)
+    args = parser.parse_args()
+
+    warm_up(args.credentials_path, args.cache_dir, args.api_version)
+
+
+if __name__ == "__main__":
+    main()
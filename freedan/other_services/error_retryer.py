@@ -1,11 +1,14 @@
 import time
 
+from freedan.other_services.instrumentation import get_instrumentation
+
 DEFAULT_MAX_ATTEMPTS = 4
 DEFAULT_SLEEP_INTERVAL = 5
 
 
 class ErrorRetryer:
     """ Execute a function and in case an error occurs retry it x times. If it fails x times, throw an exception. 
+    Failed attempts are counted as metric "retries", giving up as "retries_exhausted" (see instrumentation.py)
     :param max_attempts: int, how often should it attempt to execute function 
     :param sleep_interval: int, how long should it wait in between attempts
     :return: func
@@ -20,9 +23,11 @@ class ErrorRetryer:
                 try:
                     return function_to_decorate(*args, **kwargs)
                 except Exception as exception_type:
+                    get_instrumentation().count("retries", function=function_to_decorate.__name__)
                     print("Retrying request because of error: %s" % exception_type)
                     time.sleep(self.sleep_interval)
 
+            get_instrumentation().count("retries_exhausted", function=function_to_decorate.__name__)
             # error message might also be used in an email notification here
             raise Exception("Gave up after {num} attempts".format(num=self.max_attempts))
         return wrapped_f
@@ -0,0 +1,213 @@
+""" Pluggable instrumentation for API calls, uploads and retries.
+
+freedan reports timers, counters and histogram observations to the globally installed Instrumentation object.
+The default does nothing, so there's no overhead unless a recorder is installed:
+    recorder = MetricsRecorder()
+    set_instrumentation(recorder)
+    ... run script ...
+    print(recorder.to_prometheus())
+
+Metrics reported by freedan (all timers in seconds):
+    api_request_seconds            histogram, labels service + method. Latency per AdWords service,
+                                   report downloads have service ReportDownloader
+    report_parse_seconds           histogram, csv -> DataFrame
+    report_bytes / report_rows     counters, size of the report csv (characters) and rows
+    upload_seconds                 histogram, label method (standard/batch)
+    operations_uploaded            counter, label method
+    upload_operations_per_second   histogram, label method
+    batch_serialization_seconds, batch_upload_seconds, batch_polling_seconds,
+    batch_download_seconds, batch_parse_seconds   histograms of the batch job phases
+    batch_upload_bytes / batch_response_bytes     counters
+    batch_poll_attempts            counter
+    retries / retries_exhausted    counters, label function. See ErrorRetryer
+"""
+import math
+import time
+import threading
+import contextlib
+import collections
+
+DEFAULT_PROMETHEUS_PREFIX = "freedan_"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+
+class Instrumentation:
+    """ Interface and no-op default. Subclasses override count and observe (and optionally timer) """
+    def count(self, name, value=1, **labels):
+        """ Increase a counter
+        :param name: str, metric name
+        :param value: int or float
+        :param labels: str values, e.g. service="LabelService"
+        """
+        pass
+
+    def observe(self, name, value, **labels):
+        """ Add an observation to a histogram, e.g. a latency in seconds """
+        pass
+
+    def timer(self, name, **labels):
+        """ Context manager measuring the duration of its block as observation of metric name """
+        return contextlib.nullcontext()
+
+
+class _Timer:
+    """ Context manager reporting its duration to an Instrumentation object """
+    def __init__(self, instrumentation, name, labels):
+        self.instrumentation = instrumentation
+        self.name = name
+        self.labels = labels
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.instrumentation.observe(self.name, time.perf_counter() - self.start, **self.labels)
+        return False
+
+
+class MetricsRecorder(Instrumentation):
+    """ Thread safe in-memory recorder for counters and histograms with Prometheus text export """
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """
+        :param buckets: sorted tuple of floats, upper bounds of histogram buckets. +Inf is added automatically
+        """
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters = collections.OrderedDict()  # (name, labels) -> value
+        self._histograms = collections.OrderedDict()  # (name, labels) -> [bucket counts, sum, count]
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def count(self, name, value=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            if key not in self._histograms:
+                self._histograms[key] = [[0] * len(self.buckets), 0.0, 0]
+            histogram = self._histograms[key]
+            for position, upper_bound in enumerate(self.buckets):
+                if value <= upper_bound:
+                    histogram[0][position] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def timer(self, name, **labels):
+        return _Timer(self, name, labels)
+
+    def counter(self, name, **labels):
+        """ Current value of a counter, 0 if it was never increased """
+        with self._lock:
+            return self._counters.get(self._key(name, labels), 0)
+
+    def summary(self, name, **labels):
+        """ Count, sum and mean of a histogram
+        :return: dict
+        """
+        with self._lock:
+            _, total, count = self._histograms.get(self._key(name, labels), [None, 0.0, 0])
+        return {"count": count, "sum": total, "mean": total / count if count else math.nan}
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+    def to_prometheus(self, prefix=DEFAULT_PROMETHEUS_PREFIX):
+        """ All metrics in Prometheus text exposition format, e.g. for a textfile collector or pushgateway
+        :param prefix: str, prepended to all metric names
+        :return: str
+        """
+        with self._lock:
+            counters = list(self._counters.items())
+            histograms = [(key, (list(buckets), total, count))
+                          for key, (buckets, total, count) in self._histograms.items()]
+
+        lines = list()
+        typed = set()
+        for (name, labels), value in counters:
+            name = prefix + name
+            if name not in typed:
+                lines.append("# TYPE {name} counter".format(name=name))
+                typed.add(name)
+            lines.append("{name}{labels} {value}".format(name=name, labels=_labels(labels), value=_number(value)))
+
+        for (name, labels), (buckets, total, count) in histograms:
+            name = prefix + name
+            if name not in typed:
+                lines.append("# TYPE {name} histogram".format(name=name))
+                typed.add(name)
+            for upper_bound, bucket_count in zip(self.buckets, buckets):
+                bucket_labels = labels + (("le", _number(upper_bound)),)
+                lines.append("{name}_bucket{labels} {value}".format(
+                    name=name, labels=_labels(bucket_labels), value=bucket_count))
+            lines.append("{name}_bucket{labels} {value}".format(
+                name=name, labels=_labels(labels + (("le", "+Inf"),)), value=count))
+            lines.append("{name}_sum{labels} {value}".format(name=name, labels=_labels(labels), value=_number(total)))
+            lines.append("{name}_count{labels} {value}".format(name=name, labels=_labels(labels), value=count))
+        return "\n".join(lines) + "\n"
+
+
+class SpanInstrumentation(Instrumentation):
+    """ Adapter reporting timers as spans to an OpenTelemetry style tracer, e.g.
+        SpanInstrumentation(opentelemetry.trace.get_tracer("freedan"))
+    Counters and observations are forwarded to another Instrumentation (e.g. a MetricsRecorder).
+    """
+    def __init__(self, tracer, metrics=None):
+        """
+        :param tracer: object with method start_as_current_span(name, attributes=dict)
+        :param metrics: Instrumentation for counters and histograms. Default: no-op
+        """
+        self.tracer = tracer
+        self.metrics = metrics or Instrumentation()
+
+    def count(self, name, value=1, **labels):
+        self.metrics.count(name, value, **labels)
+
+    def observe(self, name, value, **labels):
+        self.metrics.observe(name, value, **labels)
+
+    @contextlib.contextmanager
+    def timer(self, name, **labels):
+        attributes = {key: str(value) for key, value in labels.items()}
+        with self.tracer.start_as_current_span("freedan." + name, attributes=attributes):
+            with self.metrics.timer(name, **labels):
+                yield
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = ('{key}="{value}"'.format(key=key, value=value.replace("\\", "\\\\").replace('"', '\\"'))
+               for key, value in labels)
+    return "{" + ",".join(escaped) + "}"
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+_instrumentation = Instrumentation()
+
+
+def get_instrumentation():
+    """ Currently installed Instrumentation object """
+    return _instrumentation
+
+
+def set_instrumentation(instrumentation):
+    """ Install an Instrumentation object for the whole process
+    :param instrumentation: Instrumentation, None resets to the no-op default
+    :return: previously installed Instrumentation
+    """
+    global _instrumentation
+    previous = _instrumentation
+    _instrumentation = instrumentation or Instrumentation()
+    return previous
@@ -1,7 +1,16 @@
 import string
-from unidecode import unidecode
+import functools
 
 ADWORDS_FORBIDDEN_CHARS = "!=?@%^*;~’`´,(){}<>|"
+DASHES = "–—−-"  # en dash, em dash, minus and hyphen
+DASH_TABLE = str.maketrans(DASHES, " " * len(DASHES))
+DECODE_CACHE_SIZE = 2**18  # queries repeat a lot, so memoizing unidecode pays off
+
+
+@functools.lru_cache(maxsize=None)
+def translation_table(forbidden_chars):
+    """ str.translate table removing all forbidden chars. Built only once per set of chars """
+    return str.maketrans("", "", forbidden_chars)
 
 
 class TextHandler:
@@ -9,17 +18,45 @@ class TextHandler:
     Often needed when working with queries, e.g. when matching them with keywords
     It's also useful when uploading keywords or ads since some characters aren't permitted
         -> see method "remove_forbidden_adwords_chars"
+
+    The attributes without_punctuation, decoded, standardized and variations are computed on first access.
+    For many texts at once use TextHandler.standardize_many.
     """
     def __init__(self, text):
         assert isinstance(text, str)
         self.text = text
-        self.without_punctuation = self.without_dashes_and_punctuation(text)
-        self.decoded = self.decode(text)
-        self.standardized = self.standardize(text)
-        self.variations = {self.text, self.decoded, self.without_punctuation, self.standardized}
+        self._without_punctuation = None
+        self._decoded = None
+        self._standardized = None
+        self._variations = None
+
+    @property
+    def without_punctuation(self):
+        if self._without_punctuation is None:
+            self._without_punctuation = self.without_dashes_and_punctuation(self.text)
+        return self._without_punctuation
+
+    @property
+    def decoded(self):
+        if self._decoded is None:
+            self._decoded = self.decode(self.text)
+        return self._decoded
+
+    @property
+    def standardized(self):
+        if self._standardized is None:
+            self._standardized = self.without_dashes_and_punctuation(self.decoded)
+        return self._standardized
+
+    @property
+    def variations(self):
         # variations might be useful for negative keywords since it's a useful small subset of close variant matches
+        if self._variations is None:
+            self._variations = {self.text, self.decoded, self.without_punctuation, self.standardized}
+        return self._variations
 
     @staticmethod
+    @functools.lru_cache(maxsize=DECODE_CACHE_SIZE)
     def decode(text):
         """ Convert utf8 characters to their closest representation
             ß -> ss
@@ -27,6 +64,7 @@ class TextHandler:
             ä -> a
             ...
         """
+        from unidecode import unidecode  # heavy import, only needed on first decode
         return unidecode(text)
 
     @staticmethod
@@ -35,11 +73,7 @@ class TextHandler:
         See https://en.wikipedia.org/wiki/Wikipedia:Hyphens_and_dashes
         Really fucked up shit...
         """
-        text = text.replace("–", "-")  # en dash to hyphen
-        text = text.replace("—", "-")  # em dash to hyphen
-        text = text.replace("−", "-")  # minus to hyphen
-        text = text.replace("-", " ")  # hyphen replace
-        return text
+        return text.translate(DASH_TABLE)
 
     @staticmethod
     def remove_double_white_space(text):
@@ -55,7 +89,9 @@ class TextHandler:
         """
         type_of_input = type(iterable)
         if isinstance(iterable, str):
-            new_text = iterable.translate({ord(c): None for c in forbidden_chars})
+            # any iterable of chars is accepted, the cached table needs a hashable str though
+            forbidden_chars = forbidden_chars if isinstance(forbidden_chars, str) else "".join(forbidden_chars)
+            new_text = iterable.translate(translation_table(forbidden_chars))
             return TextHandler.remove_double_white_space(new_text)
         elif isinstance(iterable, (set, list, tuple)):
             return type_of_input([TextHandler.remove_punctuation(elem, forbidden_chars=forbidden_chars)
@@ -82,3 +118,25 @@ class TextHandler:
         text = TextHandler.without_dashes_and_punctuation(text)
         text = text.lower() if to_lower else text
         return text
+
+    @staticmethod
+    def standardize_many(texts, to_lower=False):
+        """ Standardize many texts at once. Every distinct text is only standardized once.
+        :param texts: pd.Series or iterable of str. Values that aren't str (e.g. np.nan) are kept as they are
+        :param to_lower: bool
+        :return: pd.Series with same index if a Series was passed, else list
+        """
+        def standardize_if_text(text):
+            return TextHandler.standardize(text, to_lower=to_lower) if isinstance(text, str) else text
+
+        if hasattr(texts, "unique") and hasattr(texts, "map"):  # pandas Series
+            standardized = {text: standardize_if_text(text) for text in texts.unique()}
+            return texts.map(standardized)
+
+        standardized = dict()
+        results = list()
+        for text in texts:
+            if text not in standardized:
+                standardized[text] = standardize_if_text(text)
+            results.append(standardized[text])
+        return results
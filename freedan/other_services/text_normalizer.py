@@ -0,0 +1,69 @@
+import os
+import functools
+import concurrent.futures
+import pandas as pd
+
+from freedan.other_services.text_handler import TextHandler
+
+DEFAULT_CHUNK_SIZE = 50000  # distinct texts per process pool task
+MIN_PARALLEL_TEXTS = 100000  # below this the process pool overhead isn't worth it
+
+
+class TextNormalizer:
+    """ Standardizes large amounts of texts (e.g. search queries of a search query report) across cores.
+    Search queries repeat heavily, so the input is deduplicated first and every distinct text
+    is standardized exactly once by TextHandler.standardize_many, split into chunks across processes.
+    """
+    def __init__(self, processes=None, chunk_size=DEFAULT_CHUNK_SIZE, to_lower=False,
+                 min_parallel_texts=MIN_PARALLEL_TEXTS):
+        """
+        :param processes: int, amount of worker processes. Defaults to amount of cores
+        :param chunk_size: int, distinct texts per worker task
+        :param to_lower: bool, passed on to TextHandler.standardize. Same default as there
+        :param min_parallel_texts: int, fewer distinct texts are standardized in the current process
+        """
+        self.processes = processes or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self.to_lower = to_lower
+        self.min_parallel_texts = min_parallel_texts
+
+    def standardize(self, texts):
+        """ Standardize texts
+        :param texts: pd.Series or iterable of str. Values that aren't str (e.g. np.nan) are kept
+        :return: pd.Series aligned to the index of the input
+        """
+        if not isinstance(texts, pd.Series):
+            texts = pd.Series(list(texts))
+
+        if self.processes == 1 or texts.nunique(dropna=False) < self.min_parallel_texts:
+            return TextHandler.standardize_many(texts, to_lower=self.to_lower)
+        return texts.map(self.mapping(texts.unique()))
+
+    def standardize_columns(self, df, columns, suffix="_standardized"):
+        """ Standardized versions of multiple columns. Texts are deduplicated across all columns
+        :param df: DataFrame, isn't changed
+        :param columns: list of str
+        :param suffix: str, appended to the names of the new columns
+        :return: copy of df with additional columns
+        """
+        distinct_texts = pd.unique(pd.concat([df[column] for column in columns], ignore_index=True))
+        mapping = self.mapping(distinct_texts)
+        return df.assign(**{column + suffix: df[column].map(mapping) for column in columns})
+
+    def mapping(self, distinct_texts):
+        """ Standardize distinct texts, see TextHandler.standardize_many
+        :param distinct_texts: iterable of distinct values
+        :return: dict, text -> standardized text. Values that aren't str are mapped to themselves
+        """
+        distinct_texts = list(distinct_texts)
+        standardize_many = functools.partial(TextHandler.standardize_many, to_lower=self.to_lower)
+        if self.processes == 1 or len(distinct_texts) < self.min_parallel_texts:
+            return dict(zip(distinct_texts, standardize_many(distinct_texts)))
+
+        chunks = [distinct_texts[start:start + self.chunk_size]
+                  for start in range(0, len(distinct_texts), self.chunk_size)]
+        mapping = dict()
+        with concurrent.futures.ProcessPoolExecutor(max_workers=self.processes) as executor:
+            for chunk, standardized in zip(chunks, executor.map(standardize_many, chunks)):
+                mapping.update(zip(chunk, standardized))
+        return mapping
@@ -0,0 +1,787 @@
+""" Offline stand-in for the AdWords API.
+
+FakeAdWords keeps accounts, objects and batch jobs in memory and mimics the parts of the API freedan uses:
+    - SOAP services: get (with predicates and paging) and mutate / mutateLabel of any service,
+      ManagedCustomerService incl. links, BatchJobService incl. job status and
+      CustomerSyncService based on the applied mutations
+    - report downloads by report definition or AWQL (synthetic csv data)
+    - batch jobs: resumable upload, processing time, result download and parsing
+Report downloads and batch job files go through a local http server, so serialization and transfer are measured
+like with the real API. Latency, random errors and rate limits can be configured to measure throughput and
+retry behaviour reproducibly:
+    with FakeAdWords(latency=0.05, error_rate=0.01, rate_limit=50, seed=1) as fake:
+        adwords_service = fake.adwords_service()
+        report = adwords_service.download_report(...)
+"""
+import io
+import csv
+import json
+import time
+import zlib
+import random
+import datetime
+import threading
+import itertools
+import collections
+import http.server
+import urllib.parse
+from operator import gt, ge, lt, le
+from urllib.request import urlopen, Request
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+from freedan.adwords_services.awql import parse_awql
+from freedan.adwords_services.batch_uploader import BatchUploader
+from freedan.adwords_services.operation_serializer import OperationSerializer, API_NAMESPACE
+
+DEFAULT_API_VERSION = "v201708"
+DEFAULT_TOP_LEVEL_ACCOUNT_ID = "000-000-0000"
+DEFAULT_AMOUNT_ACCOUNTS = 3
+DEFAULT_REPORT_ROWS = 1000  # per account. Per account and day if the report is segmented by Date
+RATE_LIMIT_WINDOW = 1.0  # seconds
+NUMBER_OPERATORS = {
+    "GREATER_THAN": gt,
+    "GREATER_THAN_EQUALS": ge,
+    "LESS_THAN": lt,
+    "LESS_THAN_EQUALS": le
+}
+
+# selector fields whose object attribute isn't just the lower camel case version of the field
+FIELD_ATTRIBUTES = {
+    "LabelId": "id",
+    "LabelName": "name",
+    "LabelStatus": "status",
+    "CanManageClients": "canManageClients",
+    "AccountLabels": "accountLabels"
+}
+MATCH_TYPES = ("Exact", "Phrase", "Broad")
+
+
+class FakeApiError(Exception):
+    """ Error injected by FakeAdWords. Message format follows the one of AdWords' WebFaults """
+    pass
+
+
+class FakeObject(dict):
+    """ dict with attribute access to mimic suds objects: obj.id, obj["id"] and "id" in obj """
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name)
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+    @classmethod
+    def convert(cls, value):
+        """ Recursively convert dicts (e.g. operands) to FakeObjects """
+        if isinstance(value, dict):
+            return cls((key, cls.convert(item)) for key, item in value.items())
+        elif isinstance(value, list):
+            return [cls.convert(item) for item in value]
+        return value
+
+
+class FakeAdWords:
+    """ In-memory AdWords API with local http server for report downloads and batch jobs. See module docstring """
+    def __init__(self, accounts=None, links=None, objects=None, reports=None, report_rows=DEFAULT_REPORT_ROWS,
+                 latency=0.0, error_rate=0.0, rate_limit=None, operation_error_rate=0.0,
+                 batch_processing_seconds=0.0, top_level_account_id=DEFAULT_TOP_LEVEL_ACCOUNT_ID, seed=None):
+        """
+        :param accounts: list of dicts with attributes of ManagedCustomer objects (customerId, name, ...).
+                         Default: DEFAULT_AMOUNT_ACCOUNTS test accounts, see default_accounts
+        :param links: list of (manager customer id, client customer id). Default: all accounts below top level
+        :param objects: dict, service name -> list of dicts. Entries returned by get requests of that service
+        :param reports: dict, report type -> list of dicts (field -> value). Other report types are synthetic
+        :param report_rows: int, rows of synthetic reports per account (and day if segmented by Date)
+        :param latency: float, seconds every request takes
+        :param error_rate: float, probability of a request failing with FakeApiError (http 503 for files)
+        :param rate_limit: int, max requests per second. Further requests fail with a RateExceededError
+        :param operation_error_rate: float, probability of an operation failing in a mutate call or batch job
+        :param batch_processing_seconds: float, time until an uploaded batch job is DONE
+        :param top_level_account_id: str, customer id of the client created by method client
+        :param seed: int, seed for error injection
+        """
+        self.accounts = [FakeObject.convert(account) for account in (accounts or default_accounts())]
+        if links is None:
+            links = [(top_level_account_id, account.customerId) for account in self.accounts]
+        self.links = [FakeObject(managerCustomerId=manager, clientCustomerId=client) for manager, client in links]
+
+        self.objects = collections.defaultdict(list)
+        for service_name, entries in (objects or dict()).items():
+            self.objects[service_name] = [FakeObject.convert(entry) for entry in entries]
+
+        self.reports = reports or dict()
+        self.report_rows = report_rows
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.operation_error_rate = operation_error_rate
+        self.batch_processing_seconds = batch_processing_seconds
+        self.top_level_account_id = top_level_account_id
+
+        self.requests = collections.Counter()  # (service, method) -> amount of requests
+        self.injected_errors = collections.Counter()  # error type -> amount
+        self.mutations = list()  # (customer id, service name, operation) of all successful operations
+        self._mutation_times = list()  # UTC datetime per mutation, see customer_changes
+
+        self._random = random.Random(seed)
+        self._lock = threading.RLock()
+        self._request_times = collections.deque()
+        self._ids = itertools.count(1000000)
+        self._batch_jobs = dict()  # id -> FakeObject
+        self._batch_customer_ids = dict()  # id -> customer id the job was created for
+        self._batch_done_at = dict()  # id -> time.monotonic() when processing finishes
+        self._batch_uploads = collections.defaultdict(bytearray)  # id -> uploaded bytes
+        self._completed_uploads = set()  # ids of batch jobs whose upload is complete
+        self._batch_results = dict()  # id -> bytes
+
+        self._server = None
+        self._thread = None
+        self.url = None
+
+    def start(self):
+        """ Start the http server on a free local port """
+        self._server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _handler_class(self))
+        self._server.daemon_threads = True
+        self.url = "http://127.0.0.1:{port}".format(port=self._server.server_address[1])
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    def client(self, client_customer_id=None):
+        """ Client object that can be passed to AdWordsService instead of a real AdWordsClient """
+        if self.url is None:
+            raise ConnectionError("Please start the fake first using .start()")
+        return FakeAdWordsClient(self, client_customer_id or self.top_level_account_id)
+
+    def adwords_service(self, api_version=DEFAULT_API_VERSION):
+        """ AdWordsService connected to this fake """
+        from freedan.adwords_services.adwords_service import AdWordsService
+        return AdWordsService(credentials_path=None, api_version=api_version, client=self.client())
+
+    def next_id(self):
+        with self._lock:
+            return next(self._ids)
+
+    def request(self, service, method):
+        """ Simulate latency, rate limits and random errors of a single request """
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self._lock:
+            self.requests[(service, method)] += 1
+
+            if self.rate_limit is not None:
+                now = time.monotonic()
+                while self._request_times and now - self._request_times[0] > RATE_LIMIT_WINDOW:
+                    self._request_times.popleft()
+                if len(self._request_times) >= self.rate_limit:
+                    self.injected_errors["RateExceededError"] += 1
+                    raise FakeApiError("[RateExceededError <rateName=RATE_LIMIT, rateKey=null, rateScope=ACCOUNT, "
+                                       "retryAfterSeconds=1> @ ]")
+                self._request_times.append(now)
+
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.injected_errors["InternalApiError"] += 1
+                raise FakeApiError("[InternalApiError.UNEXPECTED_INTERNAL_API_ERROR @ ]")
+
+    def operation_fails(self):
+        with self._lock:
+            return bool(self.operation_error_rate) and self._random.random() < self.operation_error_rate
+
+    # ----- SOAP services -----
+    def entries(self, service_name, client):
+        """ All entries a get request of a service can return """
+        if service_name == "ManagedCustomerService":
+            return self.accounts
+        elif service_name == "BatchJobService":
+            with self._lock:
+                for job in self._batch_jobs.values():
+                    self._update_batch_job(job)
+                return list(self._batch_jobs.values())
+        return self.objects[service_name]
+
+    def mutate(self, service_name, operations, client):
+        """ Apply operations of a standard mutate call
+        :return: FakeObject like the return value of AdWords, incl. partialFailureErrors
+        """
+        if service_name == "BatchJobService":
+            return FakeObject(value=[self._add_batch_job(client.client_customer_id) for _ in operations])
+
+        values = list()
+        errors = list()
+        for index, operation in enumerate(operations):
+            if self.operation_fails():
+                errors.append(_operation_error(index))
+                continue
+            if not client.validate_only:
+                values.append(self.apply(service_name, operation, client.client_customer_id))
+
+        result = FakeObject(value=values)
+        if errors and client.partial_failure:
+            result["partialFailureErrors"] = errors
+        elif errors:
+            raise FakeApiError("[OperationAccessDenied.ACTION_NOT_PERMITTED @ operations[{index}]]".format(
+                index=errors[0]["fieldPathElements"][0]["index"]))
+        return result
+
+    def apply(self, service_name, operation, customer_id):
+        """ Apply a single operation to the stored objects
+        :return: FakeObject, operand incl. id
+        """
+        operand = FakeObject.convert(dict(operation["operand"]))
+        holder = _id_holder(operand)
+        with self._lock:
+            entries = self.objects[service_name]
+            if operation["operator"] == "ADD":
+                if "id" not in holder or int(holder["id"]) < 0:  # temporary ids are replaced
+                    holder["id"] = next(self._ids)
+                entries.append(operand)
+            elif "id" in holder:
+                operand_id = str(holder["id"])
+                if operation["operator"] == "REMOVE":
+                    self.objects[service_name] = [entry for entry in entries
+                                                  if str(_id_holder(entry).get("id")) != operand_id]
+                else:
+                    for entry in entries:
+                        if str(_id_holder(entry).get("id")) == operand_id:
+                            entry.update(operand)
+            self.mutations.append((customer_id, service_name, operation))
+            self._mutation_times.append(datetime.datetime.utcnow().replace(microsecond=0))
+        return operand
+
+    def customer_changes(self, selector, customer_id):
+        """ CustomerChangeData of CustomerSyncService, derived from the mutations in the selected time range
+        :return: FakeObject
+        """
+        since, until = [datetime.datetime.strptime(selector["dateTimeRange"][key].rsplit(" ", 1)[0], "%Y%m%d %H%M%S")
+                        for key in ("min", "max")]
+        selected_campaigns = {str(campaign_id) for campaign_id in selector.get("campaignIds", list())}
+        with self._lock:
+            adgroup_campaigns = {str(adgroup.get("id")): adgroup.get("campaignId")
+                                 for adgroup in self.objects["AdGroupService"]}
+            mutations = [(service_name, operation["operand"])
+                         for (mutation_customer_id, service_name, operation), at in zip(self.mutations,
+                                                                                        self._mutation_times)
+                         if mutation_customer_id == customer_id and since <= at <= until]
+
+        changed_campaigns = collections.OrderedDict()  # campaign id -> (is campaign changed, adgroup ids)
+        for service_name, operand in mutations:
+            if service_name == "CampaignService":
+                campaign_id, adgroup_id = operand.get("id"), None
+            else:
+                adgroup_id = operand.get("id") if service_name == "AdGroupService" else operand.get("adGroupId")
+                campaign_id = operand.get("campaignId", adgroup_campaigns.get(str(adgroup_id)))
+            if campaign_id is None or str(campaign_id) not in selected_campaigns:
+                continue
+
+            is_changed, adgroup_ids = changed_campaigns.setdefault(str(campaign_id), (False, list()))
+            if adgroup_id is None:
+                changed_campaigns[str(campaign_id)] = (True, adgroup_ids)
+            elif adgroup_id not in adgroup_ids:
+                adgroup_ids.append(adgroup_id)
+
+        return FakeObject.convert({
+            "lastChangeTimestamp": until.strftime("%Y%m%d %H%M%S"),
+            "changedCampaigns": [{
+                "campaignId": campaign_id,
+                "campaignChangeStatus": "FIELDS_MODIFIED" if is_changed else "FIELDS_UNCHANGED",
+                "changedAdGroups": [{"adGroupId": adgroup_id, "adGroupChangeStatus": "FIELDS_MODIFIED"}
+                                    for adgroup_id in adgroup_ids]
+            } for campaign_id, (is_changed, adgroup_ids) in changed_campaigns.items()]
+        })
+
+    # ----- batch jobs -----
+    def _add_batch_job(self, customer_id):
+        job_id = self.next_id()
+        job = FakeObject(id=job_id, status="AWAITING_FILE",
+                         uploadUrl=FakeObject(url="{url}/batch/{id}".format(url=self.url, id=job_id)))
+        with self._lock:
+            self._batch_jobs[job_id] = job
+            self._batch_customer_ids[job_id] = customer_id
+        return job
+
+    def _update_batch_job(self, job):
+        """ Mark processed batch jobs as DONE """
+        if job.status == "ACTIVE" and time.monotonic() >= self._batch_done_at[job.id]:
+            job.status = "DONE"
+            job.downloadUrl = FakeObject(url="{url}/download/{id}".format(url=self.url, id=job.id))
+
+    def upload_batch_chunk(self, job_id, body, content_range):
+        """ Part of a resumable upload
+        :return: bool, True if the upload is complete
+        """
+        with self._lock:
+            if job_id in self._completed_uploads:
+                raise ValueError("Upload of batch job {id} is already complete".format(id=job_id))
+            first = int(content_range.split()[-1].split("-")[0]) if content_range else 0
+            if first != len(self._batch_uploads[job_id]):
+                raise ValueError("Part starts at byte {first}, but {received} bytes were received".format(
+                    first=first, received=len(self._batch_uploads[job_id])))
+
+            self._batch_uploads[job_id] += body
+            total = content_range.rsplit("/", 1)[-1] if content_range else str(len(body))
+            is_complete = total != "*" and len(self._batch_uploads[job_id]) >= int(total)
+            if is_complete:
+                self._completed_uploads.add(job_id)
+                self._process_batch_job(job_id)
+        return is_complete
+
+    def received_batch_bytes(self, job_id):
+        """ Status of a resumable upload
+        :return: int, amount of received bytes. None if the upload is complete
+        """
+        with self._lock:
+            if job_id in self._completed_uploads:
+                return None
+            return len(self._batch_uploads[job_id])
+
+    def _process_batch_job(self, job_id):
+        """ Apply all uploaded operations and prepare the result xml """
+        payload = bytes(self._batch_uploads.pop(job_id))
+        operations = _parse_operations(payload)
+
+        results = list()
+        for index, (xsi_type, operation) in enumerate(operations):
+            if self.operation_fails():
+                results.append(_error_result_xml(index))
+                continue
+
+            service_name = xsi_type.replace("Operation", "Service")
+            operand = self.apply(service_name, operation, self._batch_customer_ids[job_id])
+            results.append("<rval><index>{index}</index><result><{type}><id>{id}</id></{type}></result></rval>".format(
+                index=index, type=xsi_type.replace("Operation", ""), id=_id_holder(operand).get("id", "")))
+
+        self._batch_results[job_id] = (
+            '<?xml version="1.0" encoding="UTF-8"?><mutateResponse xmlns="{namespace}">{results}</mutateResponse>'
+            .format(namespace=API_NAMESPACE.format(version=DEFAULT_API_VERSION), results="".join(results))
+            .encode("utf-8"))
+
+        self._batch_jobs[job_id].status = "ACTIVE"
+        self._batch_done_at[job_id] = time.monotonic() + self.batch_processing_seconds
+
+    def batch_result(self, job_id):
+        with self._lock:
+            return self._batch_results.get(job_id)
+
+    # ----- reports -----
+    def report(self, report_definition, customer_id, include_column_header=False):
+        """ CSV report for an account
+        :return: str
+        """
+        report_type = report_definition["reportType"]
+        fields = report_definition["selector"]["fields"]
+        if report_type in self.reports:
+            rows = [[row.get(field, " --") for field in fields] for row in self.reports[report_type]]
+        else:
+            rows = self._synthetic_rows(report_definition, customer_id)
+
+        # predicates on selected fields are applied, others are ignored
+        predicates = [predicate for predicate in report_definition["selector"].get("predicates", list())
+                      if predicate["field"] in fields]
+        if predicates:
+            rows = [row for row in rows
+                    if all(_matches({_attribute(field): value for field, value in zip(fields, row)}, predicate)
+                           for predicate in predicates)]
+
+        output = io.StringIO()
+        writer = csv.writer(output, lineterminator="\n")
+        if include_column_header:
+            writer.writerow(fields)
+        writer.writerows(rows)
+        return output.getvalue()
+
+    def _synthetic_rows(self, report_definition, customer_id):
+        """ Deterministic rows per account, report type and day """
+        selector = report_definition["selector"]
+        fields = selector["fields"]
+        dates = [None]
+        if "Date" in fields and "dateRange" in selector:
+            date_min = datetime.datetime.strptime(selector["dateRange"]["min"], "%Y%m%d").date()
+            date_max = datetime.datetime.strptime(selector["dateRange"]["max"], "%Y%m%d").date()
+            dates = [date_min + datetime.timedelta(days) for days in range((date_max - date_min).days + 1)]
+
+        rows = list()
+        for date in dates:
+            seed = zlib.crc32("{id}{type}{date}".format(
+                id=customer_id, type=report_definition["reportType"], date=date).encode("utf-8"))
+            generator = random.Random(seed)
+            for row in range(self.report_rows):
+                rows.append([_synthetic_value(field, row, date, generator) for field in fields])
+        return rows
+
+
+class FakeAdWordsClient:
+    """ Mimics googleads.adwords.AdWordsClient """
+    def __init__(self, fake, client_customer_id):
+        self.fake = fake
+        self.client_customer_id = client_customer_id
+        self.partial_failure = False
+        self.validate_only = False
+        self.cache = None
+
+    def SetClientCustomerId(self, client_customer_id):
+        self.client_customer_id = client_customer_id
+
+    def GetService(self, service_name, version=None, server=None):
+        return FakeService(self.fake, self, service_name)
+
+    def GetReportDownloader(self, version=None, server=None):
+        return FakeReportDownloader(self.fake, self)
+
+    def GetBatchJobHelper(self, version=DEFAULT_API_VERSION, server=None):
+        return FakeBatchJobHelper(self.fake, version)
+
+
+class FakeService:
+    """ Mimics the suds service proxies of googleads """
+    def __init__(self, fake, client, service_name):
+        self.fake = fake
+        self.client = client
+        self.service_name = service_name
+
+    def get(self, selector):
+        self.fake.request(self.service_name, "get")
+        if self.service_name == "CustomerSyncService":
+            return self.fake.customer_changes(selector, self.client.client_customer_id)
+
+        entries = [entry for entry in self.fake.entries(self.service_name, self.client)
+                   if all(_matches(entry, predicate) for predicate in selector.get("predicates", list()))]
+
+        for ordering in reversed(selector.get("ordering", list())):
+            attribute = _attribute(ordering["field"])
+            entries.sort(key=lambda entry: str(entry.get(attribute, "")),
+                         reverse=ordering.get("sortOrder") == "DESCENDING")
+
+        page = FakeObject(totalNumEntries=len(entries))
+        if "paging" in selector:
+            start = int(selector["paging"]["startIndex"])
+            entries = entries[start:start + int(selector["paging"]["numberResults"])]
+        if entries:
+            page.entries = entries
+        if self.service_name == "ManagedCustomerService":
+            page.links = self.fake.links
+        return page
+
+    def mutate(self, operations):
+        self.fake.request(self.service_name, "mutate")
+        return self.fake.mutate(self.service_name, operations, self.client)
+
+    def mutateLabel(self, operations):
+        self.fake.request(self.service_name, "mutateLabel")
+        return self.fake.mutate(self.service_name, operations, self.client)
+
+
+class FakeReportDownloader:
+    """ Mimics googleads.adwords.ReportDownloader. Reports are downloaded from the http server of the fake """
+    def __init__(self, fake, client):
+        self.fake = fake
+        self.client = client
+
+    def DownloadReportAsStream(self, report_definition, skip_report_header=False, skip_column_header=False,
+                               skip_report_summary=False, include_zero_impressions=False, client_customer_id=None):
+        body = json.dumps({
+            "reportDefinition": report_definition,
+            "skipColumnHeader": skip_column_header,
+            "clientCustomerId": client_customer_id or self.client.client_customer_id
+        }).encode("utf-8")
+        return urlopen(Request(self.fake.url + "/report", data=body, method="POST",
+                               headers={"Content-Type": "application/json"}))
+
+    def DownloadReportAsString(self, report_definition, skip_report_header=False, skip_column_header=False,
+                               skip_report_summary=False, include_zero_impressions=False, client_customer_id=None):
+        response = self.DownloadReportAsStream(report_definition, skip_report_header, skip_column_header,
+                                               skip_report_summary, include_zero_impressions, client_customer_id)
+        return response.read().decode("utf-8")
+
+    def DownloadReportAsStreamWithAwql(self, query, file_format, skip_report_header=False, skip_column_header=False,
+                                       skip_report_summary=False, include_zero_impressions=True,
+                                       client_customer_id=None):
+        return self.DownloadReportAsStream(parse_awql(query).report_definition(), skip_report_header,
+                                           skip_column_header, skip_report_summary, include_zero_impressions,
+                                           client_customer_id)
+
+    def DownloadReportAsStringWithAwql(self, query, file_format, skip_report_header=False, skip_column_header=False,
+                                       skip_report_summary=False, include_zero_impressions=True,
+                                       client_customer_id=None):
+        response = self.DownloadReportAsStreamWithAwql(query, file_format, skip_report_header, skip_column_header,
+                                                       skip_report_summary, include_zero_impressions,
+                                                       client_customer_id)
+        return response.read().decode("utf-8")
+
+
+class FakeBatchJobHelper:
+    """ Mimics googleads.adwords.BatchJobHelper """
+    def __init__(self, fake, api_version):
+        self.fake = fake
+        self.api_version = api_version
+        self._temp_ids = itertools.count(-1, -1)
+
+    def GetId(self):
+        return next(self._temp_ids)
+
+    def UploadOperations(self, upload_url, *operations):
+        """ Serialize operations and upload them with the resumable upload protocol """
+        payload = OperationSerializer(self.api_version).serialize(*operations)
+        BatchUploader._put_bytes(_init_resumable_upload(upload_url), payload, offset=0, total=len(payload))
+
+    def GetIncrementalUploadHelper(self, upload_url, current_content_length=0):
+        return FakeIncrementalUploadHelper(self.api_version, upload_url, current_content_length)
+
+    @staticmethod
+    def ParseResponse(batch_job_helper_response):
+        """ Convert result xml to nested dicts like googleads does
+        :return: dict
+        """
+        root = ElementTree.fromstring(batch_job_helper_response)
+        results = [_element_to_dict(element) for element in root]
+        return {"mutateResponse": {"rval": results}} if results else {"mutateResponse": dict()}
+
+
+class FakeIncrementalUploadHelper:
+    """ Mimics googleads.adwords.IncrementalUploadHelper """
+    def __init__(self, api_version, upload_url, current_content_length=0):
+        self.serializer = OperationSerializer(api_version)
+        # like googleads, an upload is only initiated without previous parts. Otherwise upload_url is resumable
+        self.resumable_url = upload_url if current_content_length else _init_resumable_upload(upload_url)
+        self.offset = current_content_length
+
+    def Dump(self, output):
+        """ Write the state of the helper as yaml """
+        output.write("current_content_length: {offset}\nupload_url: {url}\n".format(
+            offset=self.offset, url=self.resumable_url))
+
+    def UploadOperations(self, operations, is_last=False):
+        """ Upload a part of the mutate request
+        :param operations: list of lists of operations
+        :param is_last: bool, completes the upload
+        """
+        body = "".join("".join(self.serializer.serialize_operations(part)) for part in operations)
+        if self.offset == 0:
+            body = self.serializer.prefix() + body
+        if is_last:
+            body += self.serializer.suffix()
+
+        data = body.encode("utf-8")
+        total = self.offset + len(data) if is_last else None
+        BatchUploader._put_bytes(self.resumable_url, data, self.offset, total)
+        self.offset += len(data)
+
+
+def _init_resumable_upload(upload_url):
+    init_request = Request(upload_url, data=b"", method="POST", headers={"x-goog-resumable": "start"})
+    return urlopen(init_request).headers["location"]
+
+
+def _handler_class(fake):
+    """ Request handler of the http server of a FakeAdWords object """
+    class FakeAdWordsHandler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status, body=b"", headers=None):
+            self.send_response(status)
+            for key, value in (headers or dict()).items():
+                self.send_header(key, value)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _body(self):
+            return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+        def _route(self, method):
+            try:
+                self._handle(method)
+            except Exception as error:
+                self._send(500, str(error).encode("utf-8"))
+
+        def _handle(self, method):
+            path = urllib.parse.urlparse(self.path).path.strip("/").split("/")
+            body = self._body()
+            try:
+                fake.request("http/" + path[0], method)
+            except FakeApiError as error:
+                return self._send(503, str(error).encode("utf-8"))
+
+            if method == "POST" and path[0] == "report":
+                request = json.loads(body.decode("utf-8"))
+                csv_text = fake.report(request["reportDefinition"], request["clientCustomerId"],
+                                       include_column_header=not request["skipColumnHeader"])
+                return self._send(200, csv_text.encode("utf-8"), {"Content-Type": "text/csv"})
+
+            elif method == "POST" and path[0] == "batch" and self.headers.get("x-goog-resumable") == "start":
+                location = "{url}/batch/{id}?upload_id={id}".format(url=fake.url, id=path[1])
+                return self._send(201, headers={"Location": location})
+
+            elif method == "PUT" and path[0] == "batch" and self.headers.get("Content-Range") == "bytes */*":
+                received = fake.received_batch_bytes(int(path[1]))
+                if received is None:
+                    return self._send(200)
+                headers = {"Range": "bytes=0-{last}".format(last=received - 1)} if received else None
+                return self._send(308, headers=headers)
+
+            elif method == "PUT" and path[0] == "batch":
+                is_complete = fake.upload_batch_chunk(int(path[1]), body, self.headers.get("Content-Range"))
+                return self._send(200 if is_complete else 308)
+
+            elif method == "GET" and path[0] == "download":
+                result = fake.batch_result(int(path[1]))
+                if result is not None:
+                    return self._send(200, result, {"Content-Type": "application/xml"})
+            self._send(404)
+
+        def do_GET(self):
+            self._route("GET")
+
+        def do_POST(self):
+            self._route("POST")
+
+        def do_PUT(self):
+            self._route("PUT")
+    return FakeAdWordsHandler
+
+
+def default_accounts(amount=DEFAULT_AMOUNT_ACCOUNTS):
+    """ Test accounts as attribute dicts of ManagedCustomer objects """
+    return [{
+        "customerId": "100-000-{number:04d}".format(number=number),
+        "name": "Fake Account #{number}".format(number=number),
+        "canManageClients": False,
+        "currencyCode": "EUR",
+        "dateTimeZone": "Europe/Berlin",
+        "testAccount": True
+    } for number in range(1, amount + 1)]
+
+
+def _id_holder(operand):
+    """ Part of an operand carrying the id, e.g. the criterion of an AdGroupCriterion """
+    for nested in ("criterion", "ad"):
+        if isinstance(operand.get(nested), dict):
+            return operand[nested]
+    return operand
+
+
+def _attribute(field):
+    """ Object attribute of a selector field, e.g. CustomerId -> customerId """
+    return FIELD_ATTRIBUTES.get(field, field[:1].lower() + field[1:])
+
+
+def _text(value):
+    if isinstance(value, bool) or str(value).upper() in ("TRUE", "FALSE"):
+        return str(value).lower()
+    return str(value)
+
+
+def _matches(entry, predicate):
+    attribute = _attribute(predicate["field"])
+    values = predicate["values"] if isinstance(predicate["values"], (list, tuple)) else [predicate["values"]]
+    values = [_text(value) for value in values]
+    value = _text(entry.get(attribute, ""))
+
+    operator = predicate["operator"]
+    if operator in ("EQUALS", "IN"):
+        return value in values
+    elif operator in ("NOT_EQUALS", "NOT_IN"):
+        return value not in values
+    elif operator == "CONTAINS":
+        return any(candidate in value for candidate in values)
+    elif operator == "DOES_NOT_CONTAIN":
+        return not any(candidate in value for candidate in values)
+    elif operator in NUMBER_OPERATORS:
+        return NUMBER_OPERATORS[operator](float(value), float(values[0]))
+    raise IOError("Predicate operator {operator} isn't supported by FakeAdWords.".format(operator=operator))
+
+
+def _synthetic_value(field, row, date, generator):
+    """ Plausible report value for a field """
+    if field == "Date":
+        return date.strftime("%Y-%m-%d")
+    elif field == "CampaignId":
+        return 1000 + row // 500
+    elif field == "AdGroupId":
+        return 100000 + row // 50
+    elif field in ("Id", "CustomerId", "ExternalCustomerId") or field.endswith("Id"):
+        return 10000000 + row
+    elif field in ("Impressions", "Clicks", "Conversions"):
+        return generator.randint(0, 1000)
+    elif field in ("Cost", "CpcBid", "AverageCpc"):
+        return generator.randint(1, 500) * 10000
+    elif field == "KeywordMatchType":
+        return MATCH_TYPES[row % len(MATCH_TYPES)]
+    elif field == "Criteria":
+        return "keyword {row}".format(row=row)
+    elif field == "FinalUrls":
+        return '["https://www.example.com/{row}"]'.format(row=row) if row % 10 else " --"
+    elif field.endswith("Status"):
+        return "enabled"
+    return "{field} {row}".format(field=field, row=row)
+
+
+def _strip_namespace(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def _element_to_dict(element):
+    """ Nested dicts of an xml element. Repeated children become lists """
+    children = list(element)
+    if not children:
+        return element.text
+    result = dict()
+    for child in children:
+        tag = _strip_namespace(child.tag)
+        value = _element_to_dict(child)
+        if tag in result:
+            if not isinstance(result[tag], list):
+                result[tag] = [result[tag]]
+            result[tag].append(value)
+        else:
+            result[tag] = value
+    return result
+
+
+def _parse_operations(payload):
+    """ Operations of an uploaded mutate request
+    :return: list of (operation type, operation as nested dicts)
+    """
+    xsi_type = "{http://www.w3.org/2001/XMLSchema-instance}type"
+    operations = list()
+    for element in ElementTree.fromstring(payload):
+        operation = _element_to_dict(element)
+        operation_type = element.get(xsi_type, "Operation").split(":")[-1]
+        operations.append((operation_type, operation))
+    return operations
+
+
+def _operation_error(index):
+    """ Error like in partialFailureErrors of a mutate call """
+    return FakeObject.convert({
+        "fieldPath": "operations[{index}]".format(index=index),
+        "fieldPathElements": [{"field": "operations", "index": index}],
+        "trigger": None,
+        "errorString": "InternalApiError.UNEXPECTED_INTERNAL_API_ERROR",
+        "ApiError.Type": "InternalApiError",
+        "reason": "UNEXPECTED_INTERNAL_API_ERROR"
+    })
+
+
+def _error_result_xml(index):
+    return ("<rval><index>{index}</index><errorList><errors>"
+            "<fieldPath>operations[{index}]</fieldPath><trigger></trigger>"
+            "<errorString>InternalApiError.UNEXPECTED_INTERNAL_API_ERROR</errorString>"
+            "<ApiError.Type>InternalApiError</ApiError.Type><reason>UNEXPECTED_INTERNAL_API_ERROR</reason>"
+            "</errors></errorList></rval>").format(index=escape(str(index)))
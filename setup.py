@@ -27,18 +27,23 @@ PACKAGES = [
     "freedan",
     "freedan.adwords_objects",
     "freedan.adwords_services",
-    "freedan.other_services"
+    "freedan.other_services",
+    "freedan.testing"
 ]
 
 DEPENDENCIES = [
-    "googleads",
+    "googleads>=7.0.0,<11.0.0",  # suds based. Newer versions default to zeep, see wsdl_cache.py
     "pandas",
     "unidecode"
 ]
 
+EXTRAS = {
+    "parquet": ["pyarrow>=8.0.0"]
+}
+
 CLASSIFIERS = [
     "Intended Audience :: Developers",
-    "Programming Language :: Python :: 3.6"
+    "Programming Language :: Python :: 3.7"
 ]
 
 setuptools.setup(
@@ -49,6 +54,8 @@ setuptools.setup(
     packages=PACKAGES,
     license="Apache License 2.0",
     install_requires=DEPENDENCIES,
+    extras_require=EXTRAS,
+    python_requires=">=3.7",
     classifiers=CLASSIFIERS,
     author="Martin Winkel",
     author_email="martin.winkel.pps@gmail.com"
@@ -0,0 +1,20 @@
+import pytest
+
+from freedan.testing.fake_adwords import FakeAdWords
+
+
+@pytest.fixture
+def fake_adwords(request):
+    """ Running FakeAdWords. Keyword arguments like report_rows are passed by indirect parametrization:
+        @pytest.mark.parametrize("fake_adwords", [{"report_rows": 10}], indirect=True)
+    """
+    with FakeAdWords(**getattr(request, "param", dict())) as fake:
+        yield fake
+
+
+@pytest.fixture
+def fake_service(fake_adwords):
+    """ AdWordsService connected to fake_adwords, client customer id is the first fake account """
+    adwords_service = fake_adwords.adwords_service()
+    adwords_service.client.SetClientCustomerId(fake_adwords.accounts[0].customerId)
+    return adwords_service
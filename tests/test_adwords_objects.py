@@ -1,4 +1,7 @@
 import pytest
+
+from freedan import SharedSetOverview
+from freedan.testing.fake_adwords import FakeAdWords
 from tests import service_suds_client
 
 
@@ -192,7 +195,93 @@ def test_keyword():
 def test_shared_set_overview():
     import pandas as pd
     from tests import adwords_service
-    from freedan import SharedSetOverview
 
     shared_set = SharedSetOverview(adwords_service)
     assert isinstance(shared_set.overview, pd.DataFrame)
+
+    # second overview of same account comes from cache
+    cached_shared_set = SharedSetOverview(adwords_service)
+    assert cached_shared_set.overview.equals(shared_set.overview)
+    assert cached_shared_set.overview is not shared_set.overview
+
+    for name, shared_set_id in zip(shared_set.overview["SharedSetName"], shared_set.overview["SharedSetId"]):
+        assert shared_set.shared_set_id(name) == shared_set_id
+        assert shared_set.shared_set_name(shared_set_id) == name
+
+    with pytest.raises(LookupError):
+        shared_set.shared_set_id("this shared set doesn't exist")
+
+    overviews = SharedSetOverview.for_accounts(adwords_service, [adwords_service.client.client_customer_id])
+    assert len(overviews) == 1
+
+
+@pytest.mark.parametrize("fake_adwords", [{"report_rows": 5}], indirect=True)
+def test_shared_set_overview_cache(fake_adwords, fake_service):
+    SharedSetOverview.clear_cache()
+    customer_id = fake_adwords.accounts[0].customerId
+    overview = SharedSetOverview(fake_service, client_customer_id=customer_id)
+    overview.overview.drop(overview.overview.index, inplace=True)  # must not corrupt the cache
+
+    cached_overview = SharedSetOverview(fake_service, client_customer_id=customer_id)
+    assert len(cached_overview) == 5 and fake_adwords.requests[("http/report", "POST")] == 1
+
+    # same account id, but different connection
+    with FakeAdWords(report_rows=3) as other_fake:
+        other_overview = SharedSetOverview(other_fake.adwords_service(), client_customer_id=customer_id)
+        assert len(other_overview) == 3
+
+
+def test_account_tree(tmpdir):
+    from freedan import AccountTree, Account
+
+    accounts = {
+        1: {"name": "MCC", "customer_id": 1, "is_mcc": True, "currency": "EUR", "time_zone": "Europe/Berlin",
+            "is_test": False, "labels": list()},
+        2: {"name": "Sub MCC", "customer_id": 2, "is_mcc": True, "currency": "EUR", "time_zone": "Europe/Berlin",
+            "is_test": False, "labels": list()},
+        3: {"name": "B", "customer_id": 3, "is_mcc": False, "currency": "EUR", "time_zone": "Europe/Berlin",
+            "is_test": False, "labels": [["bus", 7]]},
+        4: {"name": "A", "customer_id": 4, "is_mcc": False, "currency": "CAD", "time_zone": "America/Vancouver",
+            "is_test": False, "labels": [["bus", 7], ["train", 8]]},
+    }
+    links = [(1, 2), (1, 3), (2, 4)]
+    tree = AccountTree(accounts, links, top_level_account_id=1)
+
+    assert [account.id for account in tree.accounts()] == [4, 3]
+    assert [account.id for account in tree.by_label("bus")] == [4, 3]
+    assert [account.id for account in tree.by_label("train")] == [4]
+    assert [account.id for account in tree.subtree(2)] == [4]
+    assert [account.id for account in tree.subtree(2, skip_mccs=False)] == [4, 2]
+
+    account = tree.account(4)
+    assert isinstance(account, Account)
+    assert account.currency == "CAD"
+    assert [label.name for label in account.labels] == ["bus", "train"]
+
+    # persist to disk
+    cache_path = str(tmpdir.join("account_tree.json"))
+    tree.to_file(cache_path)
+    cached_tree = AccountTree.from_file(cache_path)
+    assert cached_tree.accounts_by_id == tree.accounts_by_id
+    assert cached_tree.links == tree.links
+    assert cached_tree.created_at == tree.created_at
+
+    # ids are normalized, e.g. the dashed top level account id of the client
+    tree = AccountTree({"123-456-7890": dict(accounts[3], customer_id="123-456-7890")},
+                       [("000-000-0001", 1234567890)], top_level_account_id="000-000-0001")
+    assert tree.top_level_account_id == 1 and tree.links == [(1, 1234567890)]
+    assert [account.id for account in tree.subtree(tree.top_level_account_id)] == [1234567890]
+    assert [account.id for account in tree.subtree("000-000-0001")] == [1234567890]
+    assert tree.account("123-456-7890").id == 1234567890
+    assert [account.id for account in tree.by_label("bus")] == [1234567890]
+
+
+def test_account_tree_cache(tmpdir):
+    from tests import adwords_service
+    from freedan import AccountTree
+
+    cache_path = str(tmpdir.join("account_tree.json"))
+    tree = adwords_service.account_tree(cache_path=cache_path)
+    cached_tree = adwords_service.account_tree(cache_path=cache_path)
+    assert cached_tree.created_at == tree.created_at
+    assert isinstance(cached_tree, AccountTree)
@@ -1,5 +1,16 @@
+import os
+import datetime
+
+import pandas as pd
 import pytest
 
+from freedan import AdGroup, EntityStore, FinalUrl, Keyword, KeywordMigration, StreamingPipeline
+from freedan.adwords_services.awql import parse_awql
+from freedan.adwords_services.batch_uploader import BatchUploader
+from freedan.adwords_services.incremental_sync import IncrementalSync
+from freedan.adwords_services.report_helper import parse_final_urls
+from freedan.testing.fake_adwords import FakeApiError, default_accounts
+
 
 def test_micro_euro_conversion():
     from freedan import AdWordsService
@@ -24,6 +35,28 @@ def test_init_service():
     assert isinstance(report_downloader, googleads.adwords.ReportDownloader)
 
 
+def test_wsdl_cache(tmpdir):
+    from freedan import AdWordsService
+    from tests import adwords_test_credentials
+
+    cache_dir = str(tmpdir)
+    adwords_service = AdWordsService(adwords_test_credentials, wsdl_cache_dir=cache_dir)
+    adwords_service.init_service("ManagedCustomerService")
+    assert os.listdir(os.path.join(cache_dir, adwords_service.api_version))
+
+
+def test_wsdl_cache_zeep(tmpdir):
+    from freedan.adwords_services.wsdl_cache import use_wsdl_cache
+
+    class ZeepClient:
+        soap_impl = "zeep"
+        cache = None
+
+    client = ZeepClient()
+    assert not use_wsdl_cache(client, str(tmpdir), "v201708")
+    assert client.cache is None and not tmpdir.listdir()
+
+
 def test_account_selector():
     from tests import adwords_service
 
@@ -112,9 +145,22 @@ def test_account_iterator():
         assert account.name == "Dont touch - !ImportantForTests!"
 
 
+def test_paged_account_iterator():
+    from freedan.adwords_services.adwords_service import PAGE_SIZE
+    from tests import adwords_service
+
+    selector = {"fields": ["Name"]}
+    paged_selector = adwords_service._paged_selector(selector, offset=PAGE_SIZE)
+    assert paged_selector["paging"] == {"startIndex": str(PAGE_SIZE), "numberResults": str(PAGE_SIZE)}
+    assert "paging" not in selector
+
+    accounts = [account.id for account in adwords_service.accounts()]
+    prefetched_accounts = [account.id for account in adwords_service.accounts(prefetch=True)]
+    assert accounts == prefetched_accounts
+
+
 def test_report_definition():
     from tests import adwords_service
-    import datetime
 
     today = datetime.date.today()
     yesterday = (today - datetime.timedelta(1)).strftime("%Y-%m-%d")
@@ -169,7 +215,6 @@ def test_report_definition():
 
 
 def test_download_report():
-    import pandas as pd
     from tests import adwords_service
 
     # impression keywords (empty df since test account can't be served)
@@ -286,9 +331,41 @@ def test_fillna_with_temp_id():
     assert temp_id_helper.fillna_with_temp_id("asjd") == "asjd"
 
 
+def test_temp_id_helper_batches():
+    import threading
+    import numpy as np
+    from freedan import TempIdHelper
+
+    temp_id_helper = TempIdHelper()
+    assert temp_id_helper.reserve(3).tolist() == [-1, -2, -3]
+    assert temp_id_helper.temp_id == -4
+
+    filled = temp_id_helper.fillna_with_temp_ids(pd.Series([np.nan, 230, np.nan]))
+    assert filled.tolist() == [-5, 230, -6]
+    assert filled.dtype == np.int64
+
+    # namespaced and thread safe
+    shared_helper = TempIdHelper.for_batch_job("test_job")
+    assert shared_helper is TempIdHelper.for_batch_job("test_job")
+    assert shared_helper is not TempIdHelper.for_batch_job("other_job")
+
+    temp_ids = list()
+
+    def allocate():
+        temp_ids.extend(shared_helper.temp_id for _ in range(1000))
+
+    workers = [threading.Thread(target=allocate) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    assert len(set(temp_ids)) == 4000
+    TempIdHelper.release_batch_job("test_job")
+    TempIdHelper.release_batch_job("other_job")
+
+
 def test_report_helper():
     import numpy as np
-    import pandas as pd
     from freedan.adwords_services.report_helper import convert_adwords_columns, replace_special_float
 
     # special float conversion
@@ -339,3 +416,547 @@ def test_report_helper():
     assert convert_adwords_columns(adwords_df.copy()).equals(expected_df)
     assert convert_adwords_columns(adwords_df.copy(), add_operation_type=False).equals(expected_df[cols])
     assert convert_adwords_columns(adwords_df.copy(), remove_pluses=False).equals(expected_df_with_pluses)
+
+
+def test_operation_serializer():
+    from freedan import Keyword, AdGroup
+    from freedan.adwords_services.operation_serializer import OperationSerializer, serialize_operation
+
+    keyword = Keyword("test kw", "Exact", 1, "https://asd.ca")
+    keyword_operation = keyword.add_operation(adgroup_id=-2)
+    assert serialize_operation(keyword_operation) == (
+        '<operations xsi:type="AdGroupCriterionOperation">'
+        '<operator>ADD</operator>'
+        '<operand xsi:type="BiddableAdGroupCriterion">'
+        '<adGroupId>-2</adGroupId>'
+        '<criterion xsi:type="Keyword"><text>test kw</text><matchType>EXACT</matchType></criterion>'
+        '<userStatus>ENABLED</userStatus>'
+        '<biddingStrategyConfiguration><bids xsi:type="CpcBid">'
+        '<bid xsi:type="Money"><microAmount>1000000</microAmount></bid>'
+        '</bids></biddingStrategyConfiguration>'
+        '<finalUrls><urls>https://asd.ca</urls></finalUrls>'
+        '</operand>'
+        '</operations>'
+    )
+
+    # escaping
+    adgroup_operation = AdGroup.set_name_operation(adgroup_id=1, new_name="a & <b>")
+    assert "<name>a &amp; &lt;b&gt;</name>" in serialize_operation(adgroup_operation)
+
+    # result doesn't depend on chunking/processes
+    operations = [keyword_operation, adgroup_operation] * 3
+    single = OperationSerializer("v201708").serialize(operations)
+    pooled = OperationSerializer("v201708", processes=2, chunk_size=2).serialize(operations[:2], operations[2:])
+    assert single == pooled
+    assert single.startswith(b'<?xml version="1.0" encoding="UTF-8"?><mutate')
+    assert single.endswith(b"</mutate>")
+
+
+def test_label_cache():
+    from tests import adwords_service
+    from freedan import Label, LabelCache
+
+    label_cache = LabelCache(adwords_service)
+    label_ids = label_cache.lookup(["ag_label_test", "ag_label_test"], is_debug=True, action_if_not_found="default_id")
+    assert list(label_ids) == ["ag_label_test"]
+    assert label_cache.customer_id in label_cache._label_ids
+
+    with pytest.raises(IOError):
+        label_cache.lookup(["this label doesn't exist"], is_debug=True, action_if_not_found="error")
+
+    ag_label = Label("ag_label_test")
+    ag_label.update_id(adwords_service, is_debug=True, action_if_not_found="default_id", label_cache=label_cache)
+    assert ag_label.id == label_ids["ag_label_test"]
+
+
+def test_operation_planner():
+    from freedan import CampaignBudget, Campaign, AdGroup, Keyword, TempIdHelper
+    from freedan.adwords_services.operation_planner import OperationPlanner
+
+    temp_id_helper = TempIdHelper()
+    operations = list()
+    for num in range(2):
+        budget_id, campaign_id, adgroup_id = temp_id_helper.reserve(3).tolist()
+        keyword = Keyword("kw {num}".format(num=num), "EXACT", 1, "https://asd.ca")
+        # deliberately in reversed order
+        operations += [
+            keyword.add_operation(adgroup_id=adgroup_id),
+            AdGroup("ag").add_operation(campaign_id=campaign_id, bid=1, adgroup_id=adgroup_id),
+            Campaign("camp").add_operation(budget_id=budget_id, campaign_id=campaign_id),
+            CampaignBudget(10).add_operation(temp_id=budget_id)
+        ]
+
+    planner = OperationPlanner(operations)
+    ordered = planner.order()
+    assert [part[0]["xsi_type"] for part in ordered] == [
+        "BudgetOperation", "CampaignOperation", "AdGroupOperation", "AdGroupCriterionOperation"]
+    assert all(len(part) == 2 for part in ordered)
+
+    assert len(planner.independent_groups()) == 2
+    assert len(planner.split(max_jobs=1)) == 1
+    jobs = planner.split(max_jobs=4)
+    assert len(jobs) == 2
+    assert all(len(part) == 1 for job in jobs for part in job)
+
+    # operations on existing objects keep their order and stay in one job
+    pause_adgroup = {"xsi_type": "AdGroupOperation", "operator": "SET", "operand": {"id": 5, "status": "PAUSED"}}
+    planner = OperationPlanner([
+        Keyword.delete_operation(adgroup_id=5, keyword_id=7),
+        pause_adgroup,
+        Keyword("kw", "EXACT", 1, "https://asd.ca").add_operation(adgroup_id=5),
+        Keyword("other", "EXACT", 1, "https://asd.ca").add_operation(adgroup_id=6),
+    ])
+    assert [part[0]["operator"] for part in planner.order(range(3))] == ["REMOVE", "SET", "ADD"]
+    jobs = planner.split(max_jobs=4)
+    assert sorted(sum(len(part) for part in job) for job in jobs) == [1, 3]
+
+    # referencing an undefined temp id
+    with pytest.raises(IOError):
+        OperationPlanner([Keyword("kw", "EXACT", 1, "https://asd.ca").add_operation(adgroup_id=-100)])
+
+
+def test_upload_planned(fake_adwords, fake_service):
+    keyword = Keyword("kw", "EXACT", 1, "https://asd.ca")
+    operations = [Keyword.delete_operation(adgroup_id=5, keyword_id=7), keyword.add_operation(adgroup_id=5)]
+    operations += [Keyword("kw {num}".format(num=num), "EXACT", 1, "https://asd.ca").add_operation(adgroup_id=6)
+                   for num in range(3)]
+
+    results = fake_service.upload_planned(operations, is_debug=False, max_parallel_jobs=2,
+                                          batch_sleep_interval=0)
+    assert len(results) == 2
+    assert fake_adwords.requests[("BatchJobService", "mutate")] == 2
+
+    adgroup_5 = [operation["operator"] for _, _, operation in fake_adwords.mutations
+                 if str(operation["operand"]["adGroupId"]) == "5"]
+    assert adgroup_5 == ["REMOVE", "ADD"]
+
+
+def test_keyword_index():
+    from freedan.adwords_services.keyword_index import KeywordIndex
+
+    keywords = pd.DataFrame([
+        [1, 10, 100, "bus berlin", "Exact"],
+        [1, 11, 101, "bus berlin", "Phrase"],
+        [1, 12, 102, "+berlin +hamburg", "Broad"],
+        [1, 13, 103, "zug", "Phrase"],
+    ], columns=["CampaignId", "AdGroupId", "Id", "Criteria", "KeywordMatchType"])
+    index = KeywordIndex(keywords)
+
+    assert index.lookup("Bus Berlin") == [0, 1]
+    assert index.lookup("cheap bus berlin") == [1]
+    assert index.lookup("hamburg to berlin") == [2]
+    assert index.lookup("hamburg bus berlin") == [1, 2]
+    assert index.lookup("berlin bus") == []
+
+    matched = index.match_queries(pd.Series(["bus-berlin", "flug", "zug hamburg"], index=[5, 6, 7]))
+    assert matched.index.tolist() == [5, 6, 7]
+    assert matched["Query"].tolist() == ["bus-berlin", "flug", "zug hamburg"]
+    assert matched["AdGroupId"].tolist()[0] == 10
+    assert pd.isnull(matched["AdGroupId"].tolist()[1])
+    assert matched["Id"].tolist()[2] == 103
+
+
+def test_negative_keyword_conflicts():
+    from freedan.adwords_services.negative_keyword_conflicts import NegativeKeywordConflictChecker
+
+    keywords = pd.DataFrame([
+        [1, 10, 100, "bus berlin", "EXACT"],
+        [1, 11, 101, "cheap bus hamburg", "PHRASE"],
+        [2, 20, 200, "train munich", "BROAD"],
+    ], columns=["CampaignId", "AdGroupId", "Id", "Criteria", "KeywordMatchType"])
+
+    adgroup_negatives = pd.DataFrame([[10, "bus berlin", "EXACT"], [11, "bus berlin", "EXACT"]],
+                                     columns=["AdGroupId", "Criteria", "KeywordMatchType"])
+    campaign_negatives = pd.DataFrame([[1, "cheap bus", "PHRASE"], [2, "cheap", "BROAD"]],
+                                      columns=["CampaignId", "Criteria", "KeywordMatchType"])
+    shared_set_negatives = pd.DataFrame([[5, "munich train", "BROAD"], [5, "munich train", "PHRASE"]],
+                                        columns=["SharedSetId", "Criteria", "KeywordMatchType"])
+    campaign_shared_sets = pd.DataFrame([[2, 5]], columns=["CampaignId", "SharedSetId"])
+
+    checker = NegativeKeywordConflictChecker(adgroup_negatives, campaign_negatives,
+                                             shared_set_negatives, campaign_shared_sets)
+    conflicts = checker.conflicts(keywords)
+    assert conflicts[["Id", "NegativeLevel", "NegativeScopeId"]].values.tolist() == [
+        [100, "adgroup", 10],
+        [101, "campaign", 1],
+        [200, "shared_set", 5],
+    ]
+    assert conflicts["NegativeMatchType"].tolist() == ["EXACT", "PHRASE", "BROAD"]
+
+
+def test_duplicate_keyword_finder():
+    from freedan.adwords_services.duplicate_keyword_finder import DuplicateKeywordFinder
+
+    columns = ["CampaignId", "AdGroupId", "Id", "Criteria", "KeywordMatchType", "Impressions"]
+    chunk1 = pd.DataFrame([
+        [1, 10, 100, "Bus Berlin", "Exact", 5],
+        [1, 10, 101, "bus berlin", "EXACT", 1],
+        [1, 10, 102, "bus berlin", "PHRASE", 1],
+        [1, 11, 110, "bus berlin", "EXACT", 1],
+    ], columns=columns)
+    chunk2 = pd.DataFrame([
+        [1, 10, 103, "bus-berlin", "Exact", 10],
+    ], columns=columns)
+
+    # keep first keyword per adgroup
+    duplicates = DuplicateKeywordFinder().find([chunk1, chunk2])
+    assert sorted(duplicates["Id"].tolist()) == [101, 103]
+    assert duplicates["DuplicateOfId"].tolist() == [100, 100]
+
+    # keep keyword with most impressions per campaign
+    duplicates = DuplicateKeywordFinder(level="campaign", keep_by="Impressions").find([chunk1, chunk2])
+    assert sorted(duplicates["Id"].tolist()) == [100, 101, 110]
+    assert set(duplicates["DuplicateOfId"]) == {103}
+
+    operations = DuplicateKeywordFinder.delete_operations(duplicates)
+    assert len(operations) == 3
+    assert all(operation["operator"] == "REMOVE" for operation in operations)
+
+    # groups are compared by their full key, distinct keywords are never duplicates
+    finder = DuplicateKeywordFinder()
+    assert finder.keyword_keys(chunk2).iloc[0].tolist() == [1, 10, "bus berlin", "EXACT"]
+    distinct = pd.DataFrame([[1, 10, 200 + i, "keyword {i}".format(i=i), "Broad", 0] for i in range(1000)],
+                            columns=columns)
+    assert finder.find([distinct.iloc[:500], distinct.iloc[500:]]).empty
+
+
+@pytest.mark.parametrize("fake_adwords", [{"report_rows": 10, "operation_error_rate": 0.5, "seed": 1}], indirect=True)
+def test_fake_adwords(fake_adwords, fake_service):
+    accounts = list(fake_service.accounts())
+    assert [account.name for account in accounts] == ["Fake Account #1", "Fake Account #2", "Fake Account #3"]
+
+    report_def = fake_service.report_definition(
+        "KEYWORDS_PERFORMANCE_REPORT", ["Date", "AdGroupId", "Id", "Criteria"], last_days=3)
+    report = fake_service.download_report(report_def, client_customer_id=accounts[0].id)
+    assert len(report) == 30
+    assert list(report.columns) == ["Date", "AdGroupId", "Id", "Criteria"]
+
+    operations = [Keyword(text="kw {i}".format(i=i), match_type="EXACT", bid=1.0,
+                          final_url=FinalUrl("https://www.example.com")).add_operation(adgroup_id=1)
+                  for i in range(10)]
+    for fast_serialization in (False, True):
+        response, errors = fake_service.upload(operations, is_debug=False, method="batch",
+                                               batch_sleep_interval=0, fast_serialization=fast_serialization)
+        assert len(response["mutateResponse"]["rval"]) == 10
+        assert 0 < len(errors) < 10
+    assert fake_adwords.requests[("BatchJobService", "mutate")] == 2
+
+
+@pytest.mark.parametrize("fake_adwords", [{"rate_limit": 1}], indirect=True)
+def test_fake_adwords_rate_limit(fake_adwords):
+    service = fake_adwords.client().GetService("LabelService")
+    service.get({"fields": ["LabelId"]})
+    with pytest.raises(FakeApiError):
+        service.get({"fields": ["LabelId"]})
+    assert fake_adwords.injected_errors["RateExceededError"] == 1
+
+
+def test_batch_upload_retry_after_accepted_part(monkeypatch, fake_adwords, fake_service):
+    monkeypatch.setattr("freedan.other_services.error_retryer.time.sleep", lambda seconds: None)
+    operations = [Keyword(text="kw {i}".format(i=i), match_type="EXACT", bid=1.0,
+                          final_url=FinalUrl("https://www.example.com")).add_operation(adgroup_id=1)
+                  for i in range(2000)]
+    chunks = [operations[i:i + 500] for i in range(0, len(operations), 500)]
+
+    upload_batch_chunk = fake_adwords.upload_batch_chunk
+    lost_responses = list()
+
+    def lose_first_response(job_id, body, content_range):
+        """ the part arrives, but the client gets an error """
+        is_complete = upload_batch_chunk(job_id, body, content_range)
+        if not lost_responses:
+            lost_responses.append(content_range)
+            raise IOError("connection reset")
+        return is_complete
+
+    monkeypatch.setattr(fake_adwords, "upload_batch_chunk", lose_first_response)
+    for fast_serialization in (False, True):
+        del lost_responses[:]
+        uploader = BatchUploader(fake_service, is_debug=False, batch_sleep_interval=0,
+                                 fast_serialization=fast_serialization)
+        response, errors = uploader.execute_incrementally(iter(chunks))
+        assert lost_responses[0].endswith("/*")  # not the last part
+        assert len(response["mutateResponse"]["rval"]) == 2000
+        assert not errors
+
+
+@pytest.mark.parametrize("fake_adwords", [{"report_rows": 1000}], indirect=True)
+def test_streaming_pipeline(fake_adwords, fake_service):
+    report_def = fake_service.report_definition(
+        "KEYWORDS_PERFORMANCE_REPORT", ["AdGroupId", "Id", "Criteria", "KeywordMatchType"])
+
+    chunks = list(fake_service.download_report_chunks(report_def, chunk_size=300))
+    assert [len(chunk) for chunk in chunks] == [300, 300, 300, 100]
+
+    def only_broad(keywords):
+        return keywords[keywords["KeywordMatchType"] == "Broad"]
+
+    def build_operations(keywords):
+        return [Keyword.delete_operation(adgroup_id=int(adgroup_id), keyword_id=int(keyword_id))
+                for adgroup_id, keyword_id in zip(keywords["AdGroupId"], keywords["Id"])]
+
+    for fast_serialization in (False, True):
+        pipeline = StreamingPipeline(fake_service, report_def, build_operations, transform=only_broad,
+                                     chunk_size=100, max_queued_chunks=1)
+        response, errors = pipeline.run(is_debug=False, batch_sleep_interval=0,
+                                        fast_serialization=fast_serialization)
+        assert pipeline.rows_read == 1000
+        assert pipeline.operations_built == 333
+        assert len(response["mutateResponse"]["rval"]) == 333
+        assert not errors
+
+    # no operations -> no batch job
+    batch_jobs = fake_adwords.requests[("BatchJobService", "mutate")]
+    pipeline = StreamingPipeline(fake_service, report_def, build_operations,
+                                 transform=lambda keywords: keywords.iloc[:0])
+    assert pipeline.run(is_debug=False, batch_sleep_interval=0) is None
+    assert pipeline.rows_read == 1000 and pipeline.operations_built == 0
+    assert fake_adwords.requests[("BatchJobService", "mutate")] == batch_jobs
+
+
+@pytest.mark.parametrize("fake_adwords", [{"operation_error_rate": 0.2, "seed": 3}], indirect=True)
+def test_keyword_migration(fake_adwords, fake_service):
+    final_urls = pd.Series(['["https://www.example.com/a"]', " --", None, '["https://www.example.com/b", "x"]'])
+    parsed = parse_final_urls(final_urls)
+    assert parsed[0] == "https://www.example.com/a" and parsed[3] == "https://www.example.com/b"
+    assert parsed[[1, 2]].isnull().all()
+
+    keywords = pd.DataFrame({
+        "AdGroupId": [1, 1, 2, 2, 3, 3] * 10,
+        "Id": range(60),
+        "Criteria": ["bus berlin", "+bus hamburg"] * 30,
+        "KeywordMatchType": "Broad",
+        "CpcBid": 1000000,
+        "Status": "enabled",
+        "FinalUrls": ['["https://www.example.com"]', " --"] * 30
+    })
+
+    migration = KeywordMigration(fake_service, max_parallel_jobs=2, operations_per_job=20,
+                                 batch_sleep_interval=0)
+    assert [len(positions) for positions in migration.split_by_adgroup(keywords)] == [20, 20, 20]
+
+    result = migration.migrate(keywords, new_texts=Keyword.to_broad_modified, is_debug=False)
+    assert list(result["NewCriteria"][:2]) == ["+bus +berlin", "+bus +hamburg"]
+    assert 0 < result["IsAdded"].sum() < len(keywords)
+    assert not (result["IsDeleted"] & ~result["IsAdded"]).any()  # never delete without replacement
+
+    deletes = [operation for _, _, operation in fake_adwords.mutations if operation["operator"] == "REMOVE"]
+    assert len(deletes) == result["IsDeleted"].sum()
+
+    # filtered report chunks instead of a DataFrame, no batch job without keywords
+    chunks = (chunk[chunk["AdGroupId"] == 1] for chunk in (keywords.iloc[:30], keywords.iloc[30:]))
+    result = migration.migrate(chunks, new_texts=str.upper, is_debug=True)
+    assert list(result["Id"]) == list(keywords["Id"][keywords["AdGroupId"] == 1])
+    assert list(result.index) == list(range(20))
+
+    batch_jobs = fake_adwords.requests[("BatchJobService", "mutate")]
+    assert migration.migrate(iter([]), new_texts=str.upper, is_debug=False).empty
+    assert fake_adwords.requests[("BatchJobService", "mutate")] == batch_jobs
+
+
+@pytest.mark.parametrize("fake_adwords", [{"objects": {
+    "CampaignService": [{"id": 10}, {"id": 20}],
+    "AdGroupService": [{"id": 100, "campaignId": 10}, {"id": 200, "campaignId": 20}]
+}}], indirect=True)
+def test_incremental_sync(tmpdir, fake_adwords, fake_service):
+    state_path = os.path.join(str(tmpdir), "sync_state.json")
+    customer_id = fake_adwords.accounts[0].customerId
+
+    sync = IncrementalSync(fake_service, state_path)
+    changes = sync.changes()
+    assert changes.is_full_sync and changes.predicates() == list()
+    sync.commit(changes)
+
+    # state survives restarts
+    assert IncrementalSync(fake_service, state_path).last_sync(customer_id) == changes.until
+    sync.state[customer_id]["last_sync"] = (changes.until - datetime.timedelta(seconds=5)).strftime(
+        "%Y-%m-%d %H:%M:%S")
+
+    assert sync.changes().is_empty
+    fake_service.upload([AdGroup.set_name_operation(adgroup_id=200, new_name="renamed")],
+                        is_debug=False, method="batch", batch_sleep_interval=0)
+
+    changes = sync.changes()
+    assert not changes.is_full_sync and not changes.is_empty
+    assert changes.adgroup_ids == {200} and changes.campaign_ids == {20}
+    assert changes.predicates("adgroup") == [{"field": "AdGroupId", "operator": "IN", "values": [200]}]
+
+    # AdWords rejects IN predicates without values
+    changes.adgroup_ids = set()
+    assert changes.predicates("adgroup") is None and changes.predicates("campaign") is not None
+
+
+@pytest.mark.parametrize("fake_adwords", [{"report_rows": 120, "objects": {
+    "CampaignService": [{"id": 1000}],
+    "AdGroupService": [{"id": 100000, "campaignId": 1000}, {"id": 100001, "campaignId": 1000}]
+}}], indirect=True)
+def test_entity_store(tmpdir, fake_adwords, fake_service):
+    customer_id = fake_adwords.accounts[0].customerId
+
+    store = fake_service.entity_store(os.path.join(str(tmpdir), "structure.sqlite"))
+    sync = fake_service.incremental_sync(os.path.join(str(tmpdir), "sync_state.json"))
+    assert store.sync(sync).is_full_sync
+    assert store.count("keyword", customer_id) == 120 and store.count("adgroup") == 3
+
+    # lookups
+    keyword = store.get("keyword", 10000060, customer_id, adgroup_id=100001)
+    assert keyword["Criteria"] == "keyword 60" and keyword["CustomerId"] == int(customer_id.replace("-", ""))
+    assert store.by_name("keyword", "keyword 60", customer_id)[0]["Id"] == 10000060
+    assert len(store.children("keyword", 100001, customer_id)) == 50
+    assert {adgroup["AdGroupId"] for adgroup in store.children("adgroup", 1000, customer_id)} == \
+        {100000, 100001, 100002}
+    assert store.get("keyword", 1, customer_id) is None
+    frame = store.to_frame("keyword", customer_id, AdGroupId=100002)
+    assert len(frame) == 20 and frame["Id"].min() == 10000100
+
+    # only changed adgroups are reloaded
+    store.connection.execute("UPDATE keyword SET Criteria = 'stale' WHERE Id IN (10000000, 10000060)")
+    sync.state[customer_id]["last_sync"] = (sync.last_sync(customer_id) - datetime.timedelta(seconds=5))\
+        .strftime("%Y-%m-%d %H:%M:%S")
+    fake_service.upload([AdGroup.set_name_operation(adgroup_id=100001, new_name="renamed")],
+                        is_debug=False, method="batch", batch_sleep_interval=0)
+    changes = store.sync(sync)
+    assert changes.adgroup_ids == {100001}
+    assert store.get("keyword", 10000060, customer_id, adgroup_id=100001)["Criteria"] == "keyword 60"
+    assert store.get("keyword", 10000000, customer_id, adgroup_id=100000)["Criteria"] == "stale"
+    assert store.count("keyword", customer_id) == 120
+
+    # a reopened store keeps its data
+    store.close()
+    assert EntityStore(store.path).count("keyword") == 120
+
+
+@pytest.mark.parametrize("fake_adwords", [{"report_rows": 5}], indirect=True)
+def test_report_slicer(tmpdir, fake_adwords, fake_service):
+    fields = ["Date", "AdGroupId", "Id", "Clicks"]
+    report_def = fake_service.report_definition("KEYWORDS_PERFORMANCE_REPORT", fields,
+                                                date_min="2017-01-20", date_max="2017-04-10")
+    full_report = fake_service.download_report(report_def)
+
+    slicer = fake_service.report_slicer(slice_days=30, max_workers=2, cache_dir=str(tmpdir))
+    slices = slicer.slices(datetime.date(2017, 1, 20), datetime.date(2017, 4, 10))
+    assert len(slices) == 4 and slices[0][0] == datetime.date(2017, 1, 20) and \
+        slices[-1][1] == datetime.date(2017, 4, 10)
+    assert all((slice_max - slice_min).days < 30 for slice_min, slice_max in slices)
+
+    requests_before = fake_adwords.requests[("http/report", "POST")]
+    report = slicer.download(report_def)
+    assert report.equals(full_report)
+    assert slicer.downloaded_slices == 4 and fake_adwords.requests[("http/report", "POST")] == requests_before + 4
+
+    # historical slices come from the cache, also for overlapping date ranges
+    report_def = fake_service.report_definition("KEYWORDS_PERFORMANCE_REPORT", fields,
+                                                date_min="2017-02-01", date_max="2017-04-10")
+    report = slicer.download(report_def)
+    assert len(report) == 69 * 5 and report["Date"].min() == "2017-02-01"
+    assert slicer.downloaded_slices == 5 and slicer.cached_slices == 2
+
+    with pytest.raises(IOError):
+        slicer.download(fake_service.report_definition("KEYWORDS_PERFORMANCE_REPORT", ["Id", "Clicks"]))
+
+
+@pytest.mark.parametrize("fake_adwords", [{"report_rows": 50}], indirect=True)
+def test_download_awql(fake_adwords, fake_service):
+    query = parse_awql("select  CampaignId, Clicks from campaign_performance_report "
+                       "where Clicks >= 500 and CampaignStatus IN ['ENABLED', enabled] during 20170101,20170107")
+    assert query.normalized == 'SELECT CampaignId, Clicks FROM CAMPAIGN_PERFORMANCE_REPORT ' \
+                               'WHERE CampaignStatus IN ["ENABLED", "enabled"] AND Clicks >= 500 ' \
+                               'DURING 20170101,20170107'
+    assert parse_awql(query.normalized) == query
+    assert query.report_definition()["selector"]["dateRange"] == {"min": "20170101", "max": "20170107"}
+    assert parse_awql("SELECT Id FROM KEYWORDS_PERFORMANCE_REPORT WHERE Criteria CONTAINS 'a AND b'").predicates \
+        == (("Criteria", "CONTAINS", ("a AND b", )), )
+
+    # quoted numbers stay strings
+    query = parse_awql("SELECT CampaignId FROM CAMPAIGN_PERFORMANCE_REPORT WHERE CampaignName = '2017' AND Clicks > 5")
+    assert query.normalized == 'SELECT CampaignId FROM CAMPAIGN_PERFORMANCE_REPORT ' \
+                               'WHERE CampaignName = "2017" AND Clicks > 5'
+    assert parse_awql(query.normalized) == query
+    assert parse_awql("SELECT Id FROM X WHERE Name = 2017").normalized == "SELECT Id FROM X WHERE Name = 2017"
+    for invalid_query in ("SELECT FROM X", "SELECT Id FROM X WHERE Id IN 1", "SELECT Id FROM X WHERE Id ~ 1"):
+        with pytest.raises(IOError):
+            parse_awql(invalid_query)
+
+    report = fake_service.download_awql("SELECT CampaignId, Clicks FROM CAMPAIGN_PERFORMANCE_REPORT "
+                                        "WHERE Clicks >= 500 DURING LAST_7_DAYS")
+    assert list(report.columns) == ["CampaignId", "Clicks"] and 0 < len(report) < 50
+    assert (report["Clicks"] >= 500).all()
+
+
+@pytest.mark.parametrize("fake_adwords", [{
+    "accounts": [dict(default_accounts(1)[0], customerId="987-654-3210")],  # above 2^31
+    "report_rows": 500
+}], indirect=True)
+def test_parquet_export(tmpdir, monkeypatch, fake_adwords, fake_service):
+    pa = pytest.importorskip("pyarrow")
+    customer_id = fake_adwords.accounts[0].customerId
+    fields = ["Date", "AdGroupId", "Id", "Criteria", "KeywordMatchType", "Clicks", "Cost", "Conversions"]
+    report_def = fake_service.report_definition("KEYWORDS_PERFORMANCE_REPORT", fields,
+                                                date_min="2017-01-01", date_max="2017-01-03")
+
+    export = fake_service.parquet_export(str(tmpdir))
+    export.block_size = 1 << 14  # several record batches
+    batches = list(export.record_batches(report_def, extra_columns={"Currency": "EUR"}))
+    assert len(batches) > 3 and sum(batch.num_rows for batch in batches) == 1500
+    schema = batches[0].schema
+    assert schema.field("CustomerId").type == pa.int64() and schema.field("Cost").type == pa.int64()
+    assert schema.field("Date").type == pa.date32() and schema.field("Conversions").type == pa.float64()
+    assert pa.types.is_dictionary(schema.field("KeywordMatchType").type)
+
+    assert export.export(report_def) == 1500
+    assert export.export(report_def) == 1500  # replaces the partitions of the account
+    assert tmpdir.join("CustomerId=" + customer_id.replace("-", ""), "Date=2017-01-02").check(dir=True)
+
+    table = export.dataset().to_table()
+    expected = fake_service.download_report(report_def)
+    assert table.num_rows == 1500 and table.column("Clicks").to_pylist() == expected["Clicks"].tolist()
+    assert table.schema.field("CustomerId").type == pa.int64() and table.schema.field("Date").type == pa.date32()
+    assert set(table.column("CustomerId").to_pylist()) == {9876543210}
+
+    # exporting again removes dates that aren't part of the new report, an empty report removes everything
+    account_dir = tmpdir.join("CustomerId=" + customer_id.replace("-", ""))
+    shorter_def = fake_service.report_definition("KEYWORDS_PERFORMANCE_REPORT", fields,
+                                                 date_min="2017-01-01", date_max="2017-01-02")
+    assert export.export(shorter_def) == 1000
+    assert not account_dir.join("Date=2017-01-03").check() and export.dataset().count_rows() == 1000
+
+    # a failed export keeps the old data
+    monkeypatch.setattr("freedan.other_services.error_retryer.time.sleep", lambda seconds: None)
+    fake_adwords.error_rate = 1.0
+    with pytest.raises(Exception, match="Gave up"):
+        export.export(report_def)
+    fake_adwords.error_rate = 0.0
+    assert export.dataset().count_rows() == 1000 and tmpdir.listdir() == [account_dir]
+
+    fake_adwords.report_rows = 0
+    assert export.export(report_def) == 0
+    assert not account_dir.check()
+
+
+@pytest.mark.parametrize("fake_adwords", [{"report_rows": 200}], indirect=True)
+def test_report_consolidation(tmpdir, fake_adwords, fake_service):
+    pytest.importorskip("pyarrow")
+    report_def = fake_service.report_definition("KEYWORDS_PERFORMANCE_REPORT", ["Date", "Id", "Clicks"],
+                                                date_min="2017-01-01", date_max="2017-01-02")
+
+    consolidation = fake_service.report_consolidation(str(tmpdir), max_workers=2)
+    rows = consolidation.run(report_def)
+    assert rows == {account.customerId: 400 for account in fake_adwords.accounts}
+
+    table = consolidation.dataset().to_table()
+    assert table.num_rows == 1200
+    assert set(table.column("CustomerId").to_pylist()) == \
+        {int(account.customerId.replace("-", "")) for account in fake_adwords.accounts}
+    assert set(table.column("Currency").to_pylist()) == {"EUR"}
+    assert set(table.column("TimeZone").to_pylist()) == {"Europe/Berlin"}
+
+    # accounts can be downloaded again on their own without touching the others
+    account = next(fake_service.accounts())
+    assert consolidation.run(report_def, accounts=[account]) == {account.id: 400}
+    assert consolidation.dataset().to_table().num_rows == 1200
+
+    # the old data of an account without rows is removed
+    fake_adwords.report_rows = 0
+    assert consolidation.run(report_def, accounts=[account]) == {account.id: 0}
+    table = consolidation.dataset().to_table()
+    assert table.num_rows == 800 and int(account.id.replace("-", "")) not in table.column("CustomerId").to_pylist()
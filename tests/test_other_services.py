@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
+import pytest
 
 
 def test_close_variant():
@@ -17,6 +18,130 @@ def test_close_variant():
     assert TextHandler.remove_double_white_space("    qweq asd  qqr") == "qweq asd qqr"
     assert TextHandler.remove_punctuation("madrid a gasteiz / vitoria") == "madrid a gasteiz vitoria"
     assert TextHandler.remove_forbidden_adwords_chars("madrid a gasteiz / vitoria") == "madrid a gasteiz / vitoria"
+    assert TextHandler.remove_punctuation("a/b (c)", forbidden_chars=["/", "(", ")"]) == "ab c"
+    assert TextHandler.remove_punctuation(["a/b", "c!"], forbidden_chars={"/", "!"}) == ["ab", "c"]
 
     # dash brain fuck
     assert TextHandler.replace_dashes("a–a—a−a-a") == "a a a a a"
+
+
+def test_standardize_many():
+    import numpy as np
+    import pandas as pd
+    from freedan import TextHandler
+
+    texts = ["hott'-hü", "Hott hü", "hott'-hü", np.nan]
+    expected = ["hott hu", "hott hu", "hott hu"]
+
+    standardized = TextHandler.standardize_many(texts, to_lower=True)
+    assert standardized[:3] == expected
+    assert standardized[3] is np.nan
+
+    series = pd.Series(texts, index=[3, 2, 1, 0])
+    standardized_series = TextHandler.standardize_many(series, to_lower=True)
+    assert standardized_series.index.tolist() == [3, 2, 1, 0]
+    assert standardized_series.iloc[:3].tolist() == expected
+    assert pd.isnull(standardized_series.iloc[3])
+
+
+def test_text_normalizer():
+    import numpy as np
+    import pandas as pd
+    from freedan import TextHandler, TextNormalizer
+
+    queries = pd.Series(["Hott'-hü", "hott hu", np.nan, "Hott'-hü"] * 5, index=range(100, 120))
+    expected = queries.map(lambda query: query if pd.isnull(query) else "hott hu")
+
+    serial = TextNormalizer(processes=1, to_lower=True).standardize(queries)
+    assert serial.equals(expected)
+
+    parallel = TextNormalizer(processes=2, chunk_size=1, min_parallel_texts=0, to_lower=True).standardize(queries)
+    assert parallel.equals(expected)
+
+    df = pd.DataFrame({"Query": ["Hü", None], "Criteria": ["hü-hu", 5]})
+    standardized_df = TextNormalizer(processes=1).standardize_columns(df, ["Query", "Criteria"])
+    assert standardized_df["Query_standardized"].tolist() == ["Hu", None]
+    assert standardized_df["Criteria_standardized"].tolist() == ["hu hu", 5]
+    assert list(df.columns) == ["Query", "Criteria"]  # input isn't changed
+
+    # same results as TextHandler.standardize_many, also for values that aren't str
+    mixed = pd.Series(["A-b", 5, None, np.nan])
+    standardized = TextNormalizer(processes=1).standardize(mixed)
+    assert standardized.tolist()[:3] == ["A b", 5, None] and np.isnan(standardized.iloc[3])
+    assert standardized.tolist()[:3] == TextHandler.standardize_many(mixed).tolist()[:3]
+    assert TextNormalizer(processes=2, chunk_size=1, min_parallel_texts=0).mapping(["A-b", 5]) == {"A-b": "A b", 5: 5}
+
+
+def test_lazy_imports():
+    import sys
+    import subprocess
+    import freedan
+
+    # heavy dependencies aren't loaded for light weight functionality
+    code = ("import sys, freedan; freedan.Keyword.to_broad_modified('a b'); "
+            "print(','.join(m for m in ('pandas', 'googleads', 'suds') if m in sys.modules))")
+    output = subprocess.run([sys.executable, "-c", code], check=True, stdout=subprocess.PIPE,
+                            universal_newlines=True, cwd=freedan.base_dir + "/..").stdout
+    assert output.strip() == ""
+
+    assert "AdWordsService" in dir(freedan)
+    with pytest.raises(AttributeError):
+        freedan.DoesNotExist
+
+
+def test_instrumentation():
+    import contextlib
+    from freedan import MetricsRecorder, SpanInstrumentation, set_instrumentation
+    from freedan.other_services.error_retryer import ErrorRetryer
+
+    recorder = MetricsRecorder(buckets=(0.1, 1.0))
+    recorder.count("operations_uploaded", 5, method="batch")
+    recorder.count("operations_uploaded", 3, method="batch")
+    recorder.observe("api_request_seconds", 0.05, service="LabelService", method="get")
+    recorder.observe("api_request_seconds", 0.5, service="LabelService", method="get")
+    with recorder.timer("report_parse_seconds"):
+        pass
+
+    assert recorder.counter("operations_uploaded", method="batch") == 8
+    assert recorder.summary("api_request_seconds", service="LabelService", method="get")["count"] == 2
+    assert recorder.summary("report_parse_seconds")["count"] == 1
+
+    text = recorder.to_prometheus()
+    assert '# TYPE freedan_operations_uploaded counter' in text
+    assert 'freedan_operations_uploaded{method="batch"} 8' in text
+    assert 'freedan_api_request_seconds_bucket{method="get",service="LabelService",le="0.1"} 1' in text
+    assert 'freedan_api_request_seconds_bucket{method="get",service="LabelService",le="+Inf"} 2' in text
+
+    # retries are reported to the installed instrumentation
+    attempts = list()
+
+    @ErrorRetryer(max_attempts=3, sleep_interval=0)
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 2:
+            raise ValueError("temporary error")
+        return True
+
+    recorder.reset()
+    previous = set_instrumentation(recorder)
+    try:
+        assert flaky()
+    finally:
+        set_instrumentation(previous)
+    assert recorder.counter("retries", function="flaky") == 1
+    assert recorder.counter("retries_exhausted", function="flaky") == 0
+
+    # timers become spans
+    class Tracer:
+        spans = list()
+
+        @contextlib.contextmanager
+        def start_as_current_span(self, name, attributes=None):
+            self.spans.append((name, attributes))
+            yield
+
+    span_instrumentation = SpanInstrumentation(Tracer(), metrics=recorder)
+    with span_instrumentation.timer("batch_polling_seconds", job="1"):
+        pass
+    assert Tracer.spans == [("freedan.batch_polling_seconds", {"job": "1"})]
+    assert recorder.summary("batch_polling_seconds", job="1")["count"] == 1